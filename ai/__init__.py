@@ -6,6 +6,7 @@ AI Universe - Professional AI Assistants Package
 Bismillah - Professional AI Platform
 """
 
+from .base import AIServiceError, BaseAI, get_openai_client, close_openai_client
 from .chat_ai import ChatAI
 from .tarjimon_ai import TarjimonAI
 from .blockchain_ai import BlockchainAI
@@ -33,6 +34,10 @@ from .ekologiya_ai import EkologiyaAI
 from .oyin_ai import OyinAI
 
 __all__ = [
+    'AIServiceError',
+    'BaseAI',
+    'get_openai_client',
+    'close_openai_client',
     'ChatAI',
     'TarjimonAI', 
     'BlockchainAI',
@@ -0,0 +1,350 @@
+"""
+AI Universe - umumiy OpenAI client qatlami
+
+Barcha AI yordamchilar bitta AsyncOpenAI client va bitta keep-alive
+connection pool dan foydalanadi. Bir vaqtdagi so'rovlar soni thread pool
+bilan emas, OPENAI_MAX_CONCURRENCY sozlamasi bilan cheklanadi.
+"""
+
+import os
+import time
+import asyncio
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+import structlog
+from openai import AsyncOpenAI
+
+from .cache import (
+    RESPONSE_CACHE_DEFAULT_TTL,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_TEMPERATURE,
+    make_cache_key,
+    response_cache,
+    single_flight,
+)
+from .fuzzy_cache import fuzzy_cache, fuzzy_cache_enabled_for
+from .history import HISTORY_TOKEN_BUDGET, build_history, count_message_tokens
+
+# Process uchun yagona client va semaphore
+_client: Optional[AsyncOpenAI] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+# So'rov middleware bog'lagan request_id har bir LLM logida bo'ladi
+logger = structlog.get_logger("ai.llm")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+NO_CLIENT_MESSAGE = "Kechirasiz, OpenAI service hozircha mavjud emas. OPENAI_API_KEY sozlanmagan."
+
+
+class AIServiceError(Exception):
+    """
+    Yordamchi javob bera olmadi. Matn foydalanuvchiga xato sifatida
+    ko'rsatiladi - javob sifatida saqlanmaydi va tarixga kirmaydi.
+    """
+
+    def __init__(self, message: str, code: str = "ai_error", status: int = 502):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+def get_openai_client() -> Optional[AsyncOpenAI]:
+    """Umumiy AsyncOpenAI client ni olish (kerak bo'lsa yaratish)"""
+    global _client
+
+    if _client is not None:
+        return _client
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    # Keep-alive connection pool barcha yordamchilar uchun bitta
+    limits = httpx.Limits(
+        max_connections=_env_int("OPENAI_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("OPENAI_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float("OPENAI_KEEPALIVE_EXPIRY", 30.0),
+    )
+    timeout = httpx.Timeout(
+        _env_float("OPENAI_TIMEOUT", 120.0),
+        connect=_env_float("OPENAI_CONNECT_TIMEOUT", 10.0),
+    )
+
+    _client = AsyncOpenAI(
+        api_key=api_key,
+        http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+        max_retries=_env_int("OPENAI_MAX_RETRIES", 2),
+    )
+    print("✅ Shared AsyncOpenAI client initialized")
+    return _client
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Bir vaqtdagi LLM so'rovlarini cheklovchi semaphore"""
+    global _semaphore
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(_env_int("OPENAI_MAX_CONCURRENCY", 64))
+    return _semaphore
+
+
+async def close_openai_client():
+    """Umumiy client va uning connection pool ini yopish"""
+    global _client
+
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _reset_after_fork():
+    # Ota process dagi keep-alive socket lar child da ishlatilmaydi -
+    # yopmasdan tashlab yuboriladi, kerak bo'lganda yangisi yaratiladi
+    global _client, _semaphore
+    _client = None
+    _semaphore = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class BaseAI:
+    """Barcha AI yordamchilar uchun umumiy asos"""
+
+    def __init__(self):
+        self.ai_type = type(self).__name__.lower()
+
+        self.model = "gpt-4"
+        self.system_prompt = ""
+        self.max_tokens = 2000
+        self.temperature = 0.7
+        self.top_p = 0.9
+        self.frequency_penalty = 0.1
+        self.presence_penalty = 0.1
+        self.error_prefix = "AI xatoligi"
+        self.context_window = 8192
+        self.history_token_budget = HISTORY_TOKEN_BUDGET
+        # None - harorat bo'yicha avtomatik, 0 - kesh o'chirilgan
+        self.cache_ttl = None
+        # None - FUZZY_CACHE_AI_TYPES bo'yicha, True/False - majburiy
+        self.use_fuzzy_cache = None
+
+    @property
+    def client(self) -> Optional[AsyncOpenAI]:
+        # Konstruktorda emas, birinchi chaqiruvda - fork dan keyin har bir worker o'z client ini oladi
+        return get_openai_client()
+
+    def history_budget(self, user_message: str) -> int:
+        """Suhbat tarixi uchun qolgan token budjeti"""
+        base = count_message_tokens([
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_message}
+        ], self.model)
+        available = self.context_window - self.max_tokens - base
+        return max(0, min(self.history_token_budget, available))
+
+    def build_messages(self, user_message: str, history: Optional[List[Tuple[str, str]]] = None) -> list:
+        """OpenAI ga yuboriladigan xabarlar ro'yxati"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if history:
+            messages.extend(build_history(history, self.history_budget(user_message), self.model))
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def completion_params(self) -> dict:
+        """Model va sampling parametrlari"""
+        return {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "frequency_penalty": self.frequency_penalty,
+            "presence_penalty": self.presence_penalty
+        }
+
+    def response_cache_ttl(self) -> int:
+        """Javoblar keshi uchun TTL (0 - kesh ishlatilmaydi)"""
+        env_ttl = os.getenv(f"RESPONSE_CACHE_TTL_{self.ai_type.upper()}")
+        if env_ttl is not None:
+            try:
+                return int(env_ttl)
+            except ValueError:
+                pass
+        if self.cache_ttl is not None:
+            return self.cache_ttl
+        if self.temperature <= RESPONSE_CACHE_MAX_TEMPERATURE:
+            return RESPONSE_CACHE_DEFAULT_TTL
+        return 0
+
+    def cache_key(self, user_message: str, history=None) -> Optional[str]:
+        """Kesh kaliti yoki None (tarixga bog'liq javoblar keshlanmaydi)"""
+        if not RESPONSE_CACHE_ENABLED or history or self.response_cache_ttl() <= 0:
+            return None
+        return make_cache_key(self.ai_type, self.model, self.system_prompt,
+                              self.completion_params(), user_message)
+
+    def fuzzy_scope(self, key: Optional[str]) -> Optional[str]:
+        """Taxminiy kesh doirasi (faqat deterministik yordamchilar uchun)"""
+        if not key:
+            return None
+        enabled = self.use_fuzzy_cache if self.use_fuzzy_cache is not None else fuzzy_cache_enabled_for(self.ai_type)
+        if not enabled:
+            return None
+        return make_cache_key(self.ai_type, self.model, self.system_prompt, self.completion_params(), "")
+
+    def cached_response(self, key: Optional[str], user_message: str) -> Optional[str]:
+        """Aniq yoki taxminiy keshdan javob"""
+        if not key:
+            return None
+        cached = response_cache.get(key)
+        if cached is None:
+            scope = self.fuzzy_scope(key)
+            if scope:
+                cached = fuzzy_cache.lookup(scope, user_message)
+        return cached
+
+    def store_response(self, key: Optional[str], user_message: str, ai_response: str):
+        """Javobni aniq va taxminiy keshga yozish"""
+        if not key or not ai_response:
+            return
+        ttl = self.response_cache_ttl()
+        response_cache.set(key, ai_response, ttl)
+        scope = self.fuzzy_scope(key)
+        if scope:
+            fuzzy_cache.add(scope, user_message, ai_response, ttl)
+
+    async def complete(self, user_message: str, history: Optional[List[Tuple[str, str]]] = None) -> str:
+        """OpenAI dan bitta to'liq javob olish (keshsiz)"""
+        started = time.perf_counter()
+        async with get_llm_semaphore():
+            acquired = time.perf_counter()
+            response = await self.client.chat.completions.create(
+                messages=self.build_messages(user_message, history),
+                **self.completion_params()
+            )
+
+        usage = getattr(response, "usage", None)
+        logger.info(
+            "llm_call",
+            ai_type=self.ai_type,
+            model=self.model,
+            queue_ms=round((acquired - started) * 1000, 2),
+            duration_ms=round((time.perf_counter() - acquired) * 1000, 2),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None)
+        )
+        return response.choices[0].message.content.strip()
+
+    async def get_response(self, user_message: str, history: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Get response from OpenAI GPT model using shared async client (xatoda AIServiceError)"""
+        if not self.client:
+            raise AIServiceError(NO_CLIENT_MESSAGE, "ai_unavailable", 503)
+
+        try:
+            key = self.cache_key(user_message, history)
+            if not key:
+                return await self.complete(user_message, history)
+
+            cached = self.cached_response(key, user_message)
+            if cached is not None:
+                logger.debug("llm_cache_hit", ai_type=self.ai_type)
+                return cached
+
+            # Bir xil parallel so'rovlar bitta upstream chaqiruvni kutadi
+            return await single_flight.do(key, lambda: self._complete_and_cache(key, user_message))
+
+        except Exception as e:
+            logger.error("llm_error", ai_type=self.ai_type, model=self.model, error=str(e))
+            raise AIServiceError(self.format_error(e)) from e
+
+    async def _complete_and_cache(self, key: str, user_message: str) -> str:
+        ai_response = await self.complete(user_message)
+        self.store_response(key, user_message, ai_response)
+        return ai_response
+
+    async def stream_response(self, user_message: str,
+                              history: Optional[List[Tuple[str, str]]] = None) -> AsyncIterator[str]:
+        """
+        Javobni kelishi bilan bo'lakma-bo'lak qaytarish (streaming). Xato oddiy
+        token sifatida emas, AIServiceError bo'lib ko'tariladi (bir qism
+        bo'laklar undan oldin yuborilgan bo'lishi mumkin).
+        """
+        if not self.client:
+            raise AIServiceError(NO_CLIENT_MESSAGE, "ai_unavailable", 503)
+
+        try:
+            key = self.cache_key(user_message, history)
+            if not key:
+                async for delta in self._stream_completion(user_message, history):
+                    yield delta
+                return
+
+            cached = self.cached_response(key, user_message)
+            if cached is not None:
+                yield cached
+                return
+
+            # Bir xil parallel so'rovlar bitta upstream stream ni bo'lishadi
+            async for delta in single_flight.stream(key, lambda: self._stream_and_cache(key, user_message)):
+                yield delta
+
+        except Exception as e:
+            logger.error("llm_error", ai_type=self.ai_type, model=self.model, error=str(e))
+            raise AIServiceError(self.format_error(e)) from e
+
+    async def _stream_completion(self, user_message: str,
+                                 history: Optional[List[Tuple[str, str]]] = None) -> AsyncIterator[str]:
+        """OpenAI dan bitta streaming javob (keshsiz)"""
+        chunks = 0
+        started = time.perf_counter()
+        async with get_llm_semaphore():
+            stream = await self.client.chat.completions.create(
+                messages=self.build_messages(user_message, history),
+                stream=True,
+                **self.completion_params()
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks += 1
+                    yield delta
+
+        logger.info("llm_stream", ai_type=self.ai_type, model=self.model,
+                    duration_ms=round((time.perf_counter() - started) * 1000, 2), chunks=chunks)
+
+    async def _stream_and_cache(self, key: str, user_message: str) -> AsyncIterator[str]:
+        chunks = []
+        async for delta in self._stream_completion(user_message):
+            chunks.append(delta)
+            yield delta
+        self.store_response(key, user_message, "".join(chunks).strip())
+
+    def format_error(self, e: Exception) -> str:
+        """Xatolikni foydalanuvchiga tushunarli matnga aylantirish"""
+        error_msg = str(e).lower()
+        if "api key" in error_msg:
+            return "Kechirasiz, OpenAI API key bilan muammo bor. Administrator bilan bog'laning."
+        elif "quota" in error_msg or "limit" in error_msg:
+            return "Kechirasiz, API limiti tugagan. Iltimos, keyinroq qaytadan urinib ko'ring."
+        elif "model" in error_msg:
+            return "Kechirasiz, so'ralgan AI model mavjud emas."
+        else:
+            return f"{self.error_prefix}: {str(e)}"
@@ -0,0 +1,257 @@
+"""
+AI Universe - LLM javoblari keshi
+
+Aynan bir xil so'rovlar (ai_type, model, system prompt, sampling
+parametrlari, normallashtirilgan xabar) uchun javobni xotirada saqlaydi.
+Hajmi cheklangan, LRU bo'yicha chiqariladi, har bir yozuvning TTL i bor.
+Bir xil kalitli parallel so'rovlar bitta upstream chaqiruvni kutadi;
+streaming so'rovlar ham bitta upstream stream ning bo'laklarini oladi.
+"""
+
+import os
+import json
+import asyncio
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 5000)
+RESPONSE_CACHE_MAX_BYTES = _env_int("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+RESPONSE_CACHE_DEFAULT_TTL = _env_int("RESPONSE_CACHE_DEFAULT_TTL", 3600)
+# Faqat shu haroratdan past yordamchilar uchun kesh avtomatik yoqiladi
+RESPONSE_CACHE_MAX_TEMPERATURE = _env_float("RESPONSE_CACHE_MAX_TEMPERATURE", 0.3)
+
+
+def normalize_message(message: str) -> str:
+    """Xabarni kesh kaliti uchun normallashtirish"""
+    message = unicodedata.normalize("NFC", message or "")
+    return " ".join(message.split())
+
+
+def make_cache_key(ai_type: str, model: str, system_prompt: str, params: dict, message: str) -> str:
+    """Kesh kaliti: ai_type, model, prompt hash, parametrlar va xabar"""
+    prompt_hash = hashlib.sha256((system_prompt or "").encode("utf-8")).hexdigest()
+    payload = json.dumps({
+        "ai_type": ai_type,
+        "model": model,
+        "prompt": prompt_hash,
+        "params": params,
+        "message": normalize_message(message)
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL kesh, yozuvlar soni va baytlar bo'yicha cheklangan"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value, size = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl: int):
+        if ttl <= 0 or value is None:
+            return
+
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + ttl, value, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class _StreamFlight:
+    """Bitta upstream stream: kelgan bo'laklar va ularni kutayotganlar uchun signal"""
+
+    def __init__(self):
+        self.chunks = []
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def push(self, chunk: str):
+        self.chunks.append(chunk)
+        self.notify()
+
+    def notify(self):
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        # Kech qo'shilgan mijoz ham bo'laklarni boshidan oladi
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                chunk = self.chunks[index]
+                index += 1
+                yield chunk
+            elif self.task.done():
+                # Upstream xatosi har bir kutayotganga ko'tariladi
+                self.task.result()
+                return
+            else:
+                await self._changed.wait()
+
+
+class SingleFlight:
+    """Bir xil kalitli parallel chaqiruvlarni bitta upstream chaqiruvga birlashtirish"""
+
+    def __init__(self):
+        self._inflight = {}  # key -> asyncio.Task (natija - to'liq javob matni)
+        self._streams = {}  # key -> _StreamFlight
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        task = self._inflight.get(key)
+        if task is None:
+            # Upstream chaqiruv alohida task - bitta mijoz uzilsa boshqalar kutishda davom etadi
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def stream(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Streaming variant: birinchi chaqiruv upstream stream ni alohida task da
+        ochadi, keyingilar o'sha bo'laklarni oladi. do()/wait() ham shu task ning
+        to'liq natijasini kutadi.
+        """
+        flight = self._streams.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return flight.subscribe()
+        if key in self._inflight:
+            # Stream siz chaqiruv davom etmoqda - tayyor javob bitta bo'lak bo'lib keladi
+            return self._whole(key)
+
+        flight = _StreamFlight()
+        flight.task = asyncio.ensure_future(self._pump(flight, fn))
+        self._inflight[key] = flight.task
+        self._streams[key] = flight
+        flight.task.add_done_callback(lambda t, key=key: self._finish(key, t))
+        flight.task.add_done_callback(lambda t: flight.notify())
+        self.calls += 1
+        return flight.subscribe()
+
+    @staticmethod
+    async def _pump(flight: _StreamFlight, fn: Callable[[], AsyncIterator[str]]) -> str:
+        async for chunk in fn():
+            flight.push(chunk)
+        return "".join(flight.chunks).strip()
+
+    async def _whole(self, key: str) -> AsyncIterator[str]:
+        result = await self.wait(key)
+        if result:
+            yield result
+
+    async def wait(self, key: str) -> Optional[str]:
+        """Davom etayotgan chaqiruv natijasini kutish (bo'lmasa None)"""
+        task = self._inflight.get(key)
+        if task is None:
+            return None
+        self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        flight = self._streams.get(key)
+        if flight is not None and flight.task is task:
+            del self._streams[key]
+        if not task.cancelled():
+            # Hech kim kutmagan bo'lsa ham xatolik "retrieved" deb belgilanadi
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "streams_in_flight": len(self._streams),
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced
+        }
+
+
+# Process uchun yagona kesh
+response_cache = ResponseCache()
+single_flight = SingleFlight()
@@ -0,0 +1,312 @@
+"""
+AI Universe - taxminiy (fuzzy) javoblar keshi
+
+Bir xil savol boshqa harf registri, tinish belgilari, kirill/lotin yozuvi
+yoki "iltimos" bilan kelsa ham keshdan javob beradi. Matn normallashtiriladi,
+belgi shingle lari MinHash imzosiga aylantiriladi va LSH indeksida qidiriladi.
+Sonlar va amallar ketma-ketligi ("3 + 7") esa aniq mos kelishi shart -
+"3x + 7" ning javobi "3x - 7" yoki "4x + 7" ga berilmaydi.
+
+Offline baholash (messages jadvalidagi yozuvlar bo'yicha):
+    python -m ai.fuzzy_cache evaluate --ai-type matematik --limit 5000
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .normalize import math_tokens, normalize_for_match
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Vergul bilan ajratilgan ai_type lar ro'yxati ("*" - barcha deterministik yordamchilar)
+FUZZY_CACHE_AI_TYPES = {
+    item.strip() for item in os.getenv("FUZZY_CACHE_AI_TYPES", "").split(",") if item.strip()
+}
+FUZZY_CACHE_THRESHOLD = _env_float("FUZZY_CACHE_THRESHOLD", 0.85)
+FUZZY_CACHE_MAX_ENTRIES = _env_int("FUZZY_CACHE_MAX_ENTRIES", 20000)
+
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+LSH_BANDS = 16
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Normallashtirilgan matndagi belgi k-gramlari"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """Shingle to'plami uchun MinHash imzosi"""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, items: set) -> Tuple[int, ...]:
+        hashes = [_hash(item) for item in items]
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+    @staticmethod
+    def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        same = sum(1 for x, y in zip(left, right) if x == y)
+        return same / len(left)
+
+
+class FuzzyCache:
+    """MinHash/LSH asosidagi taxminiy kesh, yozuvlar soni bo'yicha cheklangan"""
+
+    def __init__(self, max_entries: int = FUZZY_CACHE_MAX_ENTRIES, threshold: float = FUZZY_CACHE_THRESHOLD,
+                 num_perm: int = NUM_PERM, bands: int = LSH_BANDS):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+
+        self._entries = OrderedDict()  # id -> (scope, signature, value, expires_at, text, band_keys, math)
+        self._buckets = {}  # band_key -> set(id)
+        self._next_id = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, scope: str, signature: Tuple[int, ...]) -> List[tuple]:
+        return [
+            (scope, band, hash(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def lookup_entry(self, scope: str, message: str) -> Optional[Tuple[str, float, str]]:
+        """Eng o'xshash yozuv: (javob, o'xshashlik, normallashtirilgan savol)"""
+        text = normalize_for_match(message)
+        if not text:
+            self.misses += 1
+            return None
+
+        signature = self.hasher.signature(shingles(text))
+        math = math_tokens(text)
+        candidates = set()
+        for band_key in self._band_keys(scope, signature):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        now = time.monotonic()
+        best = None
+        for entry_id in candidates:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                continue
+            if entry[3] <= now:
+                self._remove(entry_id)
+                continue
+            if entry[6] != math:
+                # Boshqa sonlar yoki amallar - matn o'xshash bo'lsa ham boshqa savol
+                continue
+            score = MinHasher.similarity(signature, entry[1])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (entry_id, score)
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        entry_id, score = best
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        entry = self._entries[entry_id]
+        return entry[2], score, entry[4]
+
+    def lookup(self, scope: str, message: str) -> Optional[str]:
+        entry = self.lookup_entry(scope, message)
+        return entry[0] if entry else None
+
+    def add(self, scope: str, message: str, value: str, ttl: int):
+        text = normalize_for_match(message)
+        if not text or not value or ttl <= 0:
+            return
+
+        signature = self.hasher.signature(shingles(text))
+        band_keys = self._band_keys(scope, signature)
+
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (scope, signature, value, time.monotonic() + ttl, text, band_keys, math_tokens(text))
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for band_key in entry[5]:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "ai_types": ",".join(sorted(FUZZY_CACHE_AI_TYPES)) or "none",
+            "threshold": self.threshold,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions
+        }
+
+
+# Process uchun yagona indeks
+fuzzy_cache = FuzzyCache()
+
+
+def fuzzy_cache_enabled_for(ai_type: str) -> bool:
+    return "*" in FUZZY_CACHE_AI_TYPES or ai_type in FUZZY_CACHE_AI_TYPES
+
+
+# Offline baholash
+def answer_similarity(left: str, right: str) -> float:
+    """Ikki javob so'zlari bo'yicha Jaccard o'xshashligi"""
+    left_words = set(normalize_for_match(left).split())
+    right_words = set(normalize_for_match(right).split())
+    if not left_words or not right_words:
+        return 0.0
+    return len(left_words & right_words) / len(left_words | right_words)
+
+
+def evaluate(rows: List[Tuple[str, str, str]], threshold: float, answer_threshold: float) -> dict:
+    """
+    Yozuvlarni xronologik tartibda qayta o'ynatish. Kesh javobi haqiqiy
+    javobga answer_threshold dan ko'proq o'xshasa, hit to'g'ri hisoblanadi.
+    """
+    cache = FuzzyCache(max_entries=len(rows) + 1, threshold=threshold)
+    hits = correct = exact = 0
+    false_positives = []
+
+    for ai_type, content, ai_response in rows:
+        entry = cache.lookup_entry(ai_type, content)
+        if entry:
+            hits += 1
+            cached_answer, score, matched_text = entry
+            if matched_text == normalize_for_match(content):
+                exact += 1
+            if answer_similarity(cached_answer, ai_response) >= answer_threshold:
+                correct += 1
+            else:
+                false_positives.append((round(score, 3), matched_text[:80], normalize_for_match(content)[:80]))
+        cache.add(ai_type, content, ai_response, ttl=10 ** 9)
+
+    return {
+        "rows": len(rows),
+        "hits": hits,
+        "hit_rate": round(hits / len(rows), 4) if rows else 0.0,
+        "exact_hits": exact,
+        "fuzzy_hits": hits - exact,
+        "precision": round(correct / hits, 4) if hits else 0.0,
+        "false_positives": false_positives
+    }
+
+
+def load_rows(ai_types: List[str], limit: int) -> List[Tuple[str, str, str]]:
+    """messages + conversations dan (ai_type, savol, javob) yozuvlari"""
+    import psycopg
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("❌ DATABASE_URL topilmadi")
+
+    with psycopg.connect(database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.ai_type, m.content, m.ai_response
+                FROM messages m
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE c.ai_type = ANY(%s)
+                  AND m.content IS NOT NULL AND m.ai_response IS NOT NULL
+                ORDER BY m.timestamp DESC
+                LIMIT %s
+            """, (ai_types, limit))
+            rows = cur.fetchall()
+
+    return list(reversed(rows))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ai.fuzzy_cache", description="Fuzzy kesh aniqligini baholash")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="messages jadvali bo'yicha precision o'lchash")
+    evaluate_parser.add_argument("--ai-type", action="append", required=True, help="ai_type (bir necha marta berish mumkin)")
+    evaluate_parser.add_argument("--limit", type=int, default=5000)
+    evaluate_parser.add_argument("--thresholds", default=str(FUZZY_CACHE_THRESHOLD),
+                                 help="Vergul bilan ajratilgan o'xshashlik chegaralari, masalan 0.7,0.8,0.9")
+    evaluate_parser.add_argument("--answer-threshold", type=float, default=0.4,
+                                 help="Javoblar shu darajada o'xshasa hit to'g'ri hisoblanadi")
+    evaluate_parser.add_argument("--show-false-positives", type=int, default=5)
+
+    args = parser.parse_args(argv)
+
+    rows = load_rows(args.ai_type, args.limit)
+    print(f"📊 {len(rows)} ta yozuv yuklandi ({', '.join(args.ai_type)})")
+
+    for threshold in [float(value) for value in args.thresholds.split(",")]:
+        result = evaluate(rows, threshold, args.answer_threshold)
+        print(
+            f"THRESHOLD:{threshold} ROWS:{result['rows']} HITS:{result['hits']} "
+            f"HIT_RATE:{result['hit_rate']} EXACT:{result['exact_hits']} FUZZY:{result['fuzzy_hits']} "
+            f"PRECISION:{result['precision']}"
+        )
+        for score, matched, query in result["false_positives"][:args.show_false_positives]:
+            print(f"   ⚠️ {score} | {matched} | {query}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+AI Universe - suhbat tarixi oynasi
+
+Oldingi xabarlarni token budjetiga sig'diradi: eng yangi turlar to'liq
+qoladi, budjetdan chiqqan eski turlar qisqa xulosaga aylantiriladi.
+"""
+
+import os
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken o'rnatilmagan bo'lsa taxminiy hisob
+    tiktoken = None
+
+# Har bir xabar uchun chat formatidagi qo'shimcha tokenlar
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+HISTORY_TOKEN_BUDGET = _env_int("HISTORY_TOKEN_BUDGET", 3000)
+HISTORY_MAX_TURNS = _env_int("HISTORY_MAX_TURNS", 20)
+HISTORY_SUMMARY_TOKENS = _env_int("HISTORY_SUMMARY_TOKENS", 300)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encoding fayllarini yuklab bo'lmasa taxminiy hisobga o'tamiz
+        return None
+
+
+def warm_encodings(models) -> int:
+    """Encoding larni oldindan yuklash (birinchi so'rov BPE faylini kutmasligi uchun)"""
+    return sum(1 for model in set(models) if _get_encoding(model) is not None)
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Matndagi tokenlar soni"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        # Taxminan 4 belgi = 1 token (lotin va kirill matnlar uchun yetarli)
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[dict], model: str = "gpt-4") -> int:
+    """Chat xabarlari ro'yxatidagi tokenlar soni"""
+    return sum(
+        count_tokens(message.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+def _shorten(text: str, limit: int = 120) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def summarize_turns(turns: List[Tuple[str, str]], budget: int, model: str = "gpt-4") -> Optional[str]:
+    """Budjetga sig'magan eski turlarni qisqa xulosaga aylantirish"""
+    header = "Suhbatning oldingi qismi (qisqacha). Foydalanuvchi so'ragan edi:"
+    used = count_tokens(header, model) + MESSAGE_OVERHEAD_TOKENS
+    if used >= budget:
+        return None
+
+    lines = []
+    # Eng yangi savollar ustuvor, keyin xronologik tartibga qaytaramiz
+    for content, _ in reversed(turns):
+        line = f"- {_shorten(content)}"
+        cost = count_tokens(line, model) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+
+    if not lines:
+        return None
+    return header + "\n" + "\n".join(reversed(lines))
+
+
+def build_history(turns: List[Tuple[str, str]], budget: int, model: str = "gpt-4",
+                  summary_budget: int = HISTORY_SUMMARY_TOKENS) -> List[dict]:
+    """
+    (savol, javob) turlaridan token budjetiga sig'adigan xabarlar ro'yxati.
+    Turlar eskidan yangiga qarab tartiblangan bo'lishi kerak.
+    """
+    if not turns or budget <= 0:
+        return []
+
+    summary_budget = min(summary_budget, budget // 4)
+    turn_budget = budget - summary_budget
+
+    kept: List[dict] = []
+    used = 0
+    kept_turns = 0
+    for content, answer in reversed(turns):
+        pair = [
+            {"role": "user", "content": content or ""},
+            {"role": "assistant", "content": answer or ""}
+        ]
+        cost = count_message_tokens(pair, model)
+        if used + cost > turn_budget:
+            break
+        kept[:0] = pair
+        used += cost
+        kept_turns += 1
+
+    dropped = turns[:len(turns) - kept_turns]
+    if dropped:
+        summary = summarize_turns(dropped, summary_budget, model)
+        if summary:
+            kept.insert(0, {"role": "system", "content": summary})
+
+    return kept
@@ -0,0 +1,87 @@
+"""
+AI Universe - matnni solishtirish uchun normallashtirish
+
+O'zbek kirill yozuvini lotinga o'giradi, apostrof variantlarini,
+katta-kichik harflarni va tinish belgilarini bir xillashtiradi.
+Matematik amallar (+ - * / = ...) tinish belgisi emas: ular alohida
+token bo'lib qoladi, aks holda "5+3" va "5-3" bir xil matnga aylanadi.
+"""
+
+import re
+import unicodedata
+
+# O'zbek kirill -> lotin (ko'p harfli mosliklar ham shu yerda)
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "'",
+    "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya", "ў": "o'", "қ": "q",
+    "ғ": "g'", "ҳ": "h",
+}
+
+# Turli apostrof belgilari (o‘, g‘, tutuq belgisi)
+APOSTROPHES = "ʻʼ‘’`´ʹ"
+
+# Ma'noga ta'sir qilmaydigan xushmuomalalik so'zlari
+FILLER_WORDS = {"iltimos", "please", "pls", "plz", "pojaluysta", "rahmat", "salom"}
+
+# Unicode amal belgilari ASCII ga
+MATH_SYMBOLS = {"×": "*", "÷": "/", "−": "-", "·": "*"}
+_OPERATORS = r"+\-*/=<>^%"
+
+_NON_WORD_RE = re.compile(rf"[^\w\s{_OPERATORS}]+", re.UNICODE)
+_OPERATOR_RE = re.compile(rf"([{_OPERATORS}])")
+# Ikki harf orasidagi chiziqcha - amal emas, so'z ichidagi defis (o'zbek-ingliz)
+_HYPHEN_RE = re.compile(r"(?<=[^\W\d_])-(?=[^\W\d_])", re.UNICODE)
+_MATH_TOKEN_RE = re.compile(rf"\d+|[{_OPERATORS}]")
+
+
+def transliterate_uz(text: str) -> str:
+    """O'zbek kirill matnini lotin yozuviga o'girish"""
+    result = []
+    for char in text or "":
+        lower = char.lower()
+        latin = CYRILLIC_TO_LATIN.get(lower)
+        if latin is None:
+            result.append(char)
+        elif char != lower and latin:
+            result.append(latin[0].upper() + latin[1:])
+        else:
+            result.append(latin)
+    return "".join(result)
+
+
+def normalize_apostrophes(text: str) -> str:
+    for char in APOSTROPHES:
+        text = text.replace(char, "'")
+    return text
+
+
+def normalize_for_match(text: str) -> str:
+    """Taqqoslash uchun matn: lotin, kichik harf, tinish belgilarisiz"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = normalize_apostrophes(transliterate_uz(text)).lower()
+    # Apostroflar ko'pincha tushirib qoldiriladi (to'g'ri / togri)
+    text = text.replace("'", "")
+    for symbol, ascii_symbol in MATH_SYMBOLS.items():
+        text = text.replace(symbol, ascii_symbol)
+    text = _HYPHEN_RE.sub(" ", text)
+    text = _NON_WORD_RE.sub(" ", text)
+    text = _OPERATOR_RE.sub(r" \1 ", text)
+    words = [word for word in text.split() if word not in FILLER_WORDS]
+    return " ".join(words)
+
+
+def math_tokens(normalized: str) -> str:
+    """Normallashtirilgan matndagi sonlar va amallar ketma-ketligi ("3 + 7")"""
+    return " ".join(_MATH_TOKEN_RE.findall(normalized))
+
+
+def fold_for_search(text: str) -> str:
+    """
+    Qidiruv indeksi uchun: lotin, kichik harf, apostroflarsiz.
+    PostgreSQL dagi uz_translit() funksiyasi bilan bir xil natija beradi.
+    """
+    text = normalize_apostrophes(transliterate_uz(text or "")).lower()
+    return text.replace("'", "")
@@ -0,0 +1,10 @@
+"""
+AI Universe - HTTP qatlami yordamchilari
+"""
+
+from .wire import success_response, error_response, set_response_format, reset_response_format, response_format
+
+__all__ = [
+    'success_response', 'error_response',
+    'set_response_format', 'reset_response_format', 'response_format'
+]
@@ -0,0 +1,88 @@
+"""
+AI Universe - worker hayot sikli va cold start o'lchovi
+
+main.py import qilinganda faqat kod yuklanadi; DB pool, OpenAI client va
+AI yordamchilar lifespan ichida, ya'ni har bir worker da fork dan keyin
+yaratiladi. gunicorn --preload bilan master da ochilgan socket lar
+worker lar orasida bo'linmaydi, --preload siz esa DDL qaytarilmaydi
+(sxema faqat migratsiyalar orqali o'zgaradi).
+
+Worker startup bosqichlari tugamaguncha readiness (/api/health/ready)
+503 qaytaradi. Bosqichlar davomiyligi va cold start vaqti /api/metrics
+da STARTUP_* sifatida ko'rinadi.
+
+Production:
+    alembic upgrade head
+    gunicorn main:app -k uvicorn.workers.UvicornWorker --preload -w 4
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# main.py importi boshlangan payt (api - birinchi yuklanadigan lokal paket)
+_PROCESS_STARTED = time.monotonic()
+
+
+class WorkerLifecycle:
+    """Worker startup bosqichlari, readiness holati va cold start vaqti"""
+
+    def __init__(self, started: float = _PROCESS_STARTED):
+        self.pid = os.getpid()
+        self.started = started
+        self.forked = False
+        self.import_ms = 0.0
+        self.phases = {}  # bosqich -> ms
+        self.ready = False
+        self.cold_start_ms = 0.0
+        self.schema_version: Optional[str] = None
+
+    def mark_imported(self):
+        """main.py import qilib bo'lindi (--preload da master da bir marta)"""
+        self.import_ms = (time.monotonic() - self.started) * 1000
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (time.perf_counter() - started) * 1000
+
+    def mark_ready(self):
+        self.ready = True
+        self.cold_start_ms = (time.monotonic() - self.started) * 1000
+
+    def mark_stopping(self):
+        # Load balancer yopilayotgan worker ga yangi so'rov yubormasligi uchun
+        self.ready = False
+
+    def after_fork(self):
+        """Child process: cold start fork paytidan hisoblanadi"""
+        self.pid = os.getpid()
+        self.started = time.monotonic()
+        self.forked = True
+        self.phases = {}
+        self.ready = False
+        self.cold_start_ms = 0.0
+
+    def stats(self) -> dict:
+        values = {
+            "pid": self.pid,
+            "forked": self.forked,
+            "ready": self.ready,
+            "import_ms": round(self.import_ms, 2),
+            "cold_start_ms": round(self.cold_start_ms, 2),
+            "schema_version": self.schema_version or "unknown"
+        }
+        for name, elapsed_ms in self.phases.items():
+            values[f"{name}_ms"] = round(elapsed_ms, 2)
+        return values
+
+
+# Process uchun yagona holat
+worker_lifecycle = WorkerLifecycle()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=worker_lifecycle.after_fork)
@@ -0,0 +1,206 @@
+"""
+AI Universe - strukturali (JSON) loglar va so'rov middleware
+
+structlog hodisalari JSON ga aylantiriladi va stdlib QueueHandler orqali
+navbatga tushadi; stdout ga yozishni alohida QueueListener thread bajaradi,
+shuning uchun event loop stdout da bloklanmaydi.
+
+RequestLogMiddleware - toza ASGI middleware (BaseHTTPMiddleware emas):
+har bir so'rovga request_id beradi (X-Request-ID), uni structlog
+contextvars ga bog'laydi - LLM va DB loglari ham shu id bilan chiqadi -
+va muvaffaqiyatli so'rovlarni LOG_SAMPLE_RATE bo'yicha tanlab loglaydi.
+Xatolar (4xx/5xx) va sekin so'rovlar doim loglanadi.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Optional
+
+import structlog
+
+from .wire import set_response_format, reset_response_format
+
+try:
+    import orjson
+except ImportError:  # orjson o'rnatilmagan bo'lsa standart json
+    orjson = None
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+# json - production, console - lokal ishlab chiqish uchun rangli chiqish
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Muvaffaqiyatli so'rovlarning qancha qismi loglanadi (0..1)
+LOG_SAMPLE_RATE = _env_float("LOG_SAMPLE_RATE", 1.0)
+# Shundan sekin so'rovlar sampling dan qat'i nazar loglanadi
+LOG_SLOW_MS = _env_float("LOG_SLOW_MS", 1000.0)
+
+REQUEST_ID_HEADER = b"x-request-id"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+logger = structlog.get_logger("api.request")
+
+
+def _serialize(event: dict, **kwargs) -> str:
+    if orjson is not None:
+        return orjson.dumps(event, default=str).decode("utf-8")
+    return json.dumps(event, default=str, ensure_ascii=False)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """structlog + navbatli stdlib handler ni sozlash (process uchun bir marta)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(message)s"))
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+
+    renderer = structlog.dev.ConsoleRenderer() if fmt == "console" else structlog.processors.JSONRenderer(serializer=_serialize)
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            structlog.contextvars.merge_contextvars,
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.processors.StackInfoRenderer(),
+            structlog.processors.format_exc_info,
+            renderer,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Navbatdagi loglarni yozib tugatish va listener thread ni to'xtatish"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+def _restart_after_fork():
+    # Thread lar fork dan o'tmaydi: --preload da configure_logging master da
+    # chaqirilgan bo'lsa, worker da listener yo'q va loglar navbatda qolib ketadi
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers)
+    _listener.start()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            handler.queue = log_queue
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def new_request_id(incoming: Optional[bytes] = None) -> str:
+    """Kelgan X-Request-ID (xavfsiz bo'lsa) yoki yangi id"""
+    if incoming:
+        value = incoming.decode("latin-1")
+        if _REQUEST_ID_RE.match(value):
+            return value
+    return uuid.uuid4().hex
+
+
+class RequestLogMiddleware:
+    """request_id, javob formati va access log - toza ASGI darajasida"""
+
+    def __init__(self, app, sample_rate: float = LOG_SAMPLE_RATE, slow_ms: float = LOG_SLOW_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        request_id = new_request_id(headers.get(REQUEST_ID_HEADER))
+        structlog.contextvars.clear_contextvars()
+        structlog.contextvars.bind_contextvars(request_id=request_id)
+
+        if scope["type"] == "websocket":
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                structlog.contextvars.clear_contextvars()
+            return
+
+        accept = headers.get(b"accept")
+        format_token = set_response_format(accept.decode("latin-1") if accept else None)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [(REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            self.log(scope, 500, (time.perf_counter() - started) * 1000, exc_info=True)
+            raise
+        else:
+            self.log(scope, status_code, (time.perf_counter() - started) * 1000)
+        finally:
+            reset_response_format(format_token)
+            structlog.contextvars.clear_contextvars()
+
+    def log(self, scope, status_code: int, duration_ms: float, exc_info: bool = False):
+        if status_code < 400 and duration_ms < self.slow_ms and random.random() >= self.sample_rate:
+            return
+
+        client = scope.get("client")
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "client_ip": client[0] if client else "unknown",
+        }
+        if status_code >= 400 and scope.get("query_string"):
+            fields["query"] = scope["query_string"].decode("latin-1")
+
+        if status_code >= 500:
+            logger.error("request", exc_info=exc_info, **fields)
+        elif status_code >= 400:
+            logger.warning("request", **fields)
+        else:
+            logger.info("request", **fields)
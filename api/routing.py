@@ -0,0 +1,141 @@
+"""
+AI Universe - route jadvali mikrobenchmarki
+
+Starlette route larni ro'yxat bo'yicha ketma-ket (regex bilan) tekshiradi.
+Eski jadvalda har bir yordamchi uchun /chat/<ai_type> va /api/chat/<ai_type>
+POST + OPTIONS route lari bor edi (100+ qator), yangisida bitta parametrli
+route va preflight ni CORSMiddleware bajaradi.
+
+    python -m api.routing benchmark --iterations 20000
+"""
+
+import sys
+import time
+import argparse
+from typing import List, Tuple
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Match, Route
+
+AI_TYPES = [
+    "chat", "tarjimon", "blockchain", "tadqiqot", "smart_energy", "dasturlash",
+    "tibbiy", "talim", "biznes", "huquq", "psixologik", "moliya", "sayohat",
+    "oshpazlik", "ijod", "musiqa", "sport", "obhavo", "yangiliklar", "matematik",
+    "fan", "ovozli", "arxitektura", "ekologiya", "oyun"
+]
+
+# main.py dagi umumiy route lar (ro'yxatdan o'tish tartibida)
+BASE_ROUTES = [
+    ("/", ["GET", "POST", "HEAD"]),
+    ("/api", ["GET"]),
+    ("/health", ["GET"]),
+    ("/api/health", ["GET"]),
+    ("/api/auth/google", ["POST"]),
+    ("/api/ai/{ai_id}", ["POST"]),
+]
+CHAT_MANAGEMENT_ROUTES = [
+    ("/api/chats", ["POST"]),
+    ("/api/chats/{chat_id}", ["PUT", "GET", "DELETE"]),
+    ("/api/chats/user/{user_id}", ["GET"]),
+    ("/api/chats/{chat_id}/messages", ["GET"]),
+    ("/api/chats/user/{user_id}/all", ["DELETE"]),
+    ("/api/stats/user/{user_id}", ["GET"]),
+    ("/api/stats/chart/user/{user_id}", ["GET"]),
+    ("/api/search", ["GET"]),
+    ("/conversations", ["GET"]),
+    ("/api/conversations", ["GET"]),
+]
+LEGACY_OPTIONS_ROUTES = [
+    "/api/chats", "/api/chats/{chat_id}", "/api/chats/user/{user_id}/all",
+    "/api/chats/{chat_id}/messages", "/api/stats/user/{user_id}",
+    "/api/stats/chart/user/{user_id}", "/auth/google", "/api/auth/google",
+]
+TAIL_ROUTES = [
+    ("/api/health/db", ["GET"]),
+    ("/api/ai/status", ["GET"]),
+    ("/api/metrics", ["GET"]),
+]
+
+# (method, path) - issiq yo'llar
+SAMPLE_REQUESTS = [
+    ("POST", "/api/chat/chat"),
+    ("POST", "/api/chat/oyun"),
+    ("GET", "/api/chats/user/42"),
+    ("GET", "/api/chats/abc/messages"),
+    ("GET", "/api/stats/user/42"),
+    ("GET", "/api/metrics"),
+]
+
+
+async def _endpoint(request: Request):
+    return PlainTextResponse("")
+
+
+def build_routes(parameterized: bool) -> List[Route]:
+    routes = [Route(path, _endpoint, methods=methods) for path, methods in BASE_ROUTES]
+    if parameterized:
+        routes.append(Route("/chat/{ai_type}", _endpoint, methods=["POST"]))
+        routes.append(Route("/api/chat/{ai_type}", _endpoint, methods=["POST"]))
+    else:
+        for ai_type in AI_TYPES:
+            routes.append(Route(f"/chat/{ai_type}", _endpoint, methods=["POST"]))
+            routes.append(Route(f"/api/chat/{ai_type}", _endpoint, methods=["POST"]))
+    routes.extend(Route(path, _endpoint, methods=methods) for path, methods in CHAT_MANAGEMENT_ROUTES)
+    if not parameterized:
+        routes.extend(Route(path, _endpoint, methods=["OPTIONS"]) for path in LEGACY_OPTIONS_ROUTES)
+        for ai_type in AI_TYPES:
+            routes.append(Route(f"/chat/{ai_type}", _endpoint, methods=["OPTIONS"]))
+            routes.append(Route(f"/api/chat/{ai_type}", _endpoint, methods=["OPTIONS"]))
+        routes.append(Route("/api/ai/{ai_id}", _endpoint, methods=["OPTIONS"]))
+    routes.extend(Route(path, _endpoint, methods=methods) for path, methods in TAIL_ROUTES)
+    return routes
+
+
+def match(routes: List[Route], scope: dict):
+    """Starlette Router bilan bir xil: birinchi FULL, bo'lmasa birinchi PARTIAL"""
+    partial = None
+    for route in routes:
+        result, _ = route.matches(scope)
+        if result == Match.FULL:
+            return route
+        if result == Match.PARTIAL and partial is None:
+            partial = route
+    return partial
+
+
+def benchmark(iterations: int) -> List[Tuple[str, int, float]]:
+    results = []
+    for name, parameterized in (("generated", False), ("parameterized", True)):
+        routes = build_routes(parameterized)
+        scopes = [
+            {"type": "http", "method": method, "path": path, "root_path": ""}
+            for method, path in SAMPLE_REQUESTS
+        ]
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for scope in scopes:
+                match(routes, scope)
+        elapsed = time.perf_counter() - started
+        results.append((name, len(routes), elapsed / (iterations * len(scopes)) * 1e6))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m api.routing", description="Route moslash benchmarki")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Eski va parametrli route jadvallarini solishtirish")
+    benchmark_parser.add_argument("--iterations", type=int, default=20000)
+
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.iterations)
+    for name, count, per_request_us in results:
+        print(f"TABLE:{name} ROUTES:{count} MATCH_US:{per_request_us:.2f}")
+    baseline = results[0][2]
+    print(f"SPEEDUP:{baseline / results[1][2]:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+AI Universe - javob formatlari (content negotiation)
+
+Standart format eski mijozlar uchun "status|data|message" matni bo'lib
+qoladi. Accept: application/json (yoki application/msgpack) yuborgan
+mijozlar xuddi shu ma'lumotni tuzilgan ko'rinishda oladi:
+    {"status": "success", "data": ..., "message": ...}
+    {"status": "error", "error": <kod>, "message": ...}
+Matnda "|" yoki yangi qator bo'lsa ham (masalan kod javoblari) buzilmaydi.
+JSON orjson bilan kodlanadi, msgpack ixtiyoriy.
+
+Kodlash narxi va hajmini solishtirish:
+    python -m api.wire benchmark --messages 1000
+"""
+
+import sys
+import gzip
+import json
+import time
+import argparse
+import contextvars
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+from uuid import UUID
+
+from fastapi.responses import PlainTextResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson o'rnatilmagan bo'lsa standart json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack ixtiyoriy - bo'lmasa JSON qaytariladi
+    msgpack = None
+
+FORMAT_TEXT = "text"
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+
+MEDIA_TYPES = {
+    "*/*": FORMAT_TEXT,
+    "text/*": FORMAT_TEXT,
+    "text/plain": FORMAT_TEXT,
+    "application/json": FORMAT_JSON,
+    "application/msgpack": FORMAT_MSGPACK,
+    "application/x-msgpack": FORMAT_MSGPACK,
+    "application/vnd.msgpack": FORMAT_MSGPACK,
+}
+
+_response_format = contextvars.ContextVar("response_format", default=FORMAT_TEXT)
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Accept headeridan format tanlash (q qiymatlari hisobga olinadi).
+    Teng q da eski matn formati yutadi: axios kabi kutubxonalar standart
+    "application/json, text/plain, */*" yuboradi va eski mijozlar buzilmasligi kerak.
+    """
+    best, best_q = FORMAT_TEXT, 0.0
+    for part in (accept or "").split(","):
+        media_type, _, params = part.strip().partition(";")
+        fmt = MEDIA_TYPES.get(media_type.strip().lower())
+        if fmt is None or (fmt == FORMAT_MSGPACK and msgpack is None):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q or (q == best_q and fmt == FORMAT_TEXT):
+            best, best_q = fmt, q
+    return best
+
+
+def set_response_format(accept: Optional[str]) -> contextvars.Token:
+    """Joriy so'rov uchun formatni belgilash (middleware dan)"""
+    return _response_format.set(negotiate_format(accept))
+
+
+def reset_response_format(token: contextvars.Token):
+    _response_format.reset(token)
+
+
+def response_format() -> str:
+    return _response_format.get()
+
+
+def _default(value):
+    """orjson / msgpack bilmaydigan turlar"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (UUID, bytes)):
+        return str(value)
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+
+def dumps_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_msgpack(payload) -> bytes:
+    return msgpack.packb(payload, default=_default, use_bin_type=True, datetime=False)
+
+
+class JSONWireResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+
+class MsgpackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content) -> bytes:
+        return dumps_msgpack(content)
+
+
+def _headers(headers: Optional[dict]) -> dict:
+    # Bir URL turli formatlarda qaytadi - keshlar Accept bo'yicha ajratishi kerak
+    return {**(headers or {}), "Vary": "Accept"}
+
+
+def structured_response(payload: dict, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    if response_format() == FORMAT_MSGPACK:
+        return MsgpackResponse(payload, status_code=status_code, headers=_headers(headers))
+    return JSONWireResponse(payload, status_code=status_code, headers=_headers(headers))
+
+
+def success_response(data=None, message: str = "", text: Optional[str] = None,
+                     status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """
+    Muvaffaqiyatli javob. text - eski matn formatidagi to'liq javob
+    (berilmasa "success|data|message"), data - tuzilgan formatlar uchun.
+    """
+    if response_format() == FORMAT_TEXT:
+        if text is None:
+            text = f"success|{data}|{message}"
+        return PlainTextResponse(text, status_code=status_code, headers=_headers(headers))
+    return structured_response({"status": "success", "data": data, "message": message}, status_code, headers)
+
+
+def error_response(code: str, message: str, status_code: int = 400, headers: Optional[dict] = None) -> Response:
+    """Xato javobi: "error|code|message" yoki {"status": "error", "error": code, "message": ...}"""
+    if response_format() == FORMAT_TEXT:
+        return PlainTextResponse(f"error|{code}|{message}", status_code=status_code, headers=_headers(headers))
+    return structured_response({"status": "error", "error": code, "message": message}, status_code, headers)
+
+
+# Benchmark
+SAMPLE_QUESTION = "Python da ro'yxatni qanday saralash mumkin? Misol bilan ko'rsating"
+SAMPLE_ANSWER = (
+    "Mana misol:\n\n```python\nnumbers = [5, 2, 9, 1]\nnumbers.sort()\n"
+    "print(numbers)  # [1, 2, 5, 9]\n\nresult = a if a | b else b\n```\n\n"
+    "| Usul | Natija |\n|------|--------|\n| sort() | joyida |\n| sorted() | yangi ro'yxat |\n"
+)
+
+
+def sample_history(count: int) -> list:
+    """DasturlashAI javoblariga o'xshash ("|" va yangi qatorli) xabarlar"""
+    started = datetime(2026, 1, 1)
+    return [
+        {
+            "id": f"00000000-0000-4000-8000-{index:012d}",
+            "content": f"{SAMPLE_QUESTION} #{index}",
+            "ai_response": SAMPLE_ANSWER * (1 + index % 4),
+            "timestamp": started + timedelta(seconds=index)
+        }
+        for index in range(count)
+    ]
+
+
+def encode_legacy(messages: list) -> bytes:
+    lines = [
+        f"MSG:{msg['id']}|{msg['content']}|{msg['ai_response']}|{msg['timestamp']}"
+        for msg in messages
+    ]
+    return f"success|{chr(10).join(lines)}|Messages retrieved".encode("utf-8")
+
+
+def legacy_lossless(messages: list) -> bool:
+    """Eski formatni qayta parse qilib bo'ladimi (har bir MSG qatori 4 maydon)"""
+    body = encode_legacy(messages).decode("utf-8")
+    lines = body.split("|", 1)[1].rsplit("|", 1)[0].split("\n")
+    parsed = [line for line in lines if line.startswith("MSG:")]
+    return len(parsed) == len(messages) and all(len(line.split("|")) == 4 for line in parsed)
+
+
+def _measure(fn, repeat: int) -> tuple:
+    best = float("inf")
+    payload = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        payload = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, payload
+
+
+def benchmark(count: int, repeat: int = 5) -> list:
+    messages = sample_history(count)
+    envelope = {"status": "success", "data": {"messages": messages, "next_cursor": None}, "message": "Messages retrieved"}
+
+    encoders = [
+        ("legacy_pipe", lambda: encode_legacy(messages)),
+        ("json_stdlib", lambda: json.dumps(envelope, default=_default, ensure_ascii=False).encode("utf-8")),
+    ]
+    if orjson is not None:
+        encoders.append(("orjson", lambda: orjson.dumps(envelope, default=_default)))
+    if msgpack is not None:
+        encoders.append(("msgpack", lambda: dumps_msgpack(envelope)))
+
+    results = []
+    for name, fn in encoders:
+        encode_ms, payload = _measure(fn, repeat)
+        results.append({
+            "format": name,
+            "encode_ms": round(encode_ms, 3),
+            "bytes": len(payload),
+            "gzip_bytes": len(gzip.compress(payload, 6)),
+            "lossless": legacy_lossless(messages) if name == "legacy_pipe" else True
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m api.wire", description="Javob formatlarini solishtirish")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Katta suhbat tarixi uchun kodlash narxi va hajm")
+    benchmark_parser.add_argument("--messages", type=int, action="append",
+                                  help="Xabarlar soni (bir necha marta berish mumkin), standart: 100, 1000, 5000")
+    benchmark_parser.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args(argv)
+
+    for count in args.messages or [100, 1000, 5000]:
+        for result in benchmark(count, args.repeat):
+            print(
+                f"MESSAGES:{count} FORMAT:{result['format']} ENCODE_MS:{result['encode_ms']} "
+                f"BYTES:{result['bytes']} GZIP_BYTES:{result['gzip_bytes']} LOSSLESS:{result['lossless']}"
+            )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
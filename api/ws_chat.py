@@ -0,0 +1,290 @@
+"""
+AI Universe - WebSocket chat kanali (/ws/chat)
+
+Bitta ulanish - bitta sessiya: foydalanuvchi birinchi kadrda bir marta
+tekshiriladi, foydalanuvchi yozuvi, tanlangan yordamchi va suhbat konteksti
+sessiya davomida xotirada turadi. Har bir xabar uchun JSON qayta parse,
+yordamchini qidirish va tarixni DB dan o'qish takrorlanmaydi.
+
+Protokol (JSON matn kadrlari):
+    -> {"type": "auth", "user_id": "...", "ai_type": "chat", "conversation_id": null}
+    <- {"type": "ready", "session_id": "...", "ai_type": "chat", "conversation_id": null}
+    -> {"type": "message", "id": "m1", "message": "Salom"}
+    <- {"type": "token", "id": "m1", "data": "Sa"} ...
+    <- {"type": "done", "id": "m1", "conversation_id": "..."}
+    -> {"type": "bind", "ai_type": "tarjimon", "conversation_id": null}
+    <- {"type": "bound", "ai_type": "tarjimon", "conversation_id": "..."}
+    -> {"type": "ping"}  <-  {"type": "pong"}
+
+Xabarlarni javobni kutmasdan ketma-ket yuborish mumkin (pipelining):
+ular kelgan tartibda qayta ishlanadi va javoblar ham shu tartibda keladi.
+"bind" ham navbatda turadi - undan oldingi xabarlar eski yordamchiga ketadi;
+conversation_id berilmasa yangi suhbat boshlanadi; berilgan suhbat shu
+foydalanuvchiga tegishli bo'lmasa "conversation_not_found" xatosi keladi.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import structlog
+
+from ai.base import AIServiceError
+
+from .wire import dumps_json
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# auth kadri shu vaqt ichida kelmasa ulanish yopiladi
+WS_AUTH_TIMEOUT = _env_float("WS_AUTH_TIMEOUT", 10.0)
+# Javob kutayotgan xabarlar soni (oshsa "pipeline_full" xatosi)
+WS_MAX_PIPELINE = _env_int("WS_MAX_PIPELINE", 16)
+# Sessiya xotirasidagi suhbat turlari
+WS_HISTORY_TURNS = _env_int("WS_HISTORY_TURNS", 20)
+
+# RFC 6455: 1008 - policy violation
+WS_CLOSE_POLICY = 1008
+
+logger = structlog.get_logger("api.ws_chat")
+
+
+class ChatSessionStats:
+    """Process bo'yicha WebSocket sessiyalari hisoblagichlari"""
+
+    def __init__(self):
+        self.open = 0
+        self.opened = 0
+        self.auth_failed = 0
+        self.messages = 0
+        self.tokens = 0
+        self.rejected = 0
+        self.errors = 0
+        self.max_pipeline = 0
+
+    def stats(self) -> dict:
+        return {
+            "open": self.open,
+            "opened": self.opened,
+            "auth_failed": self.auth_failed,
+            "messages": self.messages,
+            "tokens": self.tokens,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "max_pipeline": self.max_pipeline
+        }
+
+
+chat_sessions = ChatSessionStats()
+
+
+class ChatSession:
+    """
+    Bitta WebSocket ulanishi holati. DB va yordamchilarga bog'liqliklar
+    tashqaridan beriladi (main.py dagi funksiyalar):
+        authenticate(user_id) -> foydalanuvchi yozuvi yoki None
+        load_history(conversation_id, user_id) -> [(savol, javob), ...] yoki None (suhbat
+            foydalanuvchiga tegishli emas)
+        persist(message, user_id, conversation_id, ai_type, ai_response) -> conversation_id
+    """
+
+    def __init__(self, websocket, assistants: dict,
+                 authenticate: Callable[[str], Awaitable[Optional[dict]]],
+                 load_history: Callable[[str, str], Awaitable[Optional[List[Tuple[str, str]]]]],
+                 persist: Callable[..., Awaitable[Optional[str]]]):
+        self.websocket = websocket
+        self.assistants = assistants
+        self.authenticate = authenticate
+        self.load_history = load_history
+        self.persist = persist
+
+        self.session_id = uuid.uuid4().hex
+        self.user: Optional[dict] = None
+        self.ai_type: Optional[str] = None
+        self.assistant = None
+        self.conversation_id: Optional[str] = None
+        self.history: List[Tuple[str, str]] = []
+
+        self._jobs: asyncio.Queue = asyncio.Queue()
+        self._send_lock = asyncio.Lock()
+        self.messages = 0
+
+    async def send(self, payload: dict):
+        # Token lar va pong turli task lardan yuboriladi - kadrlar aralashmasligi uchun lock
+        async with self._send_lock:
+            await self.websocket.send_text(dumps_json(payload).decode("utf-8"))
+
+    async def send_error(self, code: str, message: str, message_id=None):
+        await self.send({"type": "error", "id": message_id, "code": code, "message": message})
+
+    async def run(self):
+        """Ulanishni qabul qilish, autentifikatsiya va xabarlar sikli"""
+        await self.websocket.accept()
+        if not await self.handshake():
+            chat_sessions.auth_failed += 1
+            try:
+                await self.websocket.close(code=WS_CLOSE_POLICY)
+            except RuntimeError:
+                # Mijoz allaqachon uzilgan
+                pass
+            return
+
+        chat_sessions.open += 1
+        chat_sessions.opened += 1
+        started = time.monotonic()
+        worker = asyncio.create_task(self._process_jobs())
+        try:
+            await self._read_frames()
+        finally:
+            # Uzilganda davom etayotgan LLM stream ham bekor qilinadi
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+            chat_sessions.open -= 1
+            logger.info("ws_session_closed", session_id=self.session_id, user_id=self.user["id"],
+                        messages=self.messages, duration_ms=round((time.monotonic() - started) * 1000, 2))
+
+    async def handshake(self) -> bool:
+        try:
+            frame = await asyncio.wait_for(self.websocket.receive_json(), WS_AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.send_error("auth_timeout", "Auth frame expected")
+            return False
+        except (ValueError, KeyError):
+            # JSON bo'lmagan matn (ValueError) yoki binary kadr (KeyError)
+            await self.send_error("invalid_json", "Invalid JSON data")
+            return False
+        except Exception:
+            # WebSocketDisconnect va uzilgan transport
+            return False
+
+        if not isinstance(frame, dict) or frame.get("type") != "auth" or not frame.get("user_id"):
+            await self.send_error("auth_required", "First frame must be {type: auth, user_id}")
+            return False
+
+        try:
+            self.user = await self.authenticate(str(frame["user_id"]))
+            error = await self.bind(frame.get("ai_type") or "chat", frame.get("conversation_id")) if self.user else None
+        except Exception as e:
+            logger.error("ws_auth_failed", error=str(e))
+            await self.send_error("auth_failed", "Authentication failed, please retry")
+            return False
+
+        if not self.user:
+            await self.send_error("user_not_found", "User not found")
+            return False
+        if error:
+            await self.send_error(*error)
+            return False
+
+        structlog.contextvars.bind_contextvars(session_id=self.session_id, user_id=self.user["id"])
+        await self.send({"type": "ready", "session_id": self.session_id,
+                         "ai_type": self.ai_type, "conversation_id": self.conversation_id})
+        return True
+
+    async def bind(self, ai_type: str, conversation_id: Optional[str]) -> Optional[Tuple[str, str]]:
+        """Yordamchi va suhbatni sessiyaga bog'lash (xato bo'lsa (code, message))"""
+        assistant = self.assistants.get(ai_type)
+        if assistant is None:
+            return "invalid_ai_type", f"AI type '{ai_type}' not found"
+
+        if conversation_id is None or conversation_id != self.conversation_id:
+            # Tarix faqat suhbat almashganda bir marta o'qiladi, keyin xotirada yuritiladi
+            history = await self.load_history(conversation_id, self.user["id"]) if conversation_id else []
+            if history is None:
+                return "conversation_not_found", "Conversation not found or access denied"
+            self.history = history
+        self.ai_type = ai_type
+        self.assistant = assistant
+        self.conversation_id = conversation_id
+        return None
+
+    async def _read_frames(self):
+        while True:
+            try:
+                frame = await self.websocket.receive_json()
+            except (ValueError, KeyError):
+                await self.send_error("invalid_json", "Invalid JSON data")
+                continue
+            except Exception:
+                # WebSocketDisconnect va uzilgan transport
+                return
+
+            frame_type = frame.get("type") if isinstance(frame, dict) else None
+            if frame_type == "ping":
+                await self.send({"type": "pong"})
+            elif frame_type in ("message", "bind"):
+                if frame_type == "message" and not frame.get("message"):
+                    await self.send_error("missing_message", "Message is required", frame.get("id"))
+                elif self._jobs.qsize() >= WS_MAX_PIPELINE:
+                    chat_sessions.rejected += 1
+                    await self.send_error("pipeline_full", f"Too many pending messages (max {WS_MAX_PIPELINE})",
+                                          frame.get("id"))
+                else:
+                    self._jobs.put_nowait(frame)
+                    chat_sessions.max_pipeline = max(chat_sessions.max_pipeline, self._jobs.qsize())
+            else:
+                message_id = frame.get("id") if isinstance(frame, dict) else None
+                await self.send_error("invalid_frame", f"Unknown frame type '{frame_type}'", message_id)
+
+    async def _process_jobs(self):
+        # Bitta task navbatni ketma-ket o'qiydi - javoblar xabarlar tartibida
+        while True:
+            frame = await self._jobs.get()
+            try:
+                if frame["type"] == "bind":
+                    error = await self.bind(frame.get("ai_type") or self.ai_type, frame.get("conversation_id"))
+                    if error:
+                        await self.send_error(*error, frame.get("id"))
+                    else:
+                        await self.send({"type": "bound", "id": frame.get("id"), "ai_type": self.ai_type,
+                                         "conversation_id": self.conversation_id})
+                else:
+                    await self.reply(frame.get("id"), str(frame["message"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                chat_sessions.errors += 1
+                logger.error("ws_chat_failed", ai_type=self.ai_type, error=str(e))
+                # Qisman javob saqlanmaydi; xato alohida "error" frame bo'lib boradi
+                code = e.code if isinstance(e, AIServiceError) else "chat_failed"
+                await self.send_error(code, str(e), frame.get("id"))
+
+    async def reply(self, message_id, message: str):
+        chunks = []
+        async for token in self.assistant.stream_response(message, self.history or None):
+            chunks.append(token)
+            await self.send({"type": "token", "id": message_id, "data": token})
+        ai_response = "".join(chunks).strip()
+
+        try:
+            self.conversation_id = await self.persist(message, self.user["id"], self.conversation_id,
+                                                      self.ai_type, ai_response) or self.conversation_id
+        except Exception as db_error:
+            # HTTP chat kabi: DB xatosi bo'lsa ham javob yetkaziladi
+            logger.error("ws_chat_persist_failed", error=str(db_error))
+
+        self.history.append((message, ai_response))
+        del self.history[:-WS_HISTORY_TURNS]
+
+        self.messages += 1
+        chat_sessions.messages += 1
+        chat_sessions.tokens += len(chunks)
+        # Saqlanmagan yangi suhbat uchun null - keyingi xabar ham yangi suhbat sifatida saqlanadi
+        await self.send({"type": "done", "id": message_id, "conversation_id": self.conversation_id})
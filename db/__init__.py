@@ -0,0 +1,28 @@
+"""
+AI Universe - Database qatlami
+PostgreSQL uchun asinxron connection pool (psycopg 3), o'qish replikalari
+va embedded SQLite (WAL) backend
+"""
+
+from .pool import (
+    init_database, close_database, get_db_connection, get_pool, get_dialect, is_sqlite,
+    pool_stats, DatabaseBusyError
+)
+from .schema import create_tables, ensure_schema
+from .replicas import get_read_connection, replica_router, ReplicaStickyMiddleware
+
+__all__ = [
+    'init_database',
+    'close_database',
+    'get_db_connection',
+    'get_pool',
+    'get_dialect',
+    'is_sqlite',
+    'pool_stats',
+    'DatabaseBusyError',
+    'create_tables',
+    'ensure_schema',
+    'get_read_connection',
+    'replica_router',
+    'ReplicaStickyMiddleware'
+]
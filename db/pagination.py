@@ -0,0 +1,61 @@
+"""
+AI Universe - keyset (cursor) pagination yordamchilari
+
+Cursor (vaqt, id) juftligini base64url token ko'rinishida saqlaydi,
+shuning uchun keyingi sahifa OFFSET siz, index bo'yicha olinadi.
+Qidiruv natijalari (relevance tartibi) uchun offset cursor ham bor.
+"""
+
+import os
+import json
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+PAGE_SIZE_DEFAULT = _env_int("PAGE_SIZE_DEFAULT", 20)
+PAGE_SIZE_MAX = _env_int("PAGE_SIZE_MAX", 100)
+
+
+def encode_cursor(timestamp: datetime, row_id: str) -> str:
+    payload = json.dumps([timestamp.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, str]:
+    """Cursor tokenni (vaqt, id) ga aylantirish (noto'g'ri bo'lsa ValueError)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """Relevance bo'yicha tartiblangan natijalar uchun (keyset qo'llanmaydi)"""
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_offset_cursor(token: str) -> int:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        offset = int(json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["o"])
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+    if offset < 0:
+        raise ValueError("Invalid pagination cursor")
+    return offset
+
+
+def page_size(limit: Optional[int]) -> int:
+    if not limit or limit <= 0:
+        return PAGE_SIZE_DEFAULT
+    return min(limit, PAGE_SIZE_MAX)
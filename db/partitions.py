@@ -0,0 +1,449 @@
+"""
+AI Universe - messages jadvalining oylik partitionlari va sovuq arxiv
+
+Partitionlar oldindan yaratiladi (server ishga tushganda va har
+PARTITION_CHECK_INTERVAL da). DDL ni advisory lock olgan bitta process
+bajaradi, qolgan worker lar tekshiruvni o'tkazib yuboradi;
+PARTITION_MAINTENANCE_ENABLED=false bilan fon vazifa o'chiriladi va
+`ensure` cron orqali ishga tushiriladi. Yangi oy partitioni mavjud
+partitionlar (masalan messages_legacy) qoplagan qismdan keyin boshlanadi.
+
+Chegarasi (TO) MESSAGE_ARCHIVE_AFTER_MONTHS dan eski partitionlar -
+oylik ham, messages_legacy ham - Parquet (zstd) fayllarga eksport
+qilinadi, jadvaldan detach qilinadi va archived_partitions da qayd
+etiladi. Arxivdagi xabarlar get_chat_details orqali sekinroq yo'l bilan
+o'qiladi; o'chirilgan suhbatlarning arxivdagi qatorlari
+conversation_tombstones orqali yashiriladi (suhbat id si qayta ishlatilsa
+ham eski xabarlar ko'rinmaydi).
+
+CLI:
+    python -m db.partitions ensure --ahead 3
+    python -m db.partitions archive --older-than 12 --dir archive
+    python -m db.partitions archive --partition messages_legacy
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from .pool import get_db_connection, is_sqlite
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+PARTITION_MAINTENANCE_ENABLED = os.getenv("PARTITION_MAINTENANCE_ENABLED", "true").lower() == "true"
+MESSAGE_PARTITIONS_AHEAD = _env_int("MESSAGE_PARTITIONS_AHEAD", 3)
+PARTITION_CHECK_INTERVAL = _env_float("PARTITION_CHECK_INTERVAL", 12 * 3600)
+MESSAGE_ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR", "archive")
+MESSAGE_ARCHIVE_AFTER_MONTHS = _env_int("MESSAGE_ARCHIVE_AFTER_MONTHS", 12)
+ARCHIVE_INDEX_TTL = _env_float("ARCHIVE_INDEX_TTL", 60.0)
+
+# pg_try_advisory_lock kaliti: partition DDL ni bir vaqtda faqat bitta process bajaradi
+PARTITION_LOCK_KEY = 727100215
+
+ARCHIVE_COLUMNS = ["id", "conversation_id", "user_id", "content", "ai_response", "timestamp"]
+
+PARTITIONS_SQL = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'messages'::regclass
+    ORDER BY c.relname
+"""
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1, day=1,
+                         hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_start(value: datetime) -> datetime:
+    return add_months(value, 0)
+
+
+def partition_name(start: datetime) -> str:
+    return f"messages_y{start.year}m{start.month:02d}"
+
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def _bound_value(raw: str) -> Optional[datetime]:
+    raw = raw.strip()
+    if raw in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(raw.strip("'"))
+
+
+def parse_partition_bounds(expr: str) -> Optional[Tuple[Optional[datetime], Optional[datetime]]]:
+    """"FOR VALUES FROM (...) TO (...)" -> (start, end); MINVALUE/MAXVALUE - None, DEFAULT - None"""
+    match = _BOUND_RE.search(expr or "")
+    if not match:
+        return None
+    return _bound_value(match.group(1)), _bound_value(match.group(2))
+
+
+def free_range(start: datetime, end: datetime, ranges) -> Optional[Tuple[datetime, datetime]]:
+    """[start, end) ning mavjud partitionlar qoplamagan qismi (boshi qoplangan bo'lsa qisqaradi)"""
+    for low, high in sorted(ranges, key=lambda item: item[0] or datetime.min):
+        if (low is None or low <= start) and (high is None or start < high):
+            if high is None:
+                return None
+            start = high
+    return (start, end) if start < end else None
+
+
+async def is_partitioned(cur) -> bool:
+    await cur.execute("SELECT relkind FROM pg_class WHERE relname = 'messages' AND relkind = 'p'")
+    return await cur.fetchone() is not None
+
+
+async def ensure_message_partitions(months_ahead: int = MESSAGE_PARTITIONS_AHEAD) -> List[str]:
+    """Joriy va keyingi oylar uchun partitionlarni yaratish (yaratilganlar ro'yxati)"""
+    created = []
+    if is_sqlite():
+        return created
+    now = month_start(datetime.utcnow())
+
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            if not await is_partitioned(cur):
+                return created
+            # Boshqa worker (yoki cron) hozir tekshirayotgan bo'lsa o'tkazib yuboramiz
+            await cur.execute("SELECT pg_try_advisory_lock(%s)", (PARTITION_LOCK_KEY,))
+            if not (await cur.fetchone())[0]:
+                await conn.commit()
+                return created
+
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(PARTITIONS_SQL)
+                partitions = await cur.fetchall()
+            await conn.commit()
+
+            existing = {name for name, _ in partitions}
+            ranges = [bounds for bounds in (parse_partition_bounds(expr) for _, expr in partitions) if bounds]
+            for offset in range(months_ahead + 1):
+                start = add_months(now, offset)
+                name = partition_name(start)
+                bounds = free_range(start, add_months(start, 1), ranges)
+                if name in existing or bounds is None:
+                    continue
+                try:
+                    async with conn.transaction():
+                        await conn.execute(
+                            f"CREATE TABLE {name} PARTITION OF messages "
+                            f"FOR VALUES FROM ('{bounds[0].isoformat()}') TO ('{bounds[1].isoformat()}')"
+                        )
+                    created.append(name)
+                    ranges.append(bounds)
+                except Exception as e:
+                    # Odatda: default partitionda shu oy qatorlari bor
+                    print(f"⚠️ Partition {name} yaratilmadi: {e}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(%s)", (PARTITION_LOCK_KEY,))
+            await conn.commit()
+
+    if created:
+        print(f"✅ Message partitions created: {', '.join(created)}")
+    return created
+
+
+class PartitionMaintainer:
+    """Kelgusi oylar partitionlarini vaqti-vaqti bilan yaratuvchi fon vazifa"""
+
+    def __init__(self, interval: float = PARTITION_CHECK_INTERVAL, months_ahead: int = MESSAGE_PARTITIONS_AHEAD):
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self._task: Optional[asyncio.Task] = None
+        self.created = 0
+        self.errors = 0
+        self.last_check: Optional[datetime] = None
+
+    async def start(self):
+        if not PARTITION_MAINTENANCE_ENABLED or self._task is not None:
+            return
+        # Birinchi tekshiruv ham fon task da - worker startup uni kutmaydi
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    async def check(self):
+        try:
+            self.created += len(await ensure_message_partitions(self.months_ahead))
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Partition maintenance error: {e}")
+        self.last_check = datetime.utcnow()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": PARTITION_MAINTENANCE_ENABLED,
+            "months_ahead": self.months_ahead,
+            "created": self.created,
+            "errors": self.errors,
+            "last_check": self.last_check.isoformat() if self.last_check else "never"
+        }
+
+
+class ArchiveIndex:
+    """archived_partitions jadvalining xotiradagi nusxasi (TTL bilan)"""
+
+    def __init__(self, ttl: float = ARCHIVE_INDEX_TTL):
+        self.ttl = ttl
+        self._entries = []  # (range_start, range_end, path)
+        self._loaded_at = 0.0
+        self.reads = 0
+        self.read_rows = 0
+        self.hidden_rows = 0
+
+    async def refresh(self):
+        if is_sqlite():
+            self._entries = []
+            self._loaded_at = time.monotonic()
+            return
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT range_start, range_end, path FROM archived_partitions")
+                    self._entries = await cur.fetchall()
+        except Exception:
+            # Migratsiya hali qo'llanmagan - arxiv yo'q
+            self._entries = []
+        self._loaded_at = time.monotonic()
+
+    async def paths_for(self, start: Optional[datetime], end: Optional[datetime]) -> List[str]:
+        """Suhbat vaqt oralig'i bilan kesishadigan arxiv fayllari"""
+        if time.monotonic() - self._loaded_at > self.ttl:
+            await self.refresh()
+        return [
+            path for range_start, range_end, path in self._entries
+            if (end is None or range_start <= end) and (start is None or range_end >= start)
+        ]
+
+    async def deleted_before(self, conversation_id: str) -> Optional[datetime]:
+        """Shu id li oldingi suhbat o'chirilgan vaqt (tombstone), bo'lmasa None"""
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        "SELECT deleted_at FROM conversation_tombstones WHERE conversation_id = %s",
+                        (conversation_id,)
+                    )
+                    row = await cur.fetchone()
+        except Exception:
+            # Migratsiya hali qo'llanmagan - tombstone yo'q
+            return None
+        return row[0] if row else None
+
+    async def load_messages(self, conversation_id: str, start: Optional[datetime], end: Optional[datetime]) -> List[dict]:
+        """Arxivlangan xabarlar, (timestamp, id) bo'yicha o'sish tartibida"""
+        paths = await self.paths_for(start, end)
+        if not paths:
+            return []
+        rows = await asyncio.to_thread(read_archived_messages, paths, conversation_id)
+        self.reads += 1
+        self.read_rows += len(rows)
+
+        # O'chirilgan (oldingi) suhbatga tegishli qatorlar jonli suhbatga qo'shilmaydi
+        deleted_before = await self.deleted_before(conversation_id) if rows else None
+        if deleted_before is not None:
+            live_rows = [row for row in rows if row["timestamp"] > deleted_before]
+            self.hidden_rows += len(rows) - len(live_rows)
+            rows = live_rows
+        return rows
+
+    def stats(self) -> dict:
+        return {
+            "archives": len(self._entries),
+            "reads": self.reads,
+            "read_rows": self.read_rows,
+            "hidden_rows": self.hidden_rows
+        }
+
+
+def read_archived_messages(paths: List[str], conversation_id: str) -> List[dict]:
+    import pandas as pd
+
+    rows = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"⚠️ Archive file missing: {path}")
+            continue
+        frame = pd.read_parquet(path, columns=ARCHIVE_COLUMNS, filters=[("conversation_id", "==", conversation_id)])
+        for record in frame.to_dict("records"):
+            record["timestamp"] = record["timestamp"].to_pydatetime()
+            rows.append(record)
+    rows.sort(key=lambda row: (row["timestamp"], row["id"]))
+    return rows
+
+
+# Process uchun yagona obyektlar
+partition_maintainer = PartitionMaintainer()
+archive_index = ArchiveIndex()
+
+
+# Arxivlash (CLI, sinxron psycopg)
+def archive_partition(conn, name: str, directory: str, chunk_size: int = 50000, drop: bool = True) -> dict:
+    """Partitionni Parquet ga yozish, tekshirish, detach qilish va qayd etish"""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, f"{name}.parquet"))
+    tmp_path = path + ".tmp"
+
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT MIN(timestamp), MAX(timestamp), COUNT(*) FROM {name}")
+        range_start, range_end, row_count = cur.fetchone()
+
+    if row_count:
+        writer = None
+        written = 0
+        # Server-side cursor: partition xotiraga to'liq yuklanmaydi
+        with conn.cursor(name=f"archive_{name}") as cur:
+            cur.execute(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {name} ORDER BY timestamp, id")
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                table = pa.Table.from_pandas(pd.DataFrame(rows, columns=ARCHIVE_COLUMNS), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+                writer.write_table(table)
+                written += len(rows)
+        writer.close()
+        conn.commit()
+
+        if pq.ParquetFile(tmp_path).metadata.num_rows != row_count or written != row_count:
+            os.remove(tmp_path)
+            raise RuntimeError(f"{name}: Parquet qatorlari soni mos kelmadi ({written} != {row_count})")
+        os.replace(tmp_path, path)
+
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE messages DETACH PARTITION {name}")
+            if row_count:
+                cur.execute("""
+                    INSERT INTO archived_partitions (partition_name, range_start, range_end, path, row_count)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (partition_name) DO UPDATE
+                    SET range_start = EXCLUDED.range_start, range_end = EXCLUDED.range_end,
+                        path = EXCLUDED.path, row_count = EXCLUDED.row_count, archived_at = now()
+                """, (name, range_start, range_end, path, row_count))
+            if drop:
+                cur.execute(f"DROP TABLE {name}")
+
+    return {"partition": name, "rows": row_count, "path": path if row_count else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m db.partitions", description="messages partitionlari va arxiv")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ensure_parser = subparsers.add_parser("ensure", help="Kelgusi oylar uchun partitionlar yaratish")
+    ensure_parser.add_argument("--ahead", type=int, default=MESSAGE_PARTITIONS_AHEAD)
+
+    archive_parser = subparsers.add_parser("archive", help="Eski partitionlarni Parquet ga eksport qilib detach qilish")
+    archive_parser.add_argument("--older-than", type=int, default=MESSAGE_ARCHIVE_AFTER_MONTHS,
+                                help="Chegarasi (TO) shuncha oydan eski partitionlar")
+    archive_parser.add_argument("--partition", action="append", help="Aniq partition nomi (masalan messages_legacy)")
+    archive_parser.add_argument("--force", action="store_true",
+                                help="--partition dagi yangi (--older-than dan yosh) partitionni ham arxivlash")
+    archive_parser.add_argument("--dir", default=MESSAGE_ARCHIVE_DIR)
+    archive_parser.add_argument("--keep-table", action="store_true", help="Detach qilingan jadvalni o'chirmaslik")
+    archive_parser.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "ensure":
+        from .pool import init_database, close_database
+
+        async def run():
+            if not await init_database():
+                raise SystemExit(1)
+            try:
+                await ensure_message_partitions(args.ahead)
+            finally:
+                await close_database()
+
+        asyncio.run(run())
+        return
+
+    import psycopg
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("❌ DATABASE_URL topilmadi")
+
+    with psycopg.connect(database_url, sslmode=os.getenv("DATABASE_SSLMODE", "require")) as conn:
+        with conn.cursor() as cur:
+            cur.execute(PARTITIONS_SQL)
+            partitions = {name: parse_partition_bounds(expr) for name, expr in cur.fetchall()}
+        conn.commit()
+
+        # Faqat butunlay cutoff dan eski partitionlar (default partition chegarasiz - hech qachon)
+        cutoff = add_months(month_start(datetime.utcnow()), -args.older_than)
+        old_enough = {
+            name for name, bounds in partitions.items()
+            if bounds and bounds[1] is not None and bounds[1] <= cutoff
+        }
+
+        if args.partition:
+            targets = []
+            for name in args.partition:
+                if name not in partitions:
+                    print(f"⚠️ {name}: partition topilmadi")
+                elif name not in old_enough and not args.force:
+                    print(f"⚠️ {name}: yangi xabarlar bor ({args.older_than} oydan yosh), --force bilan arxivlash mumkin")
+                else:
+                    targets.append(name)
+        else:
+            targets = sorted(old_enough, key=lambda name: partitions[name][1])
+
+        if not targets:
+            print("📊 Arxivlanadigan partition yo'q")
+            return
+
+        for name in targets:
+            if args.dry_run:
+                print(f"   {name}")
+                continue
+            result = archive_partition(conn, name, args.dir, drop=not args.keep_table)
+            print(f"✅ {result['partition']}: {result['rows']} rows -> {result['path']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+AI Universe - asinxron PostgreSQL connection pool
+
+Barcha so'rovlar event loop ni bloklamasdan psycopg 3 AsyncConnectionPool
+orqali bajariladi. DATABASE_URL=sqlite:///... yoki DATABASE_BACKEND=sqlite
+bo'lsa embedded SQLite (WAL) backend ishlatiladi.
+"""
+
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import structlog
+from psycopg_pool import AsyncConnectionPool, PoolTimeout, TooManyRequests
+
+from .sqlite_backend import SQLiteDatabase, parse_sqlite_url
+
+db_pool: Optional[AsyncConnectionPool] = None
+db_dialect: Optional[str] = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def pool_max_size() -> int:
+    """
+    Worker boshiga pool hajmi. DB_POOL_TOTAL_MAX_SIZE berilsa u gunicorn
+    workerlari (WEB_CONCURRENCY) orasida bo'linadi, aks holda DB_POOL_MAX_SIZE.
+    """
+    total = _env_int("DB_POOL_TOTAL_MAX_SIZE", 0)
+    if total > 0:
+        return max(1, total // max(1, _env_int("WEB_CONCURRENCY", 1)))
+    return _env_int("DB_POOL_MAX_SIZE", 20)
+
+
+# Bo'sh connection kutish vaqti va navbat uzunligi - keyin 503
+DB_POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 10.0)
+DB_POOL_MAX_WAITING = _env_int("DB_POOL_MAX_WAITING", 200)
+DB_POOL_MAX_LIFETIME = _env_float("DB_POOL_MAX_LIFETIME", 1800.0)
+DB_POOL_MAX_IDLE = _env_float("DB_POOL_MAX_IDLE", 300.0)
+DB_POOL_OPEN_TIMEOUT = _env_float("DB_POOL_OPEN_TIMEOUT", 30.0)
+# Berishdan oldin connectionni tekshirish (pre-ping)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Connection kutish shundan oshsa log yoziladi (request_id bilan)
+DB_SLOW_ACQUIRE_MS = _env_float("DB_SLOW_ACQUIRE_MS", 100.0)
+
+logger = structlog.get_logger("db.pool")
+
+
+class DatabaseBusyError(Exception):
+    """Pool to'la va kutish navbati/timeout tugadi - mijozga 503"""
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.checkouts = 0
+        self.busy_errors = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record_wait(self, wait_ms: float):
+        self.checkouts += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+
+pool_metrics = PoolMetrics()
+
+
+def get_database_url() -> Optional[str]:
+    """DATABASE_URL (faqat PostgreSQL)"""
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url or not database_url.startswith(("postgresql://", "postgres://")):
+        return None
+    return database_url
+
+
+def get_sqlite_path() -> Optional[str]:
+    """Embedded rejim uchun fayl yo'li (SQLite tanlanmagan bo'lsa None)"""
+    database_url = os.getenv("DATABASE_URL", "")
+    if database_url.startswith("sqlite:///"):
+        return parse_sqlite_url(database_url)
+    if os.getenv("DATABASE_BACKEND", "").lower() == "sqlite":
+        return parse_sqlite_url("")
+    return None
+
+
+def get_pool() -> Optional[AsyncConnectionPool]:
+    return db_pool
+
+
+def get_dialect() -> Optional[str]:
+    """"postgresql", "sqlite" yoki None (database yo'q)"""
+    return db_dialect
+
+
+def is_sqlite() -> bool:
+    return db_dialect == "sqlite"
+
+
+def sql_greatest() -> str:
+    """Ikki qiymatning kattasi: PostgreSQL GREATEST, SQLite skalyar MAX"""
+    return "MAX" if is_sqlite() else "GREATEST"
+
+
+async def init_database() -> bool:
+    """PostgreSQL connection pool (yoki embedded SQLite) yaratish"""
+    global db_pool, db_dialect
+
+    sqlite_path = get_sqlite_path()
+    if sqlite_path:
+        try:
+            db_pool = SQLiteDatabase(sqlite_path)
+            await db_pool.open()
+            db_dialect = "sqlite"
+            print(f"✅ SQLite (WAL) database: {sqlite_path}")
+            return True
+        except Exception as e:
+            print(f"❌ SQLite open error: {e}")
+            db_pool = None
+            return False
+
+    database_url = get_database_url()
+    if not database_url:
+        print("❌ PostgreSQL DATABASE_URL topilmadi")
+        return False
+
+    try:
+        max_size = pool_max_size()
+        db_pool = AsyncConnectionPool(
+            database_url,
+            min_size=min(_env_int("DB_POOL_MIN_SIZE", 2), max_size),
+            max_size=max_size,
+            timeout=DB_POOL_TIMEOUT,
+            max_waiting=DB_POOL_MAX_WAITING,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            max_idle=DB_POOL_MAX_IDLE,
+            check=AsyncConnectionPool.check_connection if DB_POOL_PRE_PING else None,
+            kwargs={
+                "sslmode": os.getenv("DATABASE_SSLMODE", "require"),
+                # O'lik TCP ulanishlarni tezroq aniqlash
+                "keepalives": 1,
+                "keepalives_idle": _env_int("DB_KEEPALIVES_IDLE", 30),
+                "keepalives_interval": 10,
+                "keepalives_count": 3
+            },
+            open=False
+        )
+        # Warm-up: min_size connection ochilguncha kutiladi
+        await db_pool.open(wait=True, timeout=DB_POOL_OPEN_TIMEOUT)
+        db_dialect = "postgresql"
+
+        print(f"✅ PostgreSQL async pool yaratildi (min={db_pool.min_size}, max={db_pool.max_size}, timeout={DB_POOL_TIMEOUT}s)")
+
+        # Test connection
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT version()")
+                version = (await cur.fetchone())[0]
+                print(f"✅ PostgreSQL version: {version[:50]}...")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ PostgreSQL connection error: {e}")
+        if db_pool:
+            await db_pool.close()
+            db_pool = None
+        db_dialect = None
+        return False
+
+
+@asynccontextmanager
+async def get_db_connection():
+    """
+    Database connection olish (blok oxirida pool ga qaytariladi).
+    Bo'sh connection DB_POOL_TIMEOUT ichida topilmasa DatabaseBusyError.
+    """
+    if not db_pool:
+        raise Exception("Database pool mavjud emas")
+
+    started = time.perf_counter()
+    acquired = False
+    try:
+        async with db_pool.connection() as conn:
+            acquired = True
+            wait_ms = (time.perf_counter() - started) * 1000
+            pool_metrics.record_wait(wait_ms)
+            if wait_ms >= DB_SLOW_ACQUIRE_MS:
+                logger.warning("db_pool_slow_acquire", wait_ms=round(wait_ms, 2))
+            yield conn
+    except (PoolTimeout, TooManyRequests) as e:
+        if acquired:
+            raise
+        pool_metrics.busy_errors += 1
+        logger.warning("db_pool_busy", wait_ms=round((time.perf_counter() - started) * 1000, 2), error=str(e))
+        raise DatabaseBusyError(str(e)) from e
+
+
+def pool_stats() -> dict:
+    """Pool holati: hajm, band/bo'sh, navbat, kutish vaqtlari, xatolar"""
+    stats = {
+        "dialect": db_dialect or "none",
+        "checkouts": pool_metrics.checkouts,
+        "busy_errors": pool_metrics.busy_errors,
+        "avg_wait_ms": round(pool_metrics.total_wait_ms / pool_metrics.checkouts, 3) if pool_metrics.checkouts else 0,
+        "max_wait_ms": round(pool_metrics.max_wait_ms, 3)
+    }
+    if db_pool is None:
+        return stats
+
+    raw = db_pool.get_stats()
+    size = raw.get("pool_size", 0)
+    available = raw.get("pool_available", 0)
+    stats.update({
+        "min_size": getattr(db_pool, "min_size", size),
+        "max_size": getattr(db_pool, "max_size", size),
+        "size": size,
+        "in_use": size - available,
+        "available": available,
+        "waiting": raw.get("requests_waiting", 0),
+        "queued_total": raw.get("requests_queued", 0),
+        "queue_wait_ms_total": raw.get("requests_wait_ms", 0),
+        "request_errors": raw.get("requests_errors", 0),
+        "connections_opened": raw.get("connections_num", 0),
+        "connection_errors": raw.get("connections_errors", 0),
+        "connections_lost": raw.get("connections_lost", 0),
+        "returns_bad": raw.get("returns_bad", 0)
+    })
+    return stats
+
+
+async def close_database():
+    """Pool dagi barcha connectionlarni yopish"""
+    global db_pool, db_dialect
+
+    if db_pool:
+        await db_pool.close()
+        db_pool = None
+        db_dialect = None
+
+
+def _reset_after_fork():
+    # Ota process da ochilgan pool (masalan --preload) child da ishlatilmaydi:
+    # bir socket ga ikki process yozsa protokol buziladi, yopish esa ota
+    # process ning ulanishlarini ham uzadi - shuning uchun faqat tashlab yuboriladi
+    global db_pool, db_dialect, pool_metrics
+    db_pool = None
+    db_dialect = None
+    pool_metrics = PoolMetrics()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
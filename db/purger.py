@@ -0,0 +1,201 @@
+"""
+AI Universe - o'chirilgan suhbatlarni fonda tozalash
+
+Soft delete rejimida endpoint faqat conversations.deleted_at ni belgilaydi.
+Purger esa xabarlarni, keyin bo'shab qolgan suhbatlarni cheklangan
+paketlarda va sekundiga qatorlar limiti bilan o'chiradi, shuning uchun
+katta akkauntlar uzoq lock ushlab turmaydi.
+"""
+
+import os
+import time
+import asyncio
+from typing import Optional
+
+from .pool import get_db_connection, is_sqlite
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# "hard" - darhol o'chirish, "soft" - belgilash va fonda tozalash
+CHAT_DELETE_MODE = os.getenv("CHAT_DELETE_MODE", "hard").lower()
+CHAT_PURGE_ENABLED = os.getenv("CHAT_PURGE_ENABLED", "true").lower() == "true"
+CHAT_PURGE_INTERVAL = _env_float("CHAT_PURGE_INTERVAL", 10.0)
+CHAT_PURGE_BATCH_SIZE = _env_int("CHAT_PURGE_BATCH_SIZE", 1000)
+CHAT_PURGE_MAX_ROWS_PER_SECOND = _env_int("CHAT_PURGE_MAX_ROWS_PER_SECOND", 5000)
+# O'chirilgandan keyin shuncha sekund kutiladi (qayta tiklash imkoniyati uchun)
+CHAT_PURGE_DELAY = _env_int("CHAT_PURGE_DELAY", 0)
+
+PURGE_MESSAGES_SQL = """
+    WITH doomed AS (
+        SELECT m.id FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE c.deleted_at IS NOT NULL
+          AND c.deleted_at < now() - make_interval(secs => %(delay)s)
+        LIMIT %(batch)s
+        FOR UPDATE OF m SKIP LOCKED
+    )
+    DELETE FROM messages m USING doomed d WHERE m.id = d.id
+"""
+
+PURGE_CONVERSATIONS_SQL = """
+    WITH doomed AS (
+        SELECT c.id FROM conversations c
+        WHERE c.deleted_at IS NOT NULL
+          AND c.deleted_at < now() - make_interval(secs => %(delay)s)
+          AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id)
+        ORDER BY c.deleted_at
+        LIMIT %(batch)s
+        FOR UPDATE SKIP LOCKED
+    )
+    DELETE FROM conversations c USING doomed d WHERE c.id = d.id
+"""
+
+# SQLite: bitta yozuvchi, lock lar yo'q - rowid bo'yicha cheklangan paketlar
+PURGE_MESSAGES_SQLITE = """
+    DELETE FROM messages WHERE rowid IN (
+        SELECT m.rowid FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE c.deleted_at IS NOT NULL
+          AND c.deleted_at < datetime('now', '-' || %(delay)s || ' seconds')
+        LIMIT %(batch)s
+    )
+"""
+
+PURGE_CONVERSATIONS_SQLITE = """
+    DELETE FROM conversations WHERE rowid IN (
+        SELECT c.rowid FROM conversations c
+        WHERE c.deleted_at IS NOT NULL
+          AND c.deleted_at < datetime('now', '-' || %(delay)s || ' seconds')
+          AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.conversation_id = c.id)
+        ORDER BY c.deleted_at
+        LIMIT %(batch)s
+    )
+"""
+
+
+def soft_delete_enabled(mode: Optional[str] = None) -> bool:
+    """So'rovdagi ?mode= qiymati CHAT_DELETE_MODE dan ustun"""
+    return (mode or CHAT_DELETE_MODE).lower() == "soft"
+
+
+class ChatPurger:
+    """Soft delete qilingan suhbatlarni paketlab o'chiruvchi fon vazifa"""
+
+    def __init__(self, enabled: bool = CHAT_PURGE_ENABLED, interval: float = CHAT_PURGE_INTERVAL,
+                 batch_size: int = CHAT_PURGE_BATCH_SIZE, max_rows_per_second: int = CHAT_PURGE_MAX_ROWS_PER_SECOND):
+        self.enabled = enabled
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_rows_per_second = max_rows_per_second
+
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.runs = 0
+        self.batches = 0
+        self.purged_messages = 0
+        self.purged_conversations = 0
+        self.errors = 0
+        self.last_batch_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.enabled or self.running:
+            return
+        self._stop_event = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        print(f"✅ Chat purger started (batch={self.batch_size}, max={self.max_rows_per_second} rows/s)")
+
+    def notify(self):
+        """Yangi soft delete bo'ldi - keyingi intervalni kutmasdan boshlash"""
+        if self.running:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.purge()
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Chat purge error: {e}")
+
+    async def _batch(self, sql: str) -> int:
+        started = time.perf_counter()
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, {"delay": CHAT_PURGE_DELAY, "batch": self.batch_size})
+                deleted = cur.rowcount
+            await conn.commit()
+        self.batches += 1
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+
+        # Rate limit: paketdagi qatorlar soniga mos pauza
+        if deleted and self.max_rows_per_second > 0:
+            await asyncio.sleep(deleted / self.max_rows_per_second)
+        return deleted
+
+    async def purge(self):
+        """Barcha belgilangan suhbatlarni tozalash (to'xtatilganda paketlar orasida chiqadi)"""
+        self.runs += 1
+        messages_sql, conversations_sql = (
+            (PURGE_MESSAGES_SQLITE, PURGE_CONVERSATIONS_SQLITE) if is_sqlite()
+            else (PURGE_MESSAGES_SQL, PURGE_CONVERSATIONS_SQL)
+        )
+        while not self._stop_event.is_set():
+            deleted = await self._batch(messages_sql)
+            self.purged_messages += deleted
+            if deleted < self.batch_size:
+                break
+
+        while not self._stop_event.is_set():
+            deleted = await self._batch(conversations_sql)
+            self.purged_conversations += deleted
+            if deleted < self.batch_size:
+                break
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop_event.set()
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "delete_mode": CHAT_DELETE_MODE,
+            "runs": self.runs,
+            "batches": self.batches,
+            "purged_messages": self.purged_messages,
+            "purged_conversations": self.purged_conversations,
+            "errors": self.errors,
+            "last_batch_ms": round(self.last_batch_ms, 2)
+        }
+
+
+# Process uchun yagona purger
+chat_purger = ChatPurger()
@@ -0,0 +1,338 @@
+"""
+AI Universe - o'qish replikalari
+
+DATABASE_REPLICA_URLS (vergul bilan) berilsa, faqat o'qiydigan endpointlar
+replika pool laridan round-robin bo'yicha connection oladi. Sog'lig'i
+tekshiruvdan o'tmagan yoki juda orqada qolgan replika chetlab o'tiladi.
+Foydalanuvchi/suhbat yaqinda yozilgan bo'lsa (read-your-writes), o'qish
+qisqa vaqt primary ga yo'naltiriladi.
+
+Read-your-writes ikki qatlamli:
+- mark_write() kalitlarini process xotirasida eslab qoladi - bu faqat shu
+  worker ichida ishlaydi (gunicorn -w N da keyingi so'rov boshqa worker ga
+  tushishi mumkin);
+- ReplicaStickyMiddleware yozish vaqtini javobga X-Last-Write header va
+  qisqa muddatli cookie sifatida qaytaradi. Mijoz uni keyingi so'rovda
+  yuborsa, qaysi worker bo'lishidan qat'i nazar o'qish primary dan bo'ladi
+  yoki faqat lag i yozishdan beri o'tgan vaqtdan kichik replikaga boradi.
+  Streaming javoblarda header yozishdan oldin yuboriladi - u yerda faqat
+  process xotirasi ishlaydi.
+"""
+
+import os
+import time
+import asyncio
+import contextvars
+from http.cookies import CookieError, SimpleCookie
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import structlog
+from psycopg_pool import AsyncConnectionPool
+
+from .pool import get_db_connection, DB_POOL_MAX_LIFETIME, DB_POOL_MAX_IDLE, DB_POOL_PRE_PING
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+REPLICA_POOL_MAX_SIZE = _env_int("REPLICA_POOL_MAX_SIZE", 10)
+REPLICA_HEALTH_INTERVAL = _env_float("REPLICA_HEALTH_INTERVAL", 5.0)
+# Shundan ko'p orqada qolgan replika o'qishga berilmaydi (sekund)
+REPLICA_MAX_LAG = _env_float("REPLICA_MAX_LAG", 5.0)
+REPLICA_CONNECT_TIMEOUT = _env_float("REPLICA_CONNECT_TIMEOUT", 2.0)
+# Yozishdan keyin shuncha sekund davomida o'qish primary dan. Process
+# xotirasidagi kalitlar faqat bitta worker ichida ko'rinadi; worker lar
+# orasida stickiness ni mijoz olib yuradi (X-Last-Write header / cookie)
+REPLICA_STICKY_SECONDS = _env_float("REPLICA_STICKY_SECONDS", 5.0)
+REPLICA_STICKY_COOKIE = os.getenv("REPLICA_STICKY_COOKIE", "aiu_last_write")
+# Frontend boshqa domenda bo'lsa "none" (cookie Secure bilan yuboriladi)
+REPLICA_STICKY_SAMESITE = os.getenv("REPLICA_STICKY_SAMESITE", "lax").lower()
+REPLICA_STICKY_HEADER = b"x-last-write"
+
+logger = structlog.get_logger("db.replicas")
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+# Joriy so'rov: mijoz yuborgan va shu so'rovda qilingan yozish vaqti (unix)
+_sticky_state = contextvars.ContextVar("replica_sticky_state", default=None)
+
+
+class _StickyState:
+    __slots__ = ("client_write", "written")
+
+    def __init__(self, client_write: Optional[float] = None):
+        self.client_write = client_write
+        self.written: Optional[float] = None
+
+
+def _parse_write_time(value) -> Optional[float]:
+    """Mijoz yuborgan yozish vaqti (eskirgan yoki noto'g'ri bo'lsa None)"""
+    try:
+        written = float(value)
+    except (TypeError, ValueError):
+        return None
+    age = time.time() - written
+    # Soatlar farqi uchun kelajakdagi vaqtga ham shu oyna, undan ortig'i e'tiborsiz
+    window = max(REPLICA_STICKY_SECONDS, REPLICA_MAX_LAG)
+    if -window <= age <= window:
+        return written
+    return None
+
+
+def _host(url: str) -> str:
+    """Metrikalar uchun parolsiz host nomi"""
+    try:
+        parts = urlsplit(url)
+        return f"{parts.hostname}:{parts.port or 5432}"
+    except ValueError:
+        return "unknown"
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.host = _host(url)
+        self.pool = AsyncConnectionPool(
+            url,
+            min_size=1,
+            max_size=REPLICA_POOL_MAX_SIZE,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            max_idle=DB_POOL_MAX_IDLE,
+            check=AsyncConnectionPool.check_connection if DB_POOL_PRE_PING else None,
+            kwargs={"sslmode": os.getenv("DATABASE_SSLMODE", "require"), "autocommit": True},
+            open=False
+        )
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+
+
+class ReplicaRouter:
+    """O'qishlarni replikalar va primary orasida taqsimlash"""
+
+    def __init__(self, urls: List[str] = DATABASE_REPLICA_URLS):
+        self.urls = urls
+        self.replicas: List[Replica] = []
+        self._next = 0
+        self._recent_writes = {}  # kalit -> monotonic vaqt
+        self._task: Optional[asyncio.Task] = None
+
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.failovers = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    async def start(self):
+        if not self.urls or self.replicas:
+            return
+        for url in self.urls:
+            replica = Replica(url)
+            try:
+                # Bitta replika ishlamasa ham server ishga tushadi
+                await replica.pool.open(wait=False)
+            except Exception as e:
+                print(f"⚠️ Replica pool ochilmadi ({replica.host}): {e}")
+            self.replicas.append(replica)
+        await self.check_health()
+        self._task = asyncio.create_task(self._run())
+        healthy = sum(1 for replica in self.replicas if replica.healthy)
+        print(f"✅ Read replicas: {healthy}/{len(self.replicas)} healthy")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+            await self.check_health()
+
+    async def check_health(self):
+        for replica in self.replicas:
+            try:
+                async with replica.pool.connection(timeout=REPLICA_CONNECT_TIMEOUT) as conn:
+                    async with conn.cursor() as cur:
+                        await cur.execute(LAG_SQL)
+                        replica.lag_seconds = float((await cur.fetchone())[0])
+                replica.healthy = replica.lag_seconds <= REPLICA_MAX_LAG
+            except Exception as e:
+                if replica.healthy:
+                    logger.warning("replica_unhealthy", host=replica.host, error=str(e))
+                replica.healthy = False
+                replica.lag_seconds = None
+                replica.failures += 1
+
+    def mark_write(self, *keys):
+        """Yozishdan keyin shu kalitlar bo'yicha o'qish primary ga yopishadi"""
+        if not self.enabled:
+            return
+        state = _sticky_state.get()
+        if state is not None:
+            # Middleware javobga yozish vaqtini qo'shadi
+            state.written = time.time()
+        now = time.monotonic()
+        for key in keys:
+            if key:
+                self._recent_writes[str(key)] = now
+        # Eskirgan yozuvlarni vaqti-vaqti bilan tozalash
+        if len(self._recent_writes) > 10000:
+            cutoff = now - REPLICA_STICKY_SECONDS
+            self._recent_writes = {k: t for k, t in self._recent_writes.items() if t > cutoff}
+
+    def _is_sticky(self, keys) -> bool:
+        cutoff = time.monotonic() - REPLICA_STICKY_SECONDS
+        return any(self._recent_writes.get(str(key), 0) > cutoff for key in keys if key)
+
+    def _client_write_age(self) -> Optional[float]:
+        """Mijozning oxirgi yozishidan beri o'tgan vaqt (sekund) yoki None"""
+        state = _sticky_state.get()
+        if state is None:
+            return None
+        written = state.written or state.client_write
+        if written is None:
+            return None
+        return max(0.0, time.time() - written)
+
+    @asynccontextmanager
+    async def connection(self, *keys):
+        """O'qish uchun connection: sog'lom replika yoki primary"""
+        write_age = self._client_write_age() if self.enabled else None
+        if not self.enabled or self._is_sticky(keys) or (write_age is not None and write_age < REPLICA_STICKY_SECONDS):
+            if self.enabled:
+                self.sticky_reads += 1
+            self.primary_reads += 1
+            async with get_db_connection() as conn:
+                yield conn
+            return
+
+        conn = None
+        replica = None
+        for _ in range(len(self.replicas)):
+            candidate = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if not candidate.healthy:
+                continue
+            if write_age is not None and (candidate.lag_seconds is None or candidate.lag_seconds >= write_age):
+                # Replika mijozning oxirgi yozishigacha hali yetib kelmagan
+                continue
+            try:
+                conn = await candidate.pool.getconn(timeout=REPLICA_CONNECT_TIMEOUT)
+                replica = candidate
+                break
+            except Exception as e:
+                logger.warning("replica_failover", host=candidate.host, error=str(e))
+                candidate.healthy = False
+                candidate.failures += 1
+                self.failovers += 1
+
+        if conn is None:
+            self.primary_reads += 1
+            async with get_db_connection() as conn:
+                yield conn
+            return
+
+        replica.requests += 1
+        try:
+            yield conn
+        finally:
+            await replica.pool.putconn(conn)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.pool.close()
+        self.replicas = []
+
+    def stats(self) -> dict:
+        stats = {
+            "count": len(self.replicas),
+            "healthy": sum(1 for replica in self.replicas if replica.healthy),
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "failovers": self.failovers
+        }
+        for index, replica in enumerate(self.replicas):
+            stats[f"{index}_host"] = replica.host
+            stats[f"{index}_healthy"] = replica.healthy
+            stats[f"{index}_lag_seconds"] = round(replica.lag_seconds, 3) if replica.lag_seconds is not None else "unknown"
+            stats[f"{index}_requests"] = replica.requests
+            stats[f"{index}_failures"] = replica.failures
+        return stats
+
+
+# Process uchun yagona router
+replica_router = ReplicaRouter()
+
+
+class ReplicaStickyMiddleware:
+    """Oxirgi yozish vaqtini mijozdan o'qish va javobga qaytarish (toza ASGI)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_router.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        value = headers.get(REPLICA_STICKY_HEADER)
+        if value is None and b"cookie" in headers:
+            try:
+                morsel = SimpleCookie(headers[b"cookie"].decode("latin-1")).get(REPLICA_STICKY_COOKIE)
+            except CookieError:
+                morsel = None
+            value = morsel.value if morsel else None
+        state = _StickyState(_parse_write_time(value))
+        token = _sticky_state.set(state)
+
+        async def send_with_write_time(message):
+            if message["type"] == "http.response.start" and state.written is not None:
+                written = f"{state.written:.3f}"
+                max_age = int(max(REPLICA_STICKY_SECONDS, REPLICA_MAX_LAG)) + 1
+                cookie = f"{REPLICA_STICKY_COOKIE}={written}; Max-Age={max_age}; Path=/; HttpOnly; SameSite={REPLICA_STICKY_SAMESITE.capitalize()}"
+                if REPLICA_STICKY_SAMESITE == "none":
+                    cookie += "; Secure"
+                message["headers"] = list(message.get("headers") or []) + [
+                    (REPLICA_STICKY_HEADER, written.encode("latin-1")),
+                    (b"set-cookie", cookie.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_write_time)
+        finally:
+            _sticky_state.reset(token)
+
+
+def get_read_connection(*keys):
+    """Faqat o'qiydigan so'rovlar uchun connection (kalitlar: user_id, conversation_id)"""
+    return replica_router.connection(*keys)
@@ -0,0 +1,206 @@
+"""
+AI Universe - database jadvallari
+
+PostgreSQL sxemasi faqat migratsiyalar bilan o'zgaradi (alembic upgrade head,
+deploy bosqichida bir marta). Worker startup da DDL bajarilmaydi - faqat
+alembic_version tekshiriladi. Embedded SQLite sxemasi startup da yaratiladi.
+"""
+
+import os
+from typing import Optional
+
+from .pool import get_db_connection, is_sqlite
+from .search import SQLiteSearch
+from .user_summary import BACKFILL_USER_SUMMARY_SQL
+
+# Migratsiyasiz lokal PostgreSQL uchun eski yo'l: startup da create_tables()
+DB_CREATE_TABLES = os.getenv("DB_CREATE_TABLES", "false").lower() == "true"
+
+# Embedded rejim sxemasi (PostgreSQL dagi migratsiyalar natijasiga mos)
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id VARCHAR(255) PRIMARY KEY,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        name VARCHAR(255),
+        picture VARCHAR(500),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS conversations (
+        id VARCHAR(255) PRIMARY KEY,
+        user_id VARCHAR(255),
+        ai_type VARCHAR(100),
+        title VARCHAR(500),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        deleted_at TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS messages (
+        id VARCHAR(255) PRIMARY KEY,
+        conversation_id VARCHAR(255) REFERENCES conversations(id) ON DELETE CASCADE,
+        user_id VARCHAR(255),
+        content TEXT,
+        ai_response TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS user_stats (
+        id VARCHAR(255) PRIMARY KEY,
+        user_id VARCHAR(255),
+        ai_type VARCHAR(100),
+        usage_count INTEGER DEFAULT 0,
+        last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations(user_id, updated_at DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_conversations_deleted_at ON conversations(deleted_at) WHERE deleted_at IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp ON messages(conversation_id, timestamp, id);
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_user_stats_user_ai ON user_stats(user_id, ai_type);
+"""
+
+USER_SUMMARY_DDL = """
+    CREATE TABLE IF NOT EXISTS user_summary (
+        user_id VARCHAR(255) PRIMARY KEY,
+        total_messages BIGINT NOT NULL DEFAULT 0,
+        total_conversations INTEGER NOT NULL DEFAULT 0,
+        favorite_ai_type VARCHAR(100),
+        favorite_count BIGINT NOT NULL DEFAULT 0,
+        last_activity TIMESTAMP
+    )
+"""
+
+
+def create_sqlite_schema(conn):
+    summary_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_summary'"
+    ).fetchone()
+    conn.executescript(SQLITE_SCHEMA)
+    conn.execute(USER_SUMMARY_DDL)
+    if not summary_exists:
+        # Yangi jadval mavjud ma'lumotlardan to'ldiriladi
+        conn.execute(BACKFILL_USER_SUMMARY_SQL)
+    SQLiteSearch.ensure_schema(conn)
+
+
+async def create_tables():
+    """Database jadvallarini yaratish"""
+    if is_sqlite():
+        try:
+            async with get_db_connection() as conn:
+                await conn.run_sync(create_sqlite_schema)
+            print("✅ SQLite jadvallari muvaffaqiyatli yaratildi")
+        except Exception as e:
+            print(f"❌ SQLite jadval yaratishda xato: {str(e)}")
+        return
+
+    try:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                # Users table
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS users (
+                        id VARCHAR(255) PRIMARY KEY,
+                        email VARCHAR(255) UNIQUE NOT NULL,
+                        name VARCHAR(255),
+                        picture VARCHAR(500),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # Conversations table
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS conversations (
+                        id VARCHAR(255) PRIMARY KEY,
+                        user_id VARCHAR(255),
+                        ai_type VARCHAR(100),
+                        title VARCHAR(500),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        deleted_at TIMESTAMP
+                    )
+                """)
+                # Eski bazalar uchun last_login (upsert_user) va soft delete ustunlari
+                await cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_login TIMESTAMP")
+                await cur.execute("ALTER TABLE conversations ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP")
+                
+                # Messages table
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS messages (
+                        id VARCHAR(255) PRIMARY KEY,
+                        conversation_id VARCHAR(255),
+                        user_id VARCHAR(255),
+                        content TEXT,
+                        ai_response TEXT,
+                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # User stats table
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS user_stats (
+                        id VARCHAR(255) PRIMARY KEY,
+                        user_id VARCHAR(255),
+                        ai_type VARCHAR(100),
+                        usage_count INTEGER DEFAULT 0,
+                        last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # Indexlar qo'shish
+                await cur.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+                await cur.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id)")
+                await cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id)")
+                await cur.execute("CREATE INDEX IF NOT EXISTS idx_user_stats_user_id ON user_stats(user_id)")
+                
+                await conn.commit()
+                print("✅ Database jadvallari muvaffaqiyatli yaratildi")
+                
+    except Exception as e:
+        print(f"❌ Jadval yaratishda xato: {str(e)}")
+    
+    # user_stats upsert uchun unique index (eski bazalarda dublikatlar migratsiya bilan birlashtiriladi)
+    try:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS uq_user_stats_user_ai
+                    ON user_stats(user_id, ai_type)
+                """)
+                await conn.commit()
+    except Exception as e:
+        print(f"⚠️ user_stats unique index yaratilmadi, 'alembic upgrade head' ni ishga tushiring: {str(e)}")
+    
+    # Yig'ma statistika jadvali - birinchi marta yaratilganda mavjud ma'lumotlardan to'ldiriladi
+    try:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT to_regclass('user_summary') IS NOT NULL")
+                summary_exists = (await cur.fetchone())[0]
+                await cur.execute(USER_SUMMARY_DDL)
+                if not summary_exists:
+                    await cur.execute(BACKFILL_USER_SUMMARY_SQL)
+                await conn.commit()
+    except Exception as e:
+        print(f"⚠️ user_summary yaratilmadi, 'alembic upgrade head' ni ishga tushiring: {str(e)}")
+
+
+async def ensure_schema() -> Optional[str]:
+    """Worker startup: SQLite sxemasini yaratish, PostgreSQL da migratsiya versiyasini o'qish"""
+    if is_sqlite() or DB_CREATE_TABLES:
+        await create_tables()
+        return None
+
+    try:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT to_regclass('alembic_version') IS NOT NULL")
+                if not (await cur.fetchone())[0]:
+                    print("⚠️ alembic_version topilmadi, 'alembic upgrade head' ni ishga tushiring")
+                    return None
+                await cur.execute("SELECT version_num FROM alembic_version")
+                row = await cur.fetchone()
+    except Exception as e:
+        print(f"⚠️ Migratsiya versiyasini o'qib bo'lmadi: {e}")
+        return None
+
+    version = row[0] if row else None
+    print(f"✅ Database schema: {version or 'unknown'}")
+    return version
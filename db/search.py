@@ -0,0 +1,201 @@
+"""
+AI Universe - suhbatlar tarixi bo'yicha to'liq matnli qidiruv
+
+PostgreSQL: (user_id, uz_translit() tsvector) ustidagi btree_gin composite
+index lar (messages.content + ai_response, conversations.title) - index
+skanining o'zi faqat shu foydalanuvchi qatorlarini qaytaradi. Kirill va
+lotin yozuvlari bir xil tokenlarga keltiriladi, natijalar ts_rank_cd bilan
+tartiblanadi va ts_headline bilan belgilangan parcha qaytariladi.
+
+SQLite (embedded rejim): FTS5 virtual jadvallari triggerlar orqali
+yangilanadi, bm25() va snippet() ishlatiladi.
+"""
+
+import os
+import re
+from typing import List, Optional
+
+from ai.normalize import fold_for_search
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+SEARCH_MAX_QUERY_LENGTH = _env_int("SEARCH_MAX_QUERY_LENGTH", 200)
+SEARCH_MAX_OFFSET = _env_int("SEARCH_MAX_OFFSET", 500)
+# Sarlavhadagi moslik xabar matnidagidan kuchliroq hisoblanadi
+TITLE_RANK_WEIGHT = 2.0
+
+HIGHLIGHT_START = "<b>"
+HIGHLIGHT_STOP = "</b>"
+
+MESSAGE_DOCUMENT = "to_tsvector('simple', uz_translit(coalesce(m.content, '') || ' ' || coalesce(m.ai_response, '')))"
+TITLE_DOCUMENT = "to_tsvector('simple', uz_translit(coalesce(c.title, '')))"
+
+POSTGRES_SEARCH_SQL = f"""
+    WITH q AS (
+        SELECT websearch_to_tsquery('simple', uz_translit(%(q)s)) AS query,
+               websearch_to_tsquery('simple', lower(%(q)s)) AS raw_query
+    ),
+    hits AS (
+        SELECT m.conversation_id, m.id AS message_id, m.timestamp,
+               ts_rank_cd({MESSAGE_DOCUMENT}, q.query) AS rank,
+               m.content, m.ai_response
+        FROM messages m, q
+        WHERE m.user_id = %(user_id)s AND {MESSAGE_DOCUMENT} @@ q.query
+        UNION ALL
+        SELECT c.id, NULL, c.updated_at,
+               ts_rank_cd({TITLE_DOCUMENT}, q.query) * {TITLE_RANK_WEIGHT},
+               NULL, NULL
+        FROM conversations c, q
+        WHERE c.user_id = %(user_id)s AND {TITLE_DOCUMENT} @@ q.query
+    ),
+    page AS (
+        SELECT h.*, c.ai_type, c.title
+        FROM hits h
+        JOIN conversations c ON c.id = h.conversation_id
+        WHERE c.deleted_at IS NULL
+          AND (%(ai_type)s::text IS NULL OR c.ai_type = %(ai_type)s)
+        ORDER BY h.rank DESC, h.timestamp DESC, h.conversation_id, h.message_id
+        LIMIT %(limit)s OFFSET %(offset)s
+    )
+    -- ts_headline qimmat: faqat sahifadagi qatorlar uchun
+    SELECT page.conversation_id, page.message_id, page.ai_type, page.title, page.rank, page.timestamp,
+           ts_headline(
+               'simple',
+               CASE WHEN page.message_id IS NULL THEN page.title
+                    ELSE concat_ws(' ', page.content, page.ai_response) END,
+               q.query || q.raw_query,
+               'MaxFragments=2, MaxWords=20, MinWords=5, FragmentDelimiter=" ... ", StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}'
+           ) AS snippet
+    FROM page, q
+    ORDER BY page.rank DESC, page.timestamp DESC, page.conversation_id, page.message_id
+"""
+
+
+def clean_query(query: Optional[str]) -> str:
+    return " ".join((query or "").split())[:SEARCH_MAX_QUERY_LENGTH]
+
+
+async def search_postgres(cur, user_id: str, query: str, ai_type: Optional[str], limit: int, offset: int) -> List[dict]:
+    """dict_row cursor bilan qidiruv"""
+    await cur.execute(POSTGRES_SEARCH_SQL, {
+        "q": query,
+        "user_id": user_id,
+        "ai_type": ai_type,
+        "limit": limit,
+        "offset": offset
+    })
+    return await cur.fetchall()
+
+
+async def search_messages(conn, user_id: str, query: str, ai_type: Optional[str], limit: int, offset: int) -> List[dict]:
+    """Backend ga qarab PostgreSQL yoki FTS5 qidiruvi"""
+    if getattr(conn, "dialect", None) == "sqlite":
+        return await conn.run_sync(SQLiteSearch.search, user_id, query, ai_type, limit, offset)
+
+    from psycopg.rows import dict_row
+    async with conn.cursor(row_factory=dict_row) as cur:
+        return await search_postgres(cur, user_id, query, ai_type, limit, offset)
+
+
+class SQLiteSearch:
+    """Embedded rejim uchun FTS5 qidiruv (sinxron sqlite3 connection bilan)"""
+
+    TOKENIZER = "unicode61 remove_diacritics 2"
+
+    SCHEMA = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+            USING fts5(body, user_id UNINDEXED, tokenize='{TOKENIZER}')""",
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts
+            USING fts5(title, user_id UNINDEXED, tokenize='{TOKENIZER}')""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, body, user_id)
+            VALUES (new.rowid, uz_translit(coalesce(new.content, '') || ' ' || coalesce(new.ai_response, '')), new.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            DELETE FROM messages_fts WHERE rowid = old.rowid;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+            INSERT INTO conversations_fts (rowid, title, user_id)
+            VALUES (new.rowid, uz_translit(coalesce(new.title, '')), new.user_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+            UPDATE conversations_fts SET title = uz_translit(coalesce(new.title, '')) WHERE rowid = new.rowid;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+            DELETE FROM conversations_fts WHERE rowid = old.rowid;
+        END""",
+    ]
+
+    SEARCH_SQL = f"""
+        SELECT h.conversation_id, h.message_id, c.ai_type, c.title, h.rank, h.timestamp, h.snippet
+        FROM (
+            SELECT m.conversation_id, m.id AS message_id, m.timestamp,
+                   -bm25(messages_fts) AS rank,
+                   snippet(messages_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', ' ... ', 20) AS snippet
+            FROM messages_fts
+            JOIN messages m ON m.rowid = messages_fts.rowid
+            WHERE messages_fts MATCH :match AND messages_fts.user_id = :user_id
+            UNION ALL
+            SELECT c.id, NULL, c.updated_at,
+                   -bm25(conversations_fts) * {TITLE_RANK_WEIGHT},
+                   snippet(conversations_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', ' ... ', 20)
+            FROM conversations_fts
+            JOIN conversations c ON c.rowid = conversations_fts.rowid
+            WHERE conversations_fts MATCH :match AND conversations_fts.user_id = :user_id
+        ) h
+        JOIN conversations c ON c.id = h.conversation_id
+        WHERE c.deleted_at IS NULL AND (:ai_type IS NULL OR c.ai_type = :ai_type)
+        ORDER BY h.rank DESC, h.timestamp DESC, h.conversation_id, h.message_id
+        LIMIT :limit OFFSET :offset
+    """
+
+    @staticmethod
+    def register_functions(conn):
+        """uz_translit() triggerlar uchun har bir connectionda ro'yxatdan o'tkaziladi"""
+        conn.create_function("uz_translit", 1, fold_for_search, deterministic=True)
+
+    @classmethod
+    def ensure_schema(cls, conn):
+        cls.register_functions(conn)
+        for statement in cls.SCHEMA:
+            conn.execute(statement)
+        # Mavjud yozuvlarni bir marta indekslash
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM messages_fts)").fetchone()[0]:
+            conn.execute("""
+                INSERT INTO messages_fts (rowid, body, user_id)
+                SELECT rowid, uz_translit(coalesce(content, '') || ' ' || coalesce(ai_response, '')), user_id
+                FROM messages
+            """)
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM conversations_fts)").fetchone()[0]:
+            conn.execute("""
+                INSERT INTO conversations_fts (rowid, title, user_id)
+                SELECT rowid, uz_translit(coalesce(title, '')), user_id FROM conversations
+            """)
+        conn.commit()
+
+    @staticmethod
+    def match_expression(query: str) -> str:
+        """Foydalanuvchi matnini xavfsiz FTS5 so'roviga aylantirish (barcha so'zlar, prefiks)"""
+        tokens = re.findall(r"\w+", fold_for_search(query), re.UNICODE)
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    @classmethod
+    def search(cls, conn, user_id: str, query: str, ai_type: Optional[str], limit: int, offset: int) -> List[dict]:
+        match = cls.match_expression(query)
+        if not match:
+            return []
+        cursor = conn.execute(cls.SEARCH_SQL, {
+            "match": match,
+            "user_id": user_id,
+            "ai_type": ai_type,
+            "limit": limit,
+            "offset": offset
+        })
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,241 @@
+"""
+AI Universe - embedded SQLite backend (WAL)
+
+Bitta serverli va CI muhitlari uchun: tashqi PostgreSQL siz to'liq saqlash.
+Har bir worker o'z thread ida o'z sqlite3 connectioniga ega; so'rovlar
+shu thread da bajariladi, event loop bloklanmaydi. API psycopg 3
+AsyncConnection ga o'xshash (cursor/execute/fetch*/commit), shuning uchun
+endpointlar ikkala backend bilan bir xil ishlaydi.
+"""
+
+import os
+import re
+import asyncio
+import sqlite3
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from psycopg_pool import PoolTimeout
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/ai_universe.sqlite3")
+SQLITE_WORKERS = _env_int("SQLITE_WORKERS", 4)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_CACHE_SIZE_KB = _env_int("SQLITE_CACHE_SIZE_KB", 65536)
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+# sqlite3 ning har bir connection dagi tayyorlangan (prepared) statement keshi
+SQLITE_STATEMENT_CACHE = _env_int("SQLITE_STATEMENT_CACHE", 256)
+# Bo'sh worker kutish (PostgreSQL pool dagi DB_POOL_TIMEOUT bilan bir xil)
+SQLITE_ACQUIRE_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 10)
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}",
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+]
+
+# TIMESTAMP ustunlari datetime sifatida qaytadi (PostgreSQL bilan bir xil)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+_PARAM_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql: str) -> str:
+    """psycopg parametrlarini sqlite3 ga: %s -> ?, %(name)s -> :name, %% -> %"""
+    def replace(match):
+        if match.group(1):
+            return f":{match.group(1)}"
+        return "?" if match.group(0) == "%s" else "%"
+    return _PARAM_RE.sub(replace, sql)
+
+
+def parse_sqlite_url(url: str) -> str:
+    """sqlite:///relative/path yoki sqlite:////absolute/path"""
+    return url[len("sqlite:///"):] if url.startswith("sqlite:///") else SQLITE_PATH
+
+
+class _Worker:
+    """Bitta thread va unga tegishli sqlite3 connection"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=SQLITE_STATEMENT_CACHE,
+            isolation_level="DEFERRED"
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        from .search import SQLiteSearch
+        SQLiteSearch.register_functions(conn)
+        self.conn = conn
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def open(self):
+        await self.run(self._open)
+
+    async def close(self):
+        if self.conn is not None:
+            await self.run(self.conn.close)
+            self.conn = None
+        self.executor.shutdown(wait=True)
+
+
+class SQLiteCursor:
+    def __init__(self, worker: _Worker, row_factory=None):
+        self._worker = worker
+        self._dict_rows = row_factory is not None
+        self._cursor: Optional[sqlite3.Cursor] = None
+        self.rowcount = -1
+        self.description = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _convert(self, row):
+        if row is None or not self._dict_rows:
+            return row
+        return dict(zip([column[0] for column in self._cursor.description], row))
+
+    def _execute(self, sql: str, params):
+        if self._cursor is None:
+            self._cursor = self._worker.conn.cursor()
+        self._cursor.execute(translate_sql(sql), params if params is not None else ())
+        self.rowcount = self._cursor.rowcount
+        self.description = self._cursor.description
+
+    async def execute(self, sql: str, params=None):
+        await self._worker.run(self._execute, sql, params)
+        return self
+
+    async def executemany(self, sql: str, params_seq):
+        def run():
+            if self._cursor is None:
+                self._cursor = self._worker.conn.cursor()
+            self._cursor.executemany(translate_sql(sql), params_seq)
+            self.rowcount = self._cursor.rowcount
+        await self._worker.run(run)
+
+    async def fetchone(self):
+        return self._convert(await self._worker.run(self._cursor.fetchone))
+
+    async def fetchmany(self, size: int):
+        return [self._convert(row) for row in await self._worker.run(self._cursor.fetchmany, size)]
+
+    async def fetchall(self):
+        return [self._convert(row) for row in await self._worker.run(self._cursor.fetchall)]
+
+    async def close(self):
+        if self._cursor is not None:
+            await self._worker.run(self._cursor.close)
+            self._cursor = None
+
+
+class SQLiteConnection:
+    """psycopg AsyncConnection ga mos minimal interfeys"""
+
+    dialect = "sqlite"
+
+    def __init__(self, worker: _Worker):
+        self._worker = worker
+
+    def cursor(self, row_factory=None) -> SQLiteCursor:
+        return SQLiteCursor(self._worker, row_factory)
+
+    async def execute(self, sql: str, params=None) -> SQLiteCursor:
+        return await self.cursor().execute(sql, params)
+
+    async def commit(self):
+        await self._worker.run(self._worker.conn.commit)
+
+    async def rollback(self):
+        await self._worker.run(self._worker.conn.rollback)
+
+    async def run_sync(self, fn, *args):
+        """fn(sqlite3_connection, *args) ni connection thread ida bajarish"""
+        return await self._worker.run(fn, self._worker.conn, *args)
+
+
+class SQLiteDatabase:
+    """Workerlar navbati - AsyncConnectionPool o'rnida"""
+
+    dialect = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH, workers: int = SQLITE_WORKERS):
+        self.path = path
+        self.size = max(1, workers)
+        self._workers = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def open(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            worker = _Worker(self.path)
+            await worker.open()
+            self._workers.append(worker)
+            self._idle.put_nowait(worker)
+
+    @asynccontextmanager
+    async def connection(self):
+        """Blok muvaffaqiyatli tugasa commit, xatoda rollback (psycopg pool kabi)"""
+        try:
+            worker = await asyncio.wait_for(self._idle.get(), SQLITE_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"couldn't get a connection after {SQLITE_ACQUIRE_TIMEOUT} sec")
+        conn = SQLiteConnection(worker)
+        try:
+            yield conn
+        except BaseException:
+            await conn.rollback()
+            raise
+        else:
+            await conn.commit()
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def close(self):
+        for worker in self._workers:
+            await worker.close()
+        self._workers = []
+
+    @property
+    def min_size(self) -> int:
+        return self.size
+
+    @property
+    def max_size(self) -> int:
+        return self.size
+
+    def get_stats(self) -> dict:
+        return {
+            "pool_size": self.size,
+            "pool_available": self._idle.qsize() if self._idle else 0
+        }
@@ -0,0 +1,165 @@
+"""
+AI Universe - user_stats hisoblagichlarini xotirada yig'ish
+
+Har bir xabar uchun user_stats qatorini yangilash o'rniga oshirishlar
+xotirada yig'iladi va bir necha soniyada bir marta bitta ko'p qatorli
+INSERT ... ON CONFLICT DO UPDATE bilan yoziladi. Faol foydalanuvchilar
+bitta qator lockida navbatga turmaydi.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from .pool import get_db_connection, sql_greatest
+from .user_summary import favorite_rows, upsert_user_summary
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+USER_STATS_AGGREGATE = os.getenv("USER_STATS_AGGREGATE", "false").lower() == "true"
+USER_STATS_FLUSH_INTERVAL = _env_float("USER_STATS_FLUSH_INTERVAL", 5.0)
+
+
+async def upsert_user_stats(cur, rows: Iterable[Tuple[str, str, int, datetime]]) -> list:
+    """
+    (user_id, ai_type, count, last_used) qatorlarini bitta so'rovda upsert qilish.
+    Yangilangan (user_id, ai_type, usage_count, last_used) qatorlarini qaytaradi.
+    """
+    # Tartiblangan kalitlar workerlar orasida deadlock bo'lishining oldini oladi
+    rows = sorted(rows, key=lambda row: (row[0], row[1]))
+    if not rows:
+        return []
+
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    params = []
+    for user_id, ai_type, count, last_used in rows:
+        params.extend([str(uuid.uuid4()), user_id, ai_type, count, last_used])
+
+    await cur.execute(f"""
+        INSERT INTO user_stats (id, user_id, ai_type, usage_count, last_used)
+        VALUES {values}
+        ON CONFLICT (user_id, ai_type) DO UPDATE
+        SET usage_count = user_stats.usage_count + EXCLUDED.usage_count,
+            last_used = {sql_greatest()}(user_stats.last_used, EXCLUDED.last_used)
+        RETURNING user_id, ai_type, usage_count, last_used
+    """, params)
+    return await cur.fetchall()
+
+
+class StatsAggregator:
+    """user_stats oshirishlarini yig'ib davriy yozuvchi"""
+
+    def __init__(self, enabled: bool = USER_STATS_AGGREGATE, flush_interval: float = USER_STATS_FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+
+        self._pending = {}  # (user_id, ai_type) -> [count, last_used]
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        self.increments = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def accepting(self) -> bool:
+        """add() hozir qabul qiladimi (yon ta'sirsiz tekshiruv)"""
+        return self.running and not self._stop_event.is_set()
+
+    async def start(self):
+        if not self.enabled or self.running:
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        print(f"✅ User stats aggregator started (interval={self.flush_interval}s)")
+
+    def add(self, user_id: str, ai_type: str, count: int = 1, last_used: Optional[datetime] = None) -> bool:
+        """Oshirishni yig'ish (aggregator ishlamayotgan bo'lsa False)"""
+        if not self.accepting:
+            return False
+        last_used = last_used or datetime.utcnow()
+        entry = self._pending.get((user_id, ai_type))
+        if entry is None:
+            self._pending[(user_id, ai_type)] = [count, last_used]
+        else:
+            entry[0] += count
+            entry[1] = max(entry[1], last_used)
+        self.increments += count
+        return True
+
+    async def _run(self):
+        # To'xtatish signalidan keyin ham oxirgi flush bajariladi
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        started = time.perf_counter()
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    updated = await upsert_user_stats(cur, [
+                        (user_id, ai_type, count, last_used)
+                        for (user_id, ai_type), (count, last_used) in pending.items()
+                    ])
+                    # Xabarlar soni yozish paytida qo'shilgan - bu yerda faqat favorite
+                    await upsert_user_summary(cur, favorite_rows(updated))
+                await conn.commit()
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ User stats flush error: {e}")
+            # Yozilmagan oshirishlar keyingi flush ga qaytariladi
+            for (user_id, ai_type), (count, last_used) in pending.items():
+                entry = self._pending.setdefault((user_id, ai_type), [0, last_used])
+                entry[0] += count
+                entry[1] = max(entry[1], last_used)
+            return
+
+        self.flushes += 1
+        self.flushed_rows += len(pending)
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    async def stop(self):
+        """Fon vazifani to'xtatish va qolgan oshirishlarni yozish"""
+        if self._task is None:
+            return
+        self._stop_event.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending_keys": len(self._pending),
+            "increments": self.increments,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "errors": self.errors,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
+
+
+# Process uchun yagona aggregator
+stats_aggregator = StatsAggregator()
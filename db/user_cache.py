@@ -0,0 +1,105 @@
+"""
+AI Universe - foydalanuvchilar keshi
+
+Google auth va statistika endpointlari har safar users jadvaliga
+murojaat qilmasligi uchun foydalanuvchi yozuvlari email va id bo'yicha
+xotirada (TTL bilan) saqlanadi. Yozuv yangilanganda kesh ham yangilanadi.
+Faqat mavjud foydalanuvchilar keshlanadi (boshqa workerda yaratilgan
+foydalanuvchi "topilmadi" bo'lib qolmasligi uchun).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+USER_CACHE_TTL = _env_int("USER_CACHE_TTL", 300)
+USER_CACHE_MAX_ENTRIES = _env_int("USER_CACHE_MAX_ENTRIES", 10000)
+
+
+class UserCache:
+    """id -> user LRU + TTL, email -> id indeksi bilan"""
+
+    def __init__(self, ttl: int = USER_CACHE_TTL, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._by_id = OrderedDict()  # id -> (expires_at, user)
+        self._email_to_id = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get_by_id(self, user_id: str) -> Optional[dict]:
+        entry = self._by_id.get(str(user_id))
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            self._remove(str(user_id))
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(str(user_id))
+        self.hits += 1
+        return user
+
+    def get_by_email(self, email: str) -> Optional[dict]:
+        user_id = self._email_to_id.get((email or "").lower())
+        if user_id is None:
+            self.misses += 1
+            return None
+        return self.get_by_id(user_id)
+
+    def set(self, user: dict):
+        if not user or self.ttl <= 0:
+            return
+        user_id = str(user["id"])
+        self._remove(user_id)
+        self._by_id[user_id] = (time.monotonic() + self.ttl, dict(user))
+        self._email_to_id[(user.get("email") or "").lower()] = user_id
+        while len(self._by_id) > self.max_entries:
+            self._remove(next(iter(self._by_id)))
+
+    def invalidate(self, user_id: Optional[str] = None, email: Optional[str] = None):
+        if email and user_id is None:
+            user_id = self._email_to_id.get(email.lower())
+        if user_id is not None and str(user_id) in self._by_id:
+            self._remove(str(user_id))
+            self.invalidations += 1
+
+    def _remove(self, user_id: str):
+        entry = self._by_id.pop(user_id, None)
+        if entry is not None:
+            email = (entry[1].get("email") or "").lower()
+            if self._email_to_id.get(email) == user_id:
+                del self._email_to_id[email]
+
+    def clear(self):
+        self._by_id.clear()
+        self._email_to_id.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+# Process uchun yagona kesh
+user_cache = UserCache()
@@ -0,0 +1,137 @@
+"""
+AI Universe - foydalanuvchi bo'yicha yig'ma statistika (user_summary)
+
+Har bir foydalanuvchi uchun bitta qator: jami xabarlar, faol suhbatlar
+soni, eng ko'p ishlatilgan yordamchi va oxirgi faollik. Qator chat yozish
+yo'li va o'chirish endpointlari bilan bir tranzaksiyada yangilanadi,
+shuning uchun statistika endpointi bitta primary key o'qishiga tushadi.
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from .pool import sql_greatest
+
+# ON CONFLICT qismi: hisoblagichlar qo'shiladi, favorite faqat kattaroq
+# (yoki o'sha yordamchining yangilangan) usage_count kelganda almashadi.
+# user_stats hisoblagichlari faqat o'sadi, shuning uchun bu yetarli.
+USER_SUMMARY_MERGE = """
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_messages = user_summary.total_messages + EXCLUDED.total_messages,
+        total_conversations = user_summary.total_conversations + EXCLUDED.total_conversations,
+        favorite_ai_type = CASE
+            WHEN EXCLUDED.favorite_count > user_summary.favorite_count
+              OR EXCLUDED.favorite_ai_type = user_summary.favorite_ai_type
+            THEN EXCLUDED.favorite_ai_type ELSE user_summary.favorite_ai_type END,
+        favorite_count = CASE
+            WHEN EXCLUDED.favorite_count > user_summary.favorite_count
+              OR EXCLUDED.favorite_ai_type = user_summary.favorite_ai_type
+            THEN EXCLUDED.favorite_count ELSE user_summary.favorite_count END,
+        last_activity = {greatest}(
+            COALESCE(user_summary.last_activity, EXCLUDED.last_activity),
+            COALESCE(EXCLUDED.last_activity, user_summary.last_activity)
+        )
+"""
+
+# Mavjud ma'lumotlardan to'ldirish (migratsiya va yangi yaratilgan jadval uchun)
+BACKFILL_USER_SUMMARY_SQL = """
+    INSERT INTO user_summary (user_id, total_messages, total_conversations, favorite_ai_type, favorite_count, last_activity)
+    SELECT u.user_id,
+           COALESCE(s.total_messages, 0),
+           COALESCE(c.total_conversations, 0),
+           f.ai_type,
+           COALESCE(f.usage_count, 0),
+           s.last_activity
+    FROM (
+        SELECT user_id FROM user_stats
+        UNION
+        SELECT user_id FROM conversations WHERE deleted_at IS NULL
+    ) u
+    LEFT JOIN (
+        SELECT user_id, SUM(usage_count) AS total_messages, MAX(last_used) AS last_activity
+        FROM user_stats GROUP BY user_id
+    ) s ON s.user_id = u.user_id
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) AS total_conversations
+        FROM conversations WHERE deleted_at IS NULL GROUP BY user_id
+    ) c ON c.user_id = u.user_id
+    LEFT JOIN (
+        SELECT user_id, ai_type, usage_count,
+               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY usage_count DESC, last_used DESC) AS rn
+        FROM user_stats
+    ) f ON f.user_id = u.user_id AND f.rn = 1
+    WHERE u.user_id IS NOT NULL
+    ON CONFLICT (user_id) DO NOTHING
+"""
+
+# Statistika endpointi: user_summary primary key bo'yicha + shu foydalanuvchining
+# user_stats qatorlari (uq_user_stats_user_ai index) - bitta so'rov
+USER_SUMMARY_READ_SQL = """
+    SELECT s.total_messages, s.total_conversations, s.favorite_ai_type, s.last_activity,
+           st.ai_type, st.usage_count, st.last_used
+    FROM user_summary s
+    LEFT JOIN user_stats st ON st.user_id = s.user_id
+    WHERE s.user_id = %s
+    ORDER BY st.usage_count DESC
+"""
+
+SummaryRow = Tuple[str, int, int, Optional[str], int, Optional[datetime]]
+
+
+def user_summary_merge_sql() -> str:
+    return USER_SUMMARY_MERGE.format(greatest=sql_greatest())
+
+
+def favorite_rows(stats_rows: Iterable[Tuple[str, str, int, datetime]]) -> list:
+    """upsert_user_stats natijasidan (yangi usage_count lar) favorite deltalari"""
+    return [
+        (user_id, 0, 0, ai_type, usage_count, last_used)
+        for user_id, ai_type, usage_count, last_used in stats_rows
+    ]
+
+
+async def upsert_user_summary(cur, rows: Iterable[SummaryRow]):
+    """
+    (user_id, messages, conversations, favorite_ai_type, favorite_count, last_activity)
+    deltalarini bitta so'rovda qo'shish. Bir foydalanuvchining qatorlari oldin
+    birlashtiriladi - bitta statement ichida bir qator ikki marta yangilanmaydi.
+    """
+    merged = {}
+    for user_id, messages, conversations, ai_type, count, last_activity in rows:
+        entry = merged.get(user_id)
+        if entry is None:
+            merged[user_id] = [messages, conversations, ai_type, count, last_activity]
+            continue
+        entry[0] += messages
+        entry[1] += conversations
+        if ai_type is not None and count > entry[3]:
+            entry[2], entry[3] = ai_type, count
+        if last_activity is not None and (entry[4] is None or last_activity > entry[4]):
+            entry[4] = last_activity
+
+    # Tartiblangan kalitlar workerlar orasida deadlock bo'lishining oldini oladi
+    items = sorted(merged.items())
+    if not items:
+        return
+
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(items))
+    params = []
+    for user_id, (messages, conversations, ai_type, count, last_activity) in items:
+        params.extend([user_id, messages, conversations, ai_type, count, last_activity])
+
+    await cur.execute(f"""
+        INSERT INTO user_summary (user_id, total_messages, total_conversations, favorite_ai_type, favorite_count, last_activity)
+        VALUES {values}
+        {user_summary_merge_sql()}
+    """, params)
+
+
+async def adjust_conversation_count(cur, user_id: str, delta: int):
+    """O'chirilgan suhbatlar sonini yig'ma qatorga qo'llash (qator bo'lmasa hech narsa qilmaydi)"""
+    if not user_id or not delta:
+        return
+    await cur.execute(f"""
+        UPDATE user_summary
+        SET total_conversations = {sql_greatest()}(total_conversations + %s, 0)
+        WHERE user_id = %s
+    """, (delta, user_id))
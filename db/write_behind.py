@@ -0,0 +1,439 @@
+"""
+AI Universe - xabarlarni kechiktirib (write-behind) yozish
+
+Yakunlangan suhbat almashinuvlari xotiradagi navbatga tushadi, fon
+flusher ularni hajm yoki vaqt bo'yicha paketlab yozadi: suhbatlar bitta
+ko'p qatorli upsert, xabarlar COPY, statistika guruhlangan upsert.
+
+Qatorlar tashlab yuborilmaydi: DB ishlamasa paket backoff bilan qayta
+yoziladi, navbat to'lsa enqueue bo'sh joy kutadi (backpressure). Faqat
+to'xtashda DB hali ham ishlamasa qolgan qatorlar WRITE_BEHIND_SPILL_DIR
+ga JSONL sifatida yoziladi va keyingi startda qayta yoziladi. Ma'lumot
+xatosi (unique, tur) bilan yozilmaydigan paket failed-*.jsonl ga tushadi.
+
+Flush bo'lguncha qatorlar faqat suhbat tarixida (pending_messages orqali)
+ko'rinadi; suhbatlar ro'yxati, statistika va qidiruv ularni flush dan
+keyin (WRITE_BEHIND_FLUSH_INTERVAL atrofida) ko'radi.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+
+import psycopg
+import structlog
+
+from .pool import get_db_connection, is_sqlite, sql_greatest
+from .stats_aggregator import stats_aggregator, upsert_user_stats
+from .user_summary import favorite_rows, upsert_user_summary
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = _env_int("WRITE_BEHIND_BATCH_SIZE", 500)
+WRITE_BEHIND_FLUSH_INTERVAL = _env_float("WRITE_BEHIND_FLUSH_INTERVAL", 0.5)
+WRITE_BEHIND_MAX_QUEUE = _env_int("WRITE_BEHIND_MAX_QUEUE", 10000)
+# To'xtash paytida shuncha urinishdan keyin qatorlar spill fayliga yoziladi
+WRITE_BEHIND_MAX_RETRIES = _env_int("WRITE_BEHIND_MAX_RETRIES", 3)
+WRITE_BEHIND_MAX_BACKOFF = _env_float("WRITE_BEHIND_MAX_BACKOFF", 5.0)
+# Navbat to'la bo'lsa bo'sh joyni shuncha kutib, keyin to'g'ridan-to'g'ri yozish
+WRITE_BEHIND_ENQUEUE_TIMEOUT = _env_float("WRITE_BEHIND_ENQUEUE_TIMEOUT", 1.0)
+WRITE_BEHIND_SPILL_DIR = os.getenv("WRITE_BEHIND_SPILL_DIR", "data/write_behind")
+
+# Qayta urinish bilan tuzalmaydigan xatolar
+PERMANENT_ERRORS = (psycopg.IntegrityError, psycopg.DataError, sqlite3.IntegrityError)
+
+logger = structlog.get_logger("db.write_behind")
+
+
+class MessageWriter:
+    """Suhbat almashinuvlarini navbat orqali paketlab yozuvchi"""
+
+    def __init__(self, enabled: bool = WRITE_BEHIND_ENABLED, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL, max_queue: int = WRITE_BEHIND_MAX_QUEUE):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._pending = {}  # conversation_id -> hali yozilmagan elementlar
+        self._pending_count = 0
+        self._replay: List[dict] = []
+        self._replay_files: List[str] = []
+
+        self.enqueued = 0
+        self.waited = 0
+        self.rejected = 0
+        self.flushed_rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.spilled = 0
+        self.failed = 0
+        self.replayed = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.enabled or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._replay = self._claim_spill_files()
+        self._task = asyncio.create_task(self._run())
+        print(f"✅ Write-behind flusher started (batch={self.batch_size}, interval={self.flush_interval}s)")
+        if self._replay:
+            print(f"📊 Write-behind replaying {len(self._replay)} spilled rows")
+
+    async def enqueue(self, conversation_id: str, message_id: str, user_id: str, ai_type: str,
+                      title: str, content: str, ai_response: str) -> bool:
+        """
+        Almashinuvni navbatga qo'yish. Navbat to'la bo'lsa bo'sh joy kutiladi;
+        WRITE_BEHIND_ENQUEUE_TIMEOUT dan keyin False - chaqiruvchi o'zi yozadi.
+        """
+        if not self.running or self._stopping:
+            return False
+        item = {
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+            "user_id": user_id,
+            "ai_type": ai_type,
+            "title": title,
+            "content": content,
+            "ai_response": ai_response,
+            "now": datetime.utcnow()
+        }
+        # Navbatga qo'yishdan oldin - flusher uni yozib bo'lgach _forget topa olishi uchun
+        self._remember(item)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.waited += 1
+            try:
+                await asyncio.wait_for(self._queue.put(item), WRITE_BEHIND_ENQUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._forget([item])
+                self.rejected += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    def pending_messages(self, conversation_id: str, user_id: str) -> List[dict]:
+        """Suhbatning hali yozilmagan xabarlari (shu foydalanuvchiniki)"""
+        return [item for item in self._pending.get(conversation_id, ()) if item["user_id"] == user_id]
+
+    def _remember(self, item: dict):
+        self._pending.setdefault(item["conversation_id"], []).append(item)
+        self._pending_count += 1
+
+    def _forget(self, batch: List[dict]):
+        for item in batch:
+            items = self._pending.get(item["conversation_id"])
+            if items is None:
+                continue
+            try:
+                items.remove(item)
+            except ValueError:
+                continue
+            self._pending_count -= 1
+            if not items:
+                del self._pending[item["conversation_id"]]
+
+    async def _run(self):
+        # Oldingi to'xtashda yozilmay qolgan qatorlar birinchi
+        replay, self._replay = self._replay, []
+        for start in range(0, len(replay), self.batch_size):
+            if not await self._flush_with_retry(replay[start:start + self.batch_size]):
+                self._spill("spill", replay[start:] + self._drain())
+                self._remove_replay_files()
+                return
+            self.replayed += len(replay[start:start + self.batch_size])
+        self._remove_replay_files()
+
+        # To'xtatilganda ham navbat bo'shaguncha yozishda davom etadi
+        while not (self._stopping and self._queue.empty()):
+            try:
+                first = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            if not await self._flush_with_retry(batch):
+                # To'xtash paytida DB hali ham ishlamayapti
+                self._spill("spill", batch + self._drain())
+                return
+
+    async def _flush_with_retry(self, batch: List[dict]) -> bool:
+        """
+        Paket yozilguncha backoff bilan qayta urinish. False - faqat to'xtash
+        paytida WRITE_BEHIND_MAX_RETRIES urinishdan keyin (paket spill qilinadi).
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await self.flush_batch(batch)
+                self._forget(batch)
+                return True
+            except PERMANENT_ERRORS as e:
+                # Qayta urinish yordam bermaydi - paket tahlil uchun alohida faylga
+                self.errors += 1
+                logger.error("write_behind_batch_failed", rows=len(batch), error=str(e))
+                self._spill("failed", batch)
+                self._forget(batch)
+                return True
+            except Exception as e:
+                self.errors += 1
+                logger.error("write_behind_flush_failed", attempt=attempt, rows=len(batch), error=str(e))
+                if self._stopping and attempt >= WRITE_BEHIND_MAX_RETRIES:
+                    return False
+                await asyncio.sleep(min(2 ** attempt * 0.1, WRITE_BEHIND_MAX_BACKOFF))
+
+    def _drain(self) -> List[dict]:
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    def _spill(self, kind: str, items: List[dict]):
+        """Yozilmagan qatorlarni JSONL faylga (spill-* keyingi startda qayta yoziladi)"""
+        if not items:
+            return
+        path = os.path.join(WRITE_BEHIND_SPILL_DIR, f"{kind}-{os.getpid()}-{time.time_ns()}.jsonl")
+        try:
+            os.makedirs(WRITE_BEHIND_SPILL_DIR, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as spill_file:
+                for item in items:
+                    spill_file.write(json.dumps({**item, "now": item["now"].isoformat()}, ensure_ascii=False) + "\n")
+                spill_file.flush()
+                os.fsync(spill_file.fileno())
+        except OSError as e:
+            logger.critical("write_behind_spill_failed", rows=len(items), path=path, error=str(e))
+            return
+        if kind == "spill":
+            self.spilled += len(items)
+        else:
+            self.failed += len(items)
+        logger.error("write_behind_spilled", kind=kind, rows=len(items), path=path)
+
+    def _claim_spill_files(self) -> List[dict]:
+        """Oldingi to'xtashdan qolgan spill fayllarini olish (rename - worker lar orasida bitta oladi)"""
+        try:
+            names = sorted(os.listdir(WRITE_BEHIND_SPILL_DIR))
+        except FileNotFoundError:
+            return []
+        items = []
+        for name in names:
+            if not (name.startswith("spill-") and name.endswith(".jsonl")):
+                continue
+            path = os.path.join(WRITE_BEHIND_SPILL_DIR, name)
+            claimed = f"{path}.{os.getpid()}.replay"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed, encoding="utf-8") as spill_file:
+                for line in spill_file:
+                    if line.strip():
+                        item = json.loads(line)
+                        item["now"] = datetime.fromisoformat(item["now"])
+                        items.append(item)
+            self._replay_files.append(claimed)
+        for item in items:
+            self._remember(item)
+        return items
+
+    def _remove_replay_files(self):
+        # Fayl faqat qatorlari yozilgandan (yoki qayta spill qilingandan) keyin o'chiriladi
+        for path in self._replay_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._replay_files = []
+
+    async def flush_batch(self, batch: List[dict]):
+        """Bitta tranzaksiyada: suhbatlar upsert, xabarlar COPY, statistika va user_summary"""
+        started = time.perf_counter()
+
+        # Bir statement ichida bitta qator ikki marta yangilanmasligi uchun guruhlash
+        # (suhbat egasi - paketdagi birinchi yuboruvchi)
+        conversations = {}
+        stats = {}
+        for item in batch:
+            conv = conversations.get(item["conversation_id"])
+            if conv is None:
+                conversations[item["conversation_id"]] = dict(item)
+            elif conv["user_id"] == item["user_id"] and item["now"] > conv["now"]:
+                conv["now"] = item["now"]
+            key = (item["user_id"], item["ai_type"])
+            count, last_used = stats.get(key, (0, item["now"]))
+            stats[key] = (count + 1, max(last_used, item["now"]))
+
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                owned = await self._upsert_conversations(cur, conversations)
+
+                # Boshqa foydalanuvchining (yoki o'chirilgan) suhbatiga yozilmaydi - xabarlar
+                # yuboruvchining yangi suhbatiga o'tadi. Qayta urinishda batch o'zgarmagan
+                # bo'lishi uchun elementlar emas, alohida moslik jadvali ishlatiladi
+                target = {}
+                moved = {}
+                for index, item in enumerate(batch):
+                    conv_id = item["conversation_id"]
+                    if conv_id in owned and conversations[conv_id]["user_id"] == item["user_id"]:
+                        target[index] = conv_id
+                        continue
+                    key = (conv_id, item["user_id"])
+                    if key not in moved:
+                        moved[key] = {**item, "conversation_id": str(uuid.uuid4())}
+                        logger.warning("write_behind_conversation_rejected", conversation_id=conv_id,
+                                       user_id=item["user_id"])
+                    target[index] = moved[key]["conversation_id"]
+                if moved:
+                    fresh = {conv["conversation_id"]: conv for conv in moved.values()}
+                    owned.update(await self._upsert_conversations(cur, fresh))
+                    conversations.update(fresh)
+
+                # created_at faqat INSERT da bizning vaqtimizga teng bo'ladi
+                created = {
+                    conv_id for conv_id, created_at in owned.items()
+                    if created_at == conversations[conv_id]["now"]
+                }
+
+                message_rows = [
+                    (item["message_id"], target[index], item["user_id"],
+                     item["content"], item["ai_response"], item["now"])
+                    for index, item in enumerate(batch)
+                ]
+                if is_sqlite():
+                    # SQLite da COPY yo'q - bitta tranzaksiyadagi executemany yetarlicha tez
+                    await cur.executemany("""
+                        INSERT INTO messages (id, conversation_id, user_id, content, ai_response, timestamp)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, message_rows)
+                else:
+                    async with cur.copy(
+                        "COPY messages (id, conversation_id, user_id, content, ai_response, timestamp) FROM STDIN"
+                    ) as copy:
+                        for row in message_rows:
+                            await copy.write_row(row)
+
+                # Aggregator ga faqat commit dan keyin qo'shiladi - qayta urinish yoki
+                # tashlab yuborilgan paket hisoblagichlarni ikki marta oshirmasligi uchun
+                aggregate = stats_aggregator.accepting
+                rows = [] if aggregate else [
+                    (user_id, ai_type, count, last_used)
+                    for (user_id, ai_type), (count, last_used) in stats.items()
+                ]
+                updated = await upsert_user_stats(cur, rows)
+
+                summary_rows = favorite_rows(updated)
+                for item in batch:
+                    summary_rows.append((item["user_id"], 1, 0, None, 0, item["now"]))
+                for conv_id in created:
+                    summary_rows.append((conversations[conv_id]["user_id"], 0, 1, None, 0, conversations[conv_id]["now"]))
+                await upsert_user_summary(cur, summary_rows)
+
+            await conn.commit()
+
+        if aggregate:
+            for (user_id, ai_type), (count, last_used) in stats.items():
+                stats_aggregator.add(user_id, ai_type, count, last_used)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.flushed_rows += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    async def _upsert_conversations(self, cur, conversations: dict) -> dict:
+        """Suhbatlar upsert; faqat yuboruvchiga tegishli qatorlar qaytadi (id -> created_at)"""
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(conversations))
+        params = []
+        for conv_id, item in conversations.items():
+            params.extend([conv_id, item["user_id"], item["ai_type"], item["title"], item["now"], item["now"]])
+        await cur.execute(f"""
+            INSERT INTO conversations (id, user_id, ai_type, title, created_at, updated_at)
+            VALUES {values}
+            ON CONFLICT (id) DO UPDATE
+            SET updated_at = {sql_greatest()}(conversations.updated_at, EXCLUDED.updated_at)
+            WHERE conversations.user_id = EXCLUDED.user_id AND conversations.deleted_at IS NULL
+            RETURNING id, created_at
+        """, params)
+        return {conv_id: created_at for conv_id, created_at in await cur.fetchall()}
+
+    async def stop(self):
+        """Flusher ni to'xtatish - navbatdagi hamma narsa yozib tugatiladi"""
+        if self._task is None:
+            return
+        self._stopping = True
+        queued = self._queue.qsize()
+        spilled = self.spilled
+        await self._task
+        self._task = None
+        if queued and self.spilled == spilled:
+            print(f"📊 Write-behind flushed {queued} queued rows on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "pending": self._pending_count,
+            "enqueued": self.enqueued,
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "flushed_rows": self.flushed_rows,
+            "batches": self.batches,
+            "errors": self.errors,
+            "spilled": self.spilled,
+            "failed": self.failed,
+            "replayed": self.replayed,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": round(self.flushed_rows / self.batches, 2) if self.batches else 0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.batches, 2) if self.batches else 0
+        }
+
+
+# Process uchun yagona writer
+message_writer = MessageWriter()
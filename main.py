@@ -1,219 +1,66 @@
-from fastapi import FastAPI, Depends, Request, HTTPException
+from fastapi import FastAPI, Depends, Request, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse, JSONResponse
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import psycopg2.pool
+from fastapi.responses import Response, StreamingResponse
+from psycopg.rows import dict_row
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 import uuid
 import structlog
-from openai import OpenAI
 import jwt
 import json
+import asyncio
 import threading
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
 
-# Load environment variables
+# Load environment variables (lokal modullar import qilinishidan oldin)
 load_dotenv()
 
-print("🔍 DEBUGGING ENVIRONMENT VARIABLES:")
-print(f"All env vars count: {len(os.environ)}")
-
-# OPENAI variables tekshirish
-openai_vars = {k: v for k, v in os.environ.items() if 'OPENAI' in k}
-print(f"OPENAI related vars: {openai_vars}")
-
-# Direct check
-api_key = os.getenv("OPENAI_API_KEY")
-print(f"OPENAI_API_KEY direct: {'✅ Found' if api_key else '❌ Not found'}")
-if api_key:
-    print(f"Length: {len(api_key)}")
-    print(f"Starts with: {api_key[:10]}...")
-
-# Try OpenAI client
-try:
-    if api_key:
-        client = OpenAI(api_key=api_key)
-        print("✅ OpenAI client created successfully")
-    else:
-        print("❌ No API key found for OpenAI client")
-        client = None
-except Exception as e:
-    print(f"❌ OpenAI client error: {e}")
-    client = None
+# JSON loglar navbat orqali (birinchi log chaqiruvidan oldin sozlanadi)
+from api.log import configure_logging, stop_logging, RequestLogMiddleware
+from api.lifecycle import worker_lifecycle
+configure_logging()
+
+from db import (
+    init_database, close_database, get_db_connection, get_read_connection, replica_router, ensure_schema, is_sqlite,
+    pool_stats, DatabaseBusyError, ReplicaStickyMiddleware
+)
+from db.write_behind import message_writer
+from db.stats_aggregator import stats_aggregator
+from db.pagination import encode_cursor, decode_cursor, encode_offset_cursor, decode_offset_cursor, page_size
+from db.search import search_messages, clean_query, SEARCH_MAX_OFFSET
+from db.purger import chat_purger, soft_delete_enabled
+from db.partitions import partition_maintainer, archive_index
+from db.user_cache import user_cache
+from api import success_response, error_response
+from api.ws_chat import ChatSession, chat_sessions
+from db.user_summary import USER_SUMMARY_MERGE, USER_SUMMARY_READ_SQL, upsert_user_summary, adjust_conversation_count
+from ai.base import AIServiceError, BaseAI, get_openai_client, get_llm_semaphore, close_openai_client
+from ai.history import HISTORY_MAX_TURNS, warm_encodings
+from ai.cache import response_cache, single_flight
+from ai.fuzzy_cache import fuzzy_cache
 
 # Logger
 logger = structlog.get_logger()
 
-# Database connection pool
-db_pool = None
+# Database (asinxron pool worker startup da ochiladi)
+db_initialized = False
 
-def init_database():
-    """PostgreSQL connection pool yaratish"""
-    global db_pool
-    
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    
-    if not DATABASE_URL or "postgresql" not in DATABASE_URL:
-        print("❌ PostgreSQL DATABASE_URL topilmadi")
-        return False
-    
-    try:
-        # URL ni parse qilish
-        if DATABASE_URL.startswith("postgresql://"):
-            DATABASE_URL = DATABASE_URL.replace("postgresql://", "", 1)
-        elif DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "", 1)
-        
-        # URL formatini bo'lish: user:password@host:port/database
-        auth_host_db = DATABASE_URL
-        
-        if '@' in auth_host_db:
-            auth, host_db = auth_host_db.split('@', 1)
-            if ':' in auth:
-                user, password = auth.split(':', 1)
-            else:
-                user, password = auth, ""
-        else:
-            print("❌ DATABASE_URL formatida xatolik")
-            return False
-        
-        if '/' in host_db:
-            host_port, database = host_db.split('/', 1)
-            # Query parametrlarini olib tashlash
-            if '?' in database:
-                database = database.split('?')[0]
-        else:
-            print("❌ DATABASE_URL da database nomi yo'q")
-            return False
-        
-        if ':' in host_port:
-            host, port = host_port.split(':', 1)
-            port = int(port)
-        else:
-            host, port = host_port, 5432
-        
-        # Connection pool yaratish
-        db_pool = psycopg2.pool.ThreadedConnectionPool(
-            1, 20,  # min va max connections
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password,
-            sslmode="require"
-        )
-        
-        print(f"✅ PostgreSQL pool yaratildi: {host}:{port}/{database}")
-        
-        # Test connection
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT version()")
-                version = cur.fetchone()[0]
-                print(f"✅ PostgreSQL version: {version[:50]}...")
-        
-        # Create tables
-        create_tables()
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ PostgreSQL connection error: {e}")
-        return False
-
-@contextmanager
-def get_db_connection():
-    """Database connection olish"""
-    if not db_pool:
-        raise Exception("Database pool mavjud emas")
-    
-    conn = None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Worker hayot sikli: pool, client va yordamchilar fork dan keyin yaratiladi"""
+    await startup_worker()
     try:
-        conn = db_pool.getconn()
-        conn.autocommit = False
-        yield conn
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
+        yield
     finally:
-        if conn:
-            db_pool.putconn(conn)
-
-def create_tables():
-    """Database jadvallarini yaratish"""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Users table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id VARCHAR(255) PRIMARY KEY,
-                        email VARCHAR(255) UNIQUE NOT NULL,
-                        name VARCHAR(255),
-                        picture VARCHAR(500),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Conversations table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS conversations (
-                        id VARCHAR(255) PRIMARY KEY,
-                        user_id VARCHAR(255),
-                        ai_type VARCHAR(100),
-                        title VARCHAR(500),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Messages table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS messages (
-                        id VARCHAR(255) PRIMARY KEY,
-                        conversation_id VARCHAR(255),
-                        user_id VARCHAR(255),
-                        content TEXT,
-                        ai_response TEXT,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # User stats table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS user_stats (
-                        id VARCHAR(255) PRIMARY KEY,
-                        user_id VARCHAR(255),
-                        ai_type VARCHAR(100),
-                        usage_count INTEGER DEFAULT 0,
-                        last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Indexlar qo'shish
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id)")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_user_stats_user_id ON user_stats(user_id)")
-                
-                conn.commit()
-                print("✅ Database jadvallari muvaffaqiyatli yaratildi")
-                
-    except Exception as e:
-        print(f"❌ Jadval yaratishda xato: {str(e)}")
-
-# Database ni initialize qilish
-db_initialized = init_database()
+        await shutdown_worker()
 
 # FastAPI app
 app = FastAPI(
     title="AI Universe - Professional AI Platform",
     description="25 ta professional AI xizmati bir platformada",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -230,39 +77,57 @@ cors_origins = os.getenv("CORS_ORIGINS", "").split(",") if os.getenv("CORS_ORIGI
     "*"
 ]
 
+# Preflight (OPTIONS) so'rovlariga to'liq CORSMiddleware javob beradi;
+# max_age davomida brauzer har bir chaqiruv oldidan OPTIONS yubormaydi
+CORS_MAX_AGE = int(os.getenv("CORS_MAX_AGE", "86400"))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "HEAD", "PATCH"],
     allow_headers=["*"],
-    expose_headers=["*"]
+    expose_headers=["*"],
+    max_age=CORS_MAX_AGE
 )
 
+# Read-your-writes: oxirgi yozish vaqti mijoz bilan yuradi (worker lar orasida)
+app.add_middleware(ReplicaStickyMiddleware)
+
+# request_id, javob formati va access log (eng tashqi qatlam - preflight ham loglanadi)
+app.add_middleware(RequestLogMiddleware)
+
 # AI Assistant base class
-class DummyAI:
+class DummyAI(BaseAI):
     def __init__(self, ai_type="dummy"):
+        super().__init__()
         self.ai_type = ai_type
-        self.client = client if client else None
+        self.model = "gpt-3.5-turbo"
+        self.max_tokens = 1000
+        self.temperature = 0.7
+        self.system_prompt = f"Sen {ai_type} bo'yicha professional AI yordamchisisiz. O'zbek tilida javob ber."
     
-    async def get_response(self, message: str) -> str:
-        if self.client:
-            try:
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": f"Sen {self.ai_type} bo'yicha professional AI yordamchisisiz. O'zbek tilida javob ber."},
-                        {"role": "user", "content": message}
-                    ],
-                    max_tokens=1000,
-                    temperature=0.7
+    def completion_params(self) -> dict:
+        return {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature
+        }
+    
+    async def get_response(self, message: str, history=None) -> str:
+        fallback = f"Sizning xabaringiz: '{message}' qabul qilindi. {self.ai_type.title()} AI hozircha ishlamayapti, lekin tez orada faollashadi!"
+        if not self.client:
+            return fallback
+        try:
+            async with get_llm_semaphore():
+                response = await self.client.chat.completions.create(
+                    messages=self.build_messages(message, history),
+                    **self.completion_params()
                 )
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"OpenAI API xatosi: {str(e)}")
-                return f"Sizning xabaringiz: '{message}' qabul qilindi. {self.ai_type.title()} AI hozircha ishlamayapti, lekin tez orada faollashadi!"
-        else:
-            return f"Sizning xabaringiz: '{message}' qabul qilindi. {self.ai_type.title()} AI hozircha ishlamayapti, lekin tez orada faollashadi!"
+            return response.choices[0].message.content
+        except Exception as e:
+            logger.error("llm_error", ai_type=self.ai_type, error=str(e))
+            raise AIServiceError(f"{self.ai_type.title()} AI javob bera olmadi, qayta urinib ko'ring") from e
 
 AI_ASSISTANTS = {}
 
@@ -295,146 +160,181 @@ ai_modules = [
     ("oyun", "ai.oyin_ai", "OyinAI")
 ]
 
+# Modullar import paytida yuklanadi (--preload da master da bir marta),
+# yordamchi obyektlar esa har bir worker da load_ai_assistants() bilan yaratiladi
+AI_CLASSES = {}
 for ai_key, module_path, class_name in ai_modules:
     try:
         module = __import__(module_path, fromlist=[class_name])
-        ai_class = getattr(module, class_name)
-        AI_ASSISTANTS[ai_key] = ai_class()
-        print(f"✅ {ai_key} AI module loaded")
-    except ImportError as e:
+        AI_CLASSES[ai_key] = getattr(module, class_name)
+    except (ImportError, AttributeError):
         print(f"⚠️ {ai_key} AI module not found, using dummy with OpenAI fallback")
-        AI_ASSISTANTS[ai_key] = DummyAI(ai_key)
-    except Exception as e:
-        print(f"⚠️ {ai_key} AI module error: {str(e)}, using dummy with OpenAI fallback")
-        AI_ASSISTANTS[ai_key] = DummyAI(ai_key)
 
-print(f"Total AI assistants loaded: {len(AI_ASSISTANTS)}")
+def load_ai_assistants():
+    """Yordamchilarni yaratish (xatolik bo'lsa OpenAI fallback li DummyAI)"""
+    for ai_key, _, _ in ai_modules:
+        ai_class = AI_CLASSES.get(ai_key)
+        try:
+            assistant = ai_class() if ai_class else DummyAI(ai_key)
+        except Exception as e:
+            print(f"⚠️ {ai_key} AI module error: {str(e)}, using dummy with OpenAI fallback")
+            assistant = DummyAI(ai_key)
+        assistant.ai_type = ai_key
+        AI_ASSISTANTS[ai_key] = assistant
 
-# Database helper functions
-def create_user(email: str, name: str, picture: str = "") -> dict:
-    """Yangi foydalanuvchi yaratish"""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                user_id = str(uuid.uuid4())
-                cur.execute("""
-                    INSERT INTO users (id, email, name, picture, created_at)
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING *
-                """, (user_id, email, name, picture, datetime.utcnow()))
-                
-                user = cur.fetchone()
-                conn.commit()
-                return dict(user)
-    except Exception as e:
-        print(f"Create user error: {e}")
-        return None
+# /api/ai/{ai_id} uchun: ai_modules tartibidagi raqam (1 - chat, ..., 25 - oyun)
+AI_ID_TYPES = {index: ai_key for index, (ai_key, _, _) in enumerate(ai_modules, start=1)}
 
-def get_user_by_email(email: str) -> dict:
-    """Email bo'yicha foydalanuvchi topish"""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT * FROM users WHERE email = %s", (email,))
-                user = cur.fetchone()
-                return dict(user) if user else None
-    except Exception as e:
-        print(f"Get user error: {e}")
+# Database helper functions
+USER_LOGIN_REFRESH_SECONDS = int(os.getenv("USER_LOGIN_REFRESH_SECONDS", "300"))
+
+async def upsert_user(email: str, name: str, picture: str = "") -> dict | None:
+    """
+    Foydalanuvchini bitta so'rovda yaratish yoki yangilash (ON CONFLICT email).
+    Bir vaqtdagi birinchi loginlar unique email da to'qnashmaydi.
+    """
+    now = datetime.utcnow()
+    new_id = str(uuid.uuid4())
+    async with get_db_connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute("""
+                INSERT INTO users (id, email, name, picture, created_at, last_login)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (email) DO UPDATE
+                SET name = EXCLUDED.name, picture = EXCLUDED.picture, last_login = EXCLUDED.last_login
+                RETURNING *
+            """, (new_id, email, name, picture, now, now))
+            user = await cur.fetchone()
+            await conn.commit()
+    
+    if not user:
         return None
-
-def update_user(email: str, name: str, picture: str = "") -> dict:
-    """Foydalanuvchi ma'lumotlarini yangilash"""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    UPDATE users SET name = %s, picture = %s 
-                    WHERE email = %s
-                    RETURNING *
-                """, (name, picture, email))
-                
-                user = cur.fetchone()
-                conn.commit()
-                return dict(user) if user else None
-    except Exception as e:
-        print(f"Update user error: {e}")
+    user_cache.set(dict(user))
+    # Yangi yaratilganmi - qaytgan id biz bergan id bilan bir xil bo'lsa
+    return {**user, "created": str(user["id"]) == new_id}
+
+async def get_user_by_id(user_id: str) -> dict | None:
+    """Id bo'yicha foydalanuvchi (avval keshdan)"""
+    user = user_cache.get_by_id(user_id)
+    if user:
+        return user
+    async with get_read_connection(user_id) as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+            user = await cur.fetchone()
+    if user:
+        user_cache.set(dict(user))
+    return dict(user) if user else None
+
+def cached_login(email: str, name: str, picture: str) -> dict | None:
+    """Yaqinda login qilgan va ma'lumotlari o'zgarmagan foydalanuvchi - DB ga yozish shart emas"""
+    user = user_cache.get_by_email(email)
+    if not user or user.get("name") != name or (user.get("picture") or "") != (picture or ""):
         return None
-
-def create_conversation(user_id: str, ai_type: str, title: str) -> str:
-    """Yangi suhbat yaratish"""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                conversation_id = str(uuid.uuid4())
-                cur.execute("""
-                    INSERT INTO conversations (id, user_id, ai_type, title, created_at, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (conversation_id, user_id, ai_type, title, datetime.utcnow(), datetime.utcnow()))
-                
-                conn.commit()
-                return conversation_id
-    except Exception as e:
-        print(f"Create conversation error: {e}")
+    last_login = user.get("last_login")
+    if not last_login or (datetime.utcnow() - last_login).total_seconds() > USER_LOGIN_REFRESH_SECONDS:
         return None
+    return user
+
+# Eski versiyalar saqlanmagan javobga shu id ni qaytarardi - u hech qachon suhbat id si emas
+LEGACY_TEMP_CONVERSATION_ID = "temp"
+
+# Suhbat boshqa foydalanuvchiniki (yoki o'chirilgan) bo'lsa conv bo'sh qaytadi
+# va qolgan CTE lar hech narsa yozmaydi - persist_chat yangi suhbat boshlaydi
+PERSIST_CHAT_SQL = """
+    WITH conv AS (
+        INSERT INTO conversations (id, user_id, ai_type, title, created_at, updated_at)
+        VALUES (%(conversation_id)s, %(user_id)s, %(ai_type)s, %(title)s, %(now)s, %(now)s)
+        ON CONFLICT (id) DO UPDATE SET updated_at = EXCLUDED.updated_at
+        WHERE conversations.user_id = EXCLUDED.user_id AND conversations.deleted_at IS NULL
+        RETURNING id, created_at = %(now)s AS created
+    ),
+    msg AS (
+        INSERT INTO messages (id, conversation_id, user_id, content, ai_response, timestamp)
+        SELECT %(message_id)s, conv.id, %(user_id)s, %(content)s, %(ai_response)s, %(now)s
+        FROM conv
+        RETURNING id
+    ),
+    stats AS (
+        INSERT INTO user_stats (id, user_id, ai_type, usage_count, last_used)
+        SELECT %(stat_id)s, %(user_id)s, %(ai_type)s, 1, %(now)s
+        FROM conv
+        WHERE %(with_stats)s
+        ON CONFLICT (user_id, ai_type) DO UPDATE
+        SET usage_count = user_stats.usage_count + 1, last_used = EXCLUDED.last_used
+        RETURNING ai_type, usage_count
+    ),
+    summary AS (
+        INSERT INTO user_summary (user_id, total_messages, total_conversations, favorite_ai_type, favorite_count, last_activity)
+        SELECT %(user_id)s, 1, CASE WHEN conv.created THEN 1 ELSE 0 END,
+               stats.ai_type, COALESCE(stats.usage_count, 0), %(now)s
+        FROM conv LEFT JOIN stats ON TRUE
+        """ + USER_SUMMARY_MERGE.format(greatest="GREATEST") + """
+    )
+    SELECT id FROM conv
+"""
+
+# SQLite da CTE ichida INSERT yo'q - bitta tranzaksiyada ketma-ket
+# (birinchi statement rowcount = 0 bo'lsa suhbat boshqa foydalanuvchiniki)
+PERSIST_CHAT_SQLITE = [
+    """
+    INSERT INTO conversations (id, user_id, ai_type, title, created_at, updated_at)
+    VALUES (%(conversation_id)s, %(user_id)s, %(ai_type)s, %(title)s, %(now)s, %(now)s)
+    ON CONFLICT (id) DO UPDATE SET updated_at = EXCLUDED.updated_at
+    WHERE conversations.user_id = EXCLUDED.user_id AND conversations.deleted_at IS NULL
+    """,
+    """
+    INSERT INTO messages (id, conversation_id, user_id, content, ai_response, timestamp)
+    VALUES (%(message_id)s, %(conversation_id)s, %(user_id)s, %(content)s, %(ai_response)s, %(now)s)
+    """,
+    """
+    INSERT INTO user_stats (id, user_id, ai_type, usage_count, last_used)
+    VALUES (%(stat_id)s, %(user_id)s, %(ai_type)s, 1, %(now)s)
+    ON CONFLICT (user_id, ai_type) DO UPDATE
+    SET usage_count = user_stats.usage_count + 1, last_used = EXCLUDED.last_used
+    """,
+    # Ketma-ket statementlar oldingilarining natijasini ko'radi
+    """
+    INSERT INTO user_summary (user_id, total_messages, total_conversations, favorite_ai_type, favorite_count, last_activity)
+    SELECT %(user_id)s, 1,
+           (SELECT COUNT(*) FROM conversations WHERE id = %(conversation_id)s AND created_at = %(now)s),
+           s.ai_type, COALESCE(s.usage_count, 0), %(now)s
+    FROM (SELECT 1) one
+    LEFT JOIN user_stats s ON s.user_id = %(user_id)s AND s.ai_type = %(ai_type)s AND %(with_stats)s
+    WHERE TRUE
+    """ + USER_SUMMARY_MERGE.format(greatest="MAX")
+]
 
-def save_message(conversation_id: str, user_id: str, content: str, ai_response: str):
-    """Xabar saqlash"""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                message_id = str(uuid.uuid4())
-                cur.execute("""
-                    INSERT INTO messages (id, conversation_id, user_id, content, ai_response, timestamp)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (message_id, conversation_id, user_id, content, ai_response, datetime.utcnow()))
-                
-                conn.commit()
-    except Exception as e:
-        print(f"Save message error: {e}")
-
-def update_user_stats(user_id: str, ai_type: str):
-    """Foydalanuvchi statistikasini yangilash"""
+async def get_conversation_history(conversation_id: str, user_id: str, limit: int = HISTORY_MAX_TURNS) -> list:
+    """Suhbatning oxirgi xabarlari (eskidan yangiga) - faqat egasiga va o'chirilmagan suhbatdan"""
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Mavjud statistika bormi tekshirish
-                cur.execute("""
-                    SELECT id, usage_count FROM user_stats 
-                    WHERE user_id = %s AND ai_type = %s
-                """, (user_id, ai_type))
-                
-                stat = cur.fetchone()
-                
-                if stat:
-                    # Mavjud statistikani yangilash
-                    cur.execute("""
-                        UPDATE user_stats 
-                        SET usage_count = usage_count + 1, last_used = %s
-                        WHERE user_id = %s AND ai_type = %s
-                    """, (datetime.utcnow(), user_id, ai_type))
-                else:
-                    # Yangi statistika yaratish
-                    stat_id = str(uuid.uuid4())
-                    cur.execute("""
-                        INSERT INTO user_stats (id, user_id, ai_type, usage_count, last_used)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (stat_id, user_id, ai_type, 1, datetime.utcnow()))
-                
-                conn.commit()
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT m.id, m.content, m.ai_response, m.timestamp FROM messages m
+                    JOIN conversations c ON c.id = m.conversation_id AND c.user_id = %s AND c.deleted_at IS NULL
+                    WHERE m.conversation_id = %s
+                    ORDER BY m.timestamp DESC
+                    LIMIT %s
+                """, (user_id, conversation_id, limit))
+                rows = await cur.fetchall()
+        # Write-behind navbatidagi (hali flush bo'lmagan) xabarlar ham kontekstga kiradi
+        pending = message_writer.pending_messages(conversation_id, user_id)
+        if pending:
+            seen = {row[0] for row in rows}
+            rows = list(rows) + [
+                (item["message_id"], item["content"], item["ai_response"], item["now"])
+                for item in pending if item["message_id"] not in seen
+            ]
+            rows = sorted(rows, key=lambda row: row[3], reverse=True)[:limit]
+        return [(row[1], row[2]) for row in reversed(rows)]
     except Exception as e:
-        print(f"Update stats error: {e}")
+        logger.error("history_load_failed", conversation_id=conversation_id, error=str(e))
+        return []
 
-def update_conversation_timestamp(conversation_id: str):
-    """Suhbat vaqtini yangilash"""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE conversations SET updated_at = %s WHERE id = %s
-                """, (datetime.utcnow(), conversation_id))
-                conn.commit()
-    except Exception as e:
-        print(f"Update conversation error: {e}")
+def db_busy_response() -> Response:
+    """Pool to'la - mijoz qayta urinishi mumkin"""
+    return error_response("database_busy", "Database is busy, please retry", 503, headers={"Retry-After": "1"})
 
 # Dependency for database check
 def get_db():
@@ -446,27 +346,27 @@ def get_db():
 # Root endpoints
 @app.get("/")
 async def root():
-    return PlainTextResponse("success|AI Universe|Welcome to AI Universe Platform")
+    return success_response("AI Universe", "Welcome to AI Universe Platform")
 
 @app.post("/")
 async def root_post():
-    return PlainTextResponse("success|AI Universe|Welcome to AI Universe Platform")
+    return success_response("AI Universe", "Welcome to AI Universe Platform")
 
 @app.head("/")
 async def root_head():
-    return PlainTextResponse("success|AI Universe|Welcome to AI Universe Platform")
+    return success_response("AI Universe", "Welcome to AI Universe Platform")
 
 @app.get("/api")
 async def api_root():
-    return PlainTextResponse("success|AI Universe API|Welcome to AI Universe API")
+    return success_response("AI Universe API", "Welcome to AI Universe API")
 
 @app.get("/health")
 async def health_check():
-    return PlainTextResponse("success|healthy|Server is running")
+    return success_response("healthy", "Server is running")
 
 @app.get("/api/health")
 async def api_health_check():
-    return PlainTextResponse("success|healthy|Server is running")
+    return success_response("healthy", "Server is running")
 
 # Google Auth endpoint
 @app.post("/api/auth/google") 
@@ -484,7 +384,7 @@ async def google_auth(request: Request):
                 google_id = payload.get('sub')
             except Exception as e:
                 logger.error(f"JWT decode error: {str(e)}")
-                return PlainTextResponse("error|invalid_token|Invalid JWT token", status_code=400)
+                return error_response("invalid_token", "Invalid JWT token", 400)
         
         elif 'user_data' in body:
             user_data = body['user_data']
@@ -500,7 +400,7 @@ async def google_auth(request: Request):
             google_id = body.get("google_id") or body.get("sub")
         
         if not email or not name:
-            return PlainTextResponse("error|missing_data|Email and name are required", status_code=400)
+            return error_response("missing_data", "Email and name are required", 400)
         
         if not db_initialized:
             # Database yo'q bo'lsa dummy response
@@ -511,25 +411,28 @@ async def google_auth(request: Request):
                 "picture": picture,
                 "google_id": google_id
             }
-            return PlainTextResponse(f"success|{json.dumps(user_info)}|User authenticated successfully")
+            return success_response(user_info, "User authenticated successfully",
+                                    text=f"success|{json.dumps(user_info)}|User authenticated successfully")
         
         # Database bilan ishlash
         try:
-            user = get_user_by_email(email)
+            user = cached_login(email, name, picture)
             
             if not user:
-                user = create_user(email, name, picture)
-                logger.info(f"New user created: {email}")
-            else:
-                user = update_user(email, name, picture)
-                logger.info(f"Existing user updated: {email}")
+                user = await upsert_user(email, name, picture)
+                if user and user["created"]:
+                    logger.info(f"New user created: {email}")
+                elif user:
+                    logger.info(f"Existing user updated: {email}")
                 
             if not user:
-                return PlainTextResponse("error|database_error|Failed to create/update user", status_code=500)
+                return error_response("database_error", "Failed to create/update user", 500)
         
+        except DatabaseBusyError:
+            return db_busy_response()
         except Exception as db_error:
             logger.error(f"Database error in auth: {str(db_error)}")
-            return PlainTextResponse(f"error|database_error|Database operation failed", status_code=500)
+            return error_response("database_error", "Database operation failed", 500)
         
         user_info = {
             "id": str(user['id']),
@@ -539,46 +442,155 @@ async def google_auth(request: Request):
             "google_id": google_id
         }
         
-        return PlainTextResponse(f"success|{json.dumps(user_info)}|User authenticated successfully")
+        return success_response(user_info, "User authenticated successfully",
+                                text=f"success|{json.dumps(user_info)}|User authenticated successfully")
         
     except json.JSONDecodeError:
-        return PlainTextResponse("error|invalid_json|Invalid JSON data", status_code=400)
+        return error_response("invalid_json", "Invalid JSON data", 400)
     except Exception as e:
         logger.error("Google auth failed", error=str(e))
-        return PlainTextResponse(f"error|auth_failed|{str(e)}", status_code=500)
+        return error_response("auth_failed", str(e), 500)
 
 # Chat processing function
+async def persist_chat(message: str, user_id: str, conversation_id: str | None, ai_type: str, ai_response: str) -> str | None:
+    """Suhbat, xabar, statistika va user_summary ni bitta atomik so'rovda saqlash"""
+    title = message[:50] + "..." if len(message) > 50 else message
+    if conversation_id == LEGACY_TEMP_CONVERSATION_ID:
+        conversation_id = None
+    conversation_id = conversation_id or str(uuid.uuid4())
+    message_id = str(uuid.uuid4())
+    
+    # Keyingi o'qishlar qisqa vaqt primary dan (read-your-writes)
+    replica_router.mark_write(user_id, conversation_id)
+    
+    # Write-behind rejimida navbatga qo'yib darhol qaytamiz (navbat to'la bo'lsa to'g'ridan-to'g'ri yozamiz);
+    # suhbat egasi flush paytida tekshiriladi
+    if await message_writer.enqueue(conversation_id, message_id, user_id, ai_type, title, message, ai_response):
+        return conversation_id
+    
+    params = {
+        "conversation_id": conversation_id,
+        "message_id": message_id,
+        "stat_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "ai_type": ai_type,
+        "title": title,
+        "content": message,
+        "ai_response": ai_response,
+        "now": datetime.utcnow()
+    }
+    # Aggregator yoqilgan bo'lsa statistika xotirada yig'iladi (faqat muvaffaqiyatli yozuvdan keyin)
+    params["with_stats"] = not stats_aggregator.accepting
+    
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            row = await execute_persist_chat(cur, params)
+            if row is None:
+                # Boshqa foydalanuvchining (yoki o'chirilgan) suhbatiga yozilmaydi - yangi suhbat
+                logger.warning("chat_conversation_rejected", conversation_id=conversation_id, user_id=user_id)
+                params["conversation_id"] = str(uuid.uuid4())
+                replica_router.mark_write(params["conversation_id"])
+                row = await execute_persist_chat(cur, params)
+            await conn.commit()
+    
+    if not params["with_stats"]:
+        stats_aggregator.add(user_id, ai_type, 1, params["now"])
+    
+    return row[0] if row else None
+
+async def execute_persist_chat(cur, params: dict):
+    """Bitta almashinuvni yozish; suhbat boshqa foydalanuvchiniki bo'lsa None"""
+    if not is_sqlite():
+        await cur.execute(PERSIST_CHAT_SQL, params)
+        return await cur.fetchone()
+    
+    await cur.execute(PERSIST_CHAT_SQLITE[0], params)
+    if cur.rowcount == 0:
+        return None
+    statements = PERSIST_CHAT_SQLITE[1:] if params["with_stats"] else PERSIST_CHAT_SQLITE[1:2] + PERSIST_CHAT_SQLITE[3:]
+    for statement in statements:
+        await cur.execute(statement, params)
+    return (params["conversation_id"],)
+
 async def process_chat(ai_assistant, message: str, user_id: str, conversation_id: str | None, ai_type: str):
     try:
         if not user_id:
-            return PlainTextResponse("error|missing_user_id|User ID is required", status_code=400)
+            return error_response("missing_user_id", "User ID is required", 400)
         if not message:
-            return PlainTextResponse("error|missing_message|Message is required", status_code=400)
+            return error_response("missing_message", "Message is required", 400)
         
-        ai_response = await ai_assistant.get_response(message)
+        history = await get_conversation_history(conversation_id, user_id) if db_initialized and conversation_id else None
+        try:
+            ai_response = await ai_assistant.get_response(message, history)
+        except AIServiceError as e:
+            # Xato javob sifatida saqlanmaydi va tarixga kirmaydi
+            return error_response(e.code, str(e), e.status)
         
         if db_initialized:
             try:
-                # Yangi suhbat yaratish
-                if not conversation_id:
-                    title = message[:50] + "..." if len(message) > 50 else message
-                    conversation_id = create_conversation(user_id, ai_type, title)
-                
-                # Xabar saqlash
-                if conversation_id:
-                    save_message(conversation_id, user_id, message, ai_response)
-                    update_user_stats(user_id, ai_type)
-                    update_conversation_timestamp(conversation_id)
-                
+                conversation_id = await persist_chat(message, user_id, conversation_id, ai_type, ai_response)
             except Exception as db_error:
                 logger.error(f"Database error in chat: {str(db_error)}")
                 # Database xatosi bo'lsa ham AI javobini qaytarish
                 pass
         
-        return PlainTextResponse(f"success|{ai_response}|{conversation_id or 'temp'}")
+        # Saqlanmagan javob uchun id yo'q (null) - soxta umumiy id qaytarilmaydi
+        return success_response({"response": ai_response, "conversation_id": conversation_id}, "Response generated",
+                                text=f"success|{ai_response}|{conversation_id or ''}")
     except Exception as e:
         logger.error(f"Chat failed for {ai_type}", error=str(e))
-        return PlainTextResponse(f"error|chat_failed|{str(e)}", status_code=500)
+        return error_response("chat_failed", str(e), 500)
+
+def sse_event(event: str, data) -> str:
+    """Server-Sent Event formatidagi bitta hodisa"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def wants_stream(request: Request, body: dict) -> bool:
+    """So'rov streaming javob kutayaptimi"""
+    flag = body.get("stream", request.query_params.get("stream", ""))
+    if str(flag).lower() in ("1", "true", "yes"):
+        return True
+    return "text/event-stream" in request.headers.get("accept", "")
+
+async def stream_chat(ai_assistant, message: str, user_id: str, conversation_id: str | None, ai_type: str):
+    if not user_id:
+        return error_response("missing_user_id", "User ID is required", 400)
+    if not message:
+        return error_response("missing_message", "Message is required", 400)
+    
+    async def event_stream():
+        # Headerlar va birinchi bayt darhol yuboriladi
+        yield ": stream-start\n\n"
+        
+        history = await get_conversation_history(conversation_id, user_id) if db_initialized and conversation_id else None
+        
+        chunks = []
+        try:
+            async for token in ai_assistant.stream_response(message, history):
+                chunks.append(token)
+                yield sse_event("token", token)
+        except Exception as e:
+            logger.error(f"Chat stream failed for {ai_type}", error=str(e))
+            code = e.code if isinstance(e, AIServiceError) else "chat_failed"
+            yield sse_event("error", {"status": "error", "code": code, "message": str(e)})
+            return
+        
+        ai_response = "".join(chunks).strip()
+        saved_conversation_id = conversation_id
+        
+        if db_initialized:
+            try:
+                saved_conversation_id = await persist_chat(message, user_id, conversation_id, ai_type, ai_response)
+            except Exception as db_error:
+                logger.error(f"Database error in chat stream: {str(db_error)}")
+        
+        yield sse_event("done", {"status": "success", "conversation_id": saved_conversation_id})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 async def handle_chat_request(request: Request, ai_type: str):
     try:
@@ -586,66 +598,83 @@ async def handle_chat_request(request: Request, ai_type: str):
         message = body.get("message")
         user_id = body.get("user_id")
         conversation_id = body.get("conversation_id")
+        if conversation_id == LEGACY_TEMP_CONVERSATION_ID:
+            # Eski javoblardagi "temp" - haqiqiy suhbat emas, yangisi boshlanadi
+            conversation_id = None
         
-        print(f"Chat request: ai_type={ai_type}, message={message[:50] if message else 'None'}..., user_id={user_id}")
+        logger.debug("chat_request", ai_type=ai_type, user_id=user_id, message_chars=len(message) if message else 0)
         
         if not AI_ASSISTANTS.get(ai_type):
-            return PlainTextResponse(f"error|invalid_ai_type|AI type '{ai_type}' not found", status_code=404)
+            return error_response("invalid_ai_type", f"AI type '{ai_type}' not found", 404)
+        
+        if wants_stream(request, body):
+            return await stream_chat(AI_ASSISTANTS[ai_type], message, user_id, conversation_id, ai_type)
         
         return await process_chat(AI_ASSISTANTS[ai_type], message, user_id, conversation_id, ai_type)
     except json.JSONDecodeError:
-        return PlainTextResponse("error|invalid_json|Invalid JSON data", status_code=400)
+        return error_response("invalid_json", "Invalid JSON data", 400)
     except Exception as e:
         logger.error(f"Handle chat request failed for {ai_type}", error=str(e))
-        return PlainTextResponse(f"error|request_failed|{str(e)}", status_code=500)
+        return error_response("request_failed", str(e), 500)
 
 # AI ID ga asosan routing
 @app.post("/api/ai/{ai_id}")
 async def api_chat_by_id(ai_id: int, request: Request):
     try:
-        ai_type_mapping = {
-            1: 'chat', 2: 'tarjimon', 3: 'blockchain', 4: 'tadqiqot', 5: 'smart_energy',
-            6: 'dasturlash', 7: 'tibbiy', 8: 'talim', 9: 'biznes', 10: 'huquq',
-            11: 'psixologik', 12: 'moliya', 13: 'sayohat', 14: 'oshpazlik', 15: 'ijod',
-            16: 'musiqa', 17: 'sport', 18: 'obhavo', 19: 'yangiliklar', 20: 'matematik',
-            21: 'fan', 22: 'ovozli', 23: 'arxitektura', 24: 'ekologiya', 25: 'oyun'
-        }
-        
-        ai_type = ai_type_mapping.get(ai_id)
+        ai_type = AI_ID_TYPES.get(ai_id)
         if not ai_type:
-            return PlainTextResponse(f"error|invalid_ai_id|AI ID '{ai_id}' not found", status_code=404)
-        
-        print(f"Converting AI ID {ai_id} to type '{ai_type}'")
+            return error_response("invalid_ai_id", f"AI ID '{ai_id}' not found", 404)
         
         return await handle_chat_request(request, ai_type)
     except Exception as e:
         logger.error(f"API chat by ID failed for {ai_id}", error=str(e))
-        return PlainTextResponse(f"error|api_chat_failed|{str(e)}", status_code=500)
-
-# Chat endpoints
-chat_endpoints = [
-    "chat", "tarjimon", "blockchain", "tadqiqot", "smart_energy", "dasturlash",
-    "tibbiy", "talim", "biznes", "huquq", "psixologik", "moliya", "sayohat",
-    "oshpazlik", "ijod", "musiqa", "sport", "obhavo", "yangiliklar", "matematik",
-    "fan", "ovozli", "arxitektura", "ekologiya", "oyun"
-]
+        return error_response("api_chat_failed", str(e), 500)
 
-# Dynamic endpoint creation
-for ai_type in chat_endpoints:
-    def create_handler(ai_type_name):
-        async def handler(request: Request):
-            return await handle_chat_request(request, ai_type_name)
-        return handler
-    
-    handler = create_handler(ai_type)
-    app.add_api_route(f"/chat/{ai_type}", handler, methods=["POST"])
-    app.add_api_route(f"/api/chat/{ai_type}", handler, methods=["POST"])
+# Chat endpoints - bitta parametrli route, ai_type AI_ASSISTANTS bo'yicha tekshiriladi
+@app.post("/chat/{ai_type}")
+@app.post("/api/chat/{ai_type}")
+async def chat_by_type(ai_type: str, request: Request):
+    return await handle_chat_request(request, ai_type)
+
+# WebSocket chat - sessiya davomida foydalanuvchi, yordamchi va suhbat tarixi xotirada
+async def ws_authenticate(user_id: str) -> dict | None:
+    if not db_initialized:
+        # HTTP chat kabi: DB yo'q bo'lsa user_id tekshirilmaydi
+        return {"id": user_id}
+    return await get_user_by_id(user_id)
+
+async def ws_load_history(conversation_id: str, user_id: str) -> list | None:
+    """Suhbat tarixi; suhbat yo'q, o'chirilgan yoki boshqa foydalanuvchiniki bo'lsa None"""
+    if not db_initialized:
+        return []
+    if conversation_id == LEGACY_TEMP_CONVERSATION_ID:
+        return None
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                SELECT 1 FROM conversations
+                WHERE id = %s AND user_id = %s AND deleted_at IS NULL
+            """, (conversation_id, user_id))
+            owned = await cur.fetchone()
+    if not owned and not message_writer.pending_messages(conversation_id, user_id):
+        return None
+    return await get_conversation_history(conversation_id, user_id)
+
+async def ws_persist(message: str, user_id: str, conversation_id: str | None, ai_type: str, ai_response: str) -> str | None:
+    if not db_initialized:
+        return conversation_id
+    return await persist_chat(message, user_id, conversation_id, ai_type, ai_response)
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    session = ChatSession(websocket, AI_ASSISTANTS, ws_authenticate, ws_load_history, ws_persist)
+    await session.run()
 
 # Chat management endpoints (PostgreSQL bilan)
 @app.post("/api/chats")
 async def create_or_update_chat(request: Request):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
         body = await request.json()
@@ -655,35 +684,37 @@ async def create_or_update_chat(request: Request):
         ai_type = body.get("ai_type", "chat")
         
         if not user_id:
-            return PlainTextResponse("error|missing_user_id|User ID is required", status_code=400)
+            return error_response("missing_user_id", "User ID is required", 400)
         
         try:
-            with get_db_connection() as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            async with get_db_connection() as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
                     # Mavjud suhbat bormi tekshirish
-                    cur.execute("SELECT * FROM conversations WHERE id = %s", (chat_id,))
-                    conversation = cur.fetchone()
+                    await cur.execute("SELECT * FROM conversations WHERE id = %s", (chat_id,))
+                    conversation = await cur.fetchone()
                     
                     if not conversation:
                         # Yangi suhbat yaratish
-                        cur.execute("""
+                        await cur.execute("""
                             INSERT INTO conversations (id, user_id, ai_type, title, created_at, updated_at)
                             VALUES (%s, %s, %s, %s, %s, %s)
                             RETURNING *
                         """, (chat_id, user_id, ai_type, title, datetime.utcnow(), datetime.utcnow()))
-                        conversation = cur.fetchone()
+                        conversation = await cur.fetchone()
+                        await upsert_user_summary(cur, [(user_id, 0, 1, None, 0, conversation['created_at'])])
                     else:
                         
                         # Mavjud suhbatni yangilash
-                        cur.execute("""
+                        await cur.execute("""
                             UPDATE conversations 
                             SET title = %s, updated_at = %s
                             WHERE id = %s
                             RETURNING *
                         """, (title, datetime.utcnow(), chat_id))
-                        conversation = cur.fetchone()
+                        conversation = await cur.fetchone()
                     
-                    conn.commit()
+                    await conn.commit()
+                    replica_router.mark_write(user_id, chat_id)
                     
                     chat_data = {
                         "id": conversation['id'],
@@ -694,178 +725,289 @@ async def create_or_update_chat(request: Request):
                         "updated_at": conversation['updated_at'].isoformat()
                     }
                     
-                    return PlainTextResponse(f"success|{json.dumps(chat_data)}|Chat saved successfully")
+                    return success_response(chat_data, "Chat saved successfully",
+                                            text=f"success|{json.dumps(chat_data)}|Chat saved successfully")
                     
+        except DatabaseBusyError:
+            return db_busy_response()
         except Exception as db_error:
-            print(f"Database error in create/update chat: {str(db_error)}")
-            return PlainTextResponse("error|database_error|Failed to save chat", status_code=500)
+            logger.error("chat_save_failed", chat_id=chat_id, error=str(db_error))
+            return error_response("database_error", "Failed to save chat", 500)
         
     except json.JSONDecodeError:
-        return PlainTextResponse("error|invalid_json|Invalid JSON data", status_code=400)
+        return error_response("invalid_json", "Invalid JSON data", 400)
     except Exception as e:
-        print(f"Create/update chat error: {str(e)}")
-        return PlainTextResponse(f"error|create_failed|{str(e)}", status_code=500)
+        logger.error("chat_save_failed", error=str(e))
+        return error_response("create_failed", str(e), 500)
 
 @app.put("/api/chats/{chat_id}")
 async def update_chat(chat_id: str, request: Request):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
         body = await request.json()
         title = body.get("title", "New Chat")
         user_id = str(body.get("user_id", "")).strip()
-        ai_type = body.get("ai_type", "chat")
         
         if not user_id:
-            return PlainTextResponse("error|missing_user_id|User ID is required", status_code=400)
+            return error_response("missing_user_id", "User ID is required", 400)
         
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("""
                         UPDATE conversations 
                         SET title = %s, updated_at = %s
-                        WHERE id = %s AND user_id = %s
+                        WHERE id = %s AND user_id = %s AND deleted_at IS NULL
                     """, (title, datetime.utcnow(), chat_id, user_id))
                     
                     if cur.rowcount == 0:
-                        return PlainTextResponse("error|chat_not_found|Chat not found or access denied", status_code=404)
+                        return error_response("chat_not_found", "Chat not found or access denied", 404)
                     
-                    conn.commit()
-                    return PlainTextResponse("success|chat_updated|Chat updated successfully")
+                    await conn.commit()
+                    replica_router.mark_write(user_id, chat_id)
+                    return success_response("chat_updated", "Chat updated successfully")
                     
+        except DatabaseBusyError:
+            return db_busy_response()
         except Exception as db_error:
-            print(f"Database error in update chat: {str(db_error)}")
-            return PlainTextResponse("error|database_error|Failed to update chat", status_code=500)
+            logger.error("chat_update_failed", chat_id=chat_id, error=str(db_error))
+            return error_response("database_error", "Failed to update chat", 500)
         
     except json.JSONDecodeError:
-        return PlainTextResponse("error|invalid_json|Invalid JSON data", status_code=400)
+        return error_response("invalid_json", "Invalid JSON data", 400)
     except Exception as e:
-        print(f"Update chat error: {str(e)}")
-        return PlainTextResponse(f"error|update_failed|{str(e)}", status_code=500)
+        logger.error("chat_update_failed", chat_id=chat_id, error=str(e))
+        return error_response("update_failed", str(e), 500)
 
 @app.get("/api/chats/user/{user_id}")
-async def get_user_chats(user_id: str):
+async def get_user_chats(user_id: str, limit: int | None = None, cursor: str | None = None):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
-        print(f"GET USER CHATS: {user_id}")
+        # limit yoki cursor berilsa keyset pagination, aks holda eski (to'liq) ro'yxat
+        paginated = limit is not None or cursor is not None
+        size = page_size(limit)
         
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT * FROM conversations 
-                    WHERE user_id = %s 
-                    ORDER BY updated_at DESC
-                """, (user_id,))
+        query = "SELECT * FROM conversations WHERE user_id = %s AND deleted_at IS NULL"
+        params = [user_id]
+        if cursor:
+            try:
+                cursor_time, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                return error_response("invalid_cursor", "Invalid pagination cursor", 400)
+            query += " AND (updated_at, id) < (%s, %s)"
+            params.extend([cursor_time, cursor_id])
+        query += " ORDER BY updated_at DESC, id DESC"
+        if paginated:
+            query += " LIMIT %s"
+            params.append(size + 1)
+        
+        async with get_read_connection(user_id) as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, params)
                 
-                conversations = cur.fetchall()
+                conversations = await cur.fetchall()
         
         if not conversations:
-            print(f"No chats found for user {user_id}")
-            return PlainTextResponse("success|no_chats|No chats found")
+            return success_response({"chats": [], "next_cursor": None}, "No chats found", text="success|no_chats|No chats found")
         
-        chats_data = []
-        for conv in conversations:
-            chats_data.append(f"{conv['id']}|{conv['ai_type']}|{conv['title']}|{conv['created_at']}|{conv['updated_at']}")
+        has_more = paginated and len(conversations) > size
+        if has_more:
+            conversations = conversations[:size]
         
-        result = "\n".join(chats_data)
-        print(f"Found {len(conversations)} chats for user {user_id}")
+        next_cursor = None
+        if has_more:
+            last = conversations[-1]
+            next_cursor = encode_cursor(last['updated_at'], last['id'])
         
-        return PlainTextResponse(f"success|{result}|Chats retrieved")
+        logger.debug("chats_listed", user_id=user_id, count=len(conversations))
         
+        return success_response(
+            {"chats": [chat_dict(conv) for conv in conversations], "next_cursor": next_cursor},
+            "Chats retrieved",
+            text=f"success|{format_chats(conversations, next_cursor)}|Chats retrieved"
+        )
+        
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
-        print(f"Get chats error: {str(e)}")
-        return PlainTextResponse(f"error|get_chats_failed|{str(e)}", status_code=500)
+        logger.error("chats_list_failed", user_id=user_id, error=str(e))
+        return error_response("get_chats_failed", str(e), 500)
+
+async def fetch_message_page(cur, chat_id: str, limit: int | None, cursor: str | None):
+    """
+    Suhbat xabarlari (timestamp, id) bo'yicha o'sish tartibida.
+    limit/cursor berilmasa barcha xabarlar. Qaytaradi: (xabarlar, next_cursor)
+    """
+    paginated = limit is not None or cursor is not None
+    size = page_size(limit)
+    
+    query = "SELECT * FROM messages WHERE conversation_id = %s"
+    params = [chat_id]
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        query += " AND (timestamp, id) > (%s, %s)"
+        params.extend([cursor_time, cursor_id])
+    query += " ORDER BY timestamp ASC, id ASC"
+    if paginated:
+        query += " LIMIT %s"
+        params.append(size + 1)
+    
+    await cur.execute(query, params)
+    messages = await cur.fetchall()
+    
+    next_cursor = None
+    if paginated and len(messages) > size:
+        messages = messages[:size]
+        next_cursor = encode_cursor(messages[-1]['timestamp'], messages[-1]['id'])
+    
+    return messages, next_cursor
+
+async def merge_archived_messages(conversation: dict, messages: list, next_cursor: str | None,
+                                  limit: int | None, cursor: str | None):
+    """
+    Arxivlangan (detach qilingan partitionlardagi) xabarlarni jonli xabarlar
+    oldiga qo'shish. Arxiv doim jonli qatorlardan eski, shuning uchun
+    (timestamp, id) tartibi va cursor lar saqlanadi.
+    """
+    archived = await archive_index.load_messages(conversation['id'], conversation['created_at'], conversation['updated_at'])
+    if cursor:
+        cursor_key = decode_cursor(cursor)
+        archived = [msg for msg in archived if (msg['timestamp'], msg['id']) > cursor_key]
+    if not archived:
+        return messages, next_cursor
+    
+    combined = archived + messages
+    if limit is None and cursor is None:
+        return combined, None
+    
+    size = page_size(limit)
+    if len(combined) > size or next_cursor:
+        combined = combined[:size]
+        next_cursor = encode_cursor(combined[-1]['timestamp'], combined[-1]['id'])
+    return combined, next_cursor
+
+def chat_dict(conversation: dict) -> dict:
+    return {
+        "id": conversation['id'],
+        "ai_type": conversation['ai_type'],
+        "title": conversation['title'],
+        "created_at": conversation['created_at'],
+        "updated_at": conversation['updated_at']
+    }
+
+def message_dict(message: dict) -> dict:
+    return {
+        "id": message['id'],
+        "content": message['content'],
+        "ai_response": message['ai_response'],
+        "timestamp": message['timestamp']
+    }
+
+def format_chat(conversation: dict) -> str:
+    return f"{conversation['id']}|{conversation['ai_type']}|{conversation['title']}|{conversation['created_at']}|{conversation['updated_at']}"
+
+def format_chats(conversations: list, next_cursor: str | None) -> str:
+    lines = [format_chat(conv) for conv in conversations]
+    if next_cursor:
+        lines.append(f"NEXT_CURSOR:{next_cursor}")
+    return "\n".join(lines)
+
+def format_messages(messages: list, next_cursor: str | None) -> str:
+    lines = [
+        f"MSG:{msg['id']}|{msg['content']}|{msg['ai_response']}|{msg['timestamp']}"
+        for msg in messages
+    ]
+    if next_cursor:
+        lines.append(f"NEXT_CURSOR:{next_cursor}")
+    return "\n".join(lines)
 
 @app.get("/api/chats/{chat_id}")
-async def get_chat_details(chat_id: str):
+async def get_chat_details(chat_id: str, limit: int | None = None, cursor: str | None = None):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
-        print(f"GET CHAT DETAILS: {chat_id}")
-        
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        async with get_read_connection(chat_id) as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
                 # Suhbat ma'lumotlari
-                cur.execute("SELECT * FROM conversations WHERE id = %s", (chat_id,))
-                conversation = cur.fetchone()
+                await cur.execute("SELECT * FROM conversations WHERE id = %s AND deleted_at IS NULL", (chat_id,))
+                conversation = await cur.fetchone()
                 
                 if not conversation:
-                    return PlainTextResponse("error|chat_not_found|Chat not found", status_code=404)
+                    return error_response("chat_not_found", "Chat not found", 404)
                 
                 # Xabarlar
-                cur.execute("""
-                    SELECT * FROM messages 
-                    WHERE conversation_id = %s 
-                    ORDER BY timestamp ASC
-                """, (chat_id,))
-                
-                messages = cur.fetchall()
+                messages, next_cursor = await fetch_message_page(cur, chat_id, limit, cursor)
         
-        chat_info = f"{conversation['id']}|{conversation['ai_type']}|{conversation['title']}|{conversation['created_at']}|{conversation['updated_at']}"
+        # Arxivga o'tkazilgan eski xabarlar (sekinroq yo'l)
+        messages, next_cursor = await merge_archived_messages(conversation, messages, next_cursor, limit, cursor)
         
-        if messages:
-            messages_info = "\n".join([
-                f"MSG:{msg['id']}|{msg['content']}|{msg['ai_response']}|{msg['timestamp']}"
-                for msg in messages
-            ])
-            return PlainTextResponse(f"success|{chat_info}|{messages_info}")
-        else:
-            return PlainTextResponse(f"success|{chat_info}|no_messages")
+        data = {
+            "chat": chat_dict(conversation),
+            "messages": [message_dict(msg) for msg in messages],
+            "next_cursor": next_cursor
+        }
+        messages_info = format_messages(messages, next_cursor) if messages else "no_messages"
+        return success_response(data, "Chat retrieved", text=f"success|{format_chat(conversation)}|{messages_info}")
         
+    except ValueError:
+        return error_response("invalid_cursor", "Invalid pagination cursor", 400)
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
-        print(f"Get chat details error: {str(e)}")
-        return PlainTextResponse(f"error|get_chat_failed|{str(e)}", status_code=500)
+        logger.error("chat_details_failed", chat_id=chat_id, error=str(e))
+        return error_response("get_chat_failed", str(e), 500)
 
 @app.get("/api/chats/{chat_id}/messages")
-async def get_chat_messages_api(chat_id: str):
+async def get_chat_messages_api(chat_id: str, limit: int | None = None, cursor: str | None = None):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
-        print(f"GET CHAT MESSAGES: {chat_id}")
-        
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        async with get_read_connection(chat_id) as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
                 # Suhbat mavjudligini tekshirish
-                cur.execute("SELECT id FROM conversations WHERE id = %s", (chat_id,))
-                if not cur.fetchone():
-                    return PlainTextResponse("error|chat_not_found|Chat not found", status_code=404)
-                
-                # Xabarlar
-                cur.execute("""
-                    SELECT * FROM messages 
-                    WHERE conversation_id = %s 
-                    ORDER BY timestamp ASC
+                await cur.execute("""
+                    SELECT id, created_at, updated_at FROM conversations
+                    WHERE id = %s AND deleted_at IS NULL
                 """, (chat_id,))
+                conversation = await cur.fetchone()
+                if not conversation:
+                    return error_response("chat_not_found", "Chat not found", 404)
                 
-                messages = cur.fetchall()
+                # Xabarlar
+                messages, next_cursor = await fetch_message_page(cur, chat_id, limit, cursor)
         
-        if not messages:
-            print(f"No messages found for chat: {chat_id}")
-            return PlainTextResponse("success|no_messages|No messages found")
+        messages, next_cursor = await merge_archived_messages(conversation, messages, next_cursor, limit, cursor)
         
-        messages_data = []
-        for msg in messages:
-            messages_data.append(f"MSG:{msg['id']}|{msg['content']}|{msg['ai_response']}|{msg['timestamp']}")
+        if not messages:
+            return success_response({"messages": [], "next_cursor": None}, "No messages found",
+                                    text="success|no_messages|No messages found")
         
-        result = "\n".join(messages_data)
-        print(f"Found {len(messages)} messages for chat: {chat_id}")
+        logger.debug("messages_listed", chat_id=chat_id, count=len(messages))
         
-        return PlainTextResponse(f"success|{result}|Messages retrieved")
+        return success_response(
+            {"messages": [message_dict(msg) for msg in messages], "next_cursor": next_cursor},
+            "Messages retrieved",
+            text=f"success|{format_messages(messages, next_cursor)}|Messages retrieved"
+        )
         
+    except ValueError:
+        return error_response("invalid_cursor", "Invalid pagination cursor", 400)
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
-        print(f"Get messages error: {str(e)}")
-        return PlainTextResponse(f"error|get_messages_failed|{str(e)}", status_code=500)
+        logger.error("messages_list_failed", chat_id=chat_id, error=str(e))
+        return error_response("get_messages_failed", str(e), 500)
 
 @app.delete("/api/chats/{chat_id}")
 async def delete_chat(chat_id: str, request: Request):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
         user_id = request.query_params.get("user_id")
@@ -876,117 +1018,136 @@ async def delete_chat(chat_id: str, request: Request):
             except:
                 pass
         
-        print(f"DELETE CHAT: {chat_id}, user: {user_id}")
-        
+        soft = soft_delete_enabled(request.query_params.get("mode"))
         if chat_id == "undefined" or not chat_id:
-            return PlainTextResponse("error|invalid_chat_id|Chat ID is required", status_code=400)
+            return error_response("invalid_chat_id", "Chat ID is required", 400)
         
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
                 # Suhbat mavjudligini va egasini tekshirish
-                cur.execute("SELECT user_id FROM conversations WHERE id = %s", (chat_id,))
-                conversation = cur.fetchone()
+                await cur.execute("SELECT user_id FROM conversations WHERE id = %s AND deleted_at IS NULL", (chat_id,))
+                conversation = await cur.fetchone()
                 
                 if not conversation:
-                    return PlainTextResponse("error|chat_not_found|Chat not found", status_code=404)
+                    return error_response("chat_not_found", "Chat not found", 404)
                 
                 if user_id and conversation[0] != str(user_id):
-                    return PlainTextResponse("error|unauthorized|Unauthorized to delete this chat", status_code=403)
-                
-                # Xabarlarni o'chirish
-                cur.execute("DELETE FROM messages WHERE conversation_id = %s", (chat_id,))
+                    return error_response("unauthorized", "Unauthorized to delete this chat", 403)
                 
-                # Suhbatni o'chirish
-                cur.execute("DELETE FROM conversations WHERE id = %s", (chat_id,))
+                if soft:
+                    # Belgilash - xabarlarni purger o'chiradi
+                    await cur.execute("UPDATE conversations SET deleted_at = %s WHERE id = %s", (datetime.utcnow(), chat_id))
+                else:
+                    # Xabarlarni o'chirish (FK bo'lmagan eski bazalar uchun ham)
+                    await cur.execute("DELETE FROM messages WHERE conversation_id = %s", (chat_id,))
+                    
+                    # Suhbatni o'chirish
+                    await cur.execute("DELETE FROM conversations WHERE id = %s", (chat_id,))
                 
-                conn.commit()
+                await adjust_conversation_count(cur, conversation[0], -1)
+                await conn.commit()
+        
+        replica_router.mark_write(user_id, chat_id)
+        if soft:
+            chat_purger.notify()
         
-        print(f"CHAT DELETED: {chat_id}")
-        return PlainTextResponse("success|chat_deleted|Chat deleted successfully")
+        logger.info("chat_deleted", chat_id=chat_id, user_id=user_id, mode="soft" if soft else "hard")
+        return success_response("chat_deleted", "Chat deleted successfully")
         
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
-        print(f"Delete chat error: {str(e)}")
-        return PlainTextResponse(f"error|delete_failed|{str(e)}", status_code=500)
+        logger.error("chat_delete_failed", chat_id=chat_id, error=str(e))
+        return error_response("delete_failed", str(e), 500)
 
 @app.delete("/api/chats/user/{user_id}/all")
-async def delete_all_user_chats(user_id: str):
+async def delete_all_user_chats(user_id: str, mode: str | None = None):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
-        print(f"DELETE ALL CHATS FOR USER: {user_id}")
-        
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # User ning barcha suhbatlarini topish
-                cur.execute("SELECT id FROM conversations WHERE user_id = %s", (user_id,))
-                conversations = cur.fetchall()
-                
-                if not conversations:
-                    return PlainTextResponse("error|no_chats|No chats found to delete", status_code=404)
-                
-                conversation_ids = [conv[0] for conv in conversations]
-                
-                # Xabarlarni o'chirish
-                for conv_id in conversation_ids:
-                    cur.execute("DELETE FROM messages WHERE conversation_id = %s", (conv_id,))
+        soft = soft_delete_enabled(mode)
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                if soft:
+                    # Faqat belgilash - katta akkauntlar uchun ham bir zumda qaytadi
+                    await cur.execute("""
+                        UPDATE conversations SET deleted_at = %s
+                        WHERE user_id = %s AND deleted_at IS NULL
+                    """, (datetime.utcnow(), user_id))
+                elif is_sqlite():
+                    # Xabarlar ON DELETE CASCADE bilan o'chadi
+                    await cur.execute("DELETE FROM conversations WHERE user_id = %s", (user_id,))
+                else:
+                    # Set-based: bitta DELETE ... USING, suhbatlar bo'yicha sikl yo'q
+                    await cur.execute("""
+                        DELETE FROM messages m
+                        USING conversations c
+                        WHERE m.conversation_id = c.id AND c.user_id = %s
+                    """, (user_id,))
+                    await cur.execute("DELETE FROM conversations WHERE user_id = %s", (user_id,))
                 
-                # Suhbatlarni o'chirish
-                cur.execute("DELETE FROM conversations WHERE user_id = %s", (user_id,))
+                deleted = cur.rowcount
+                if not deleted:
+                    return error_response("no_chats", "No chats found to delete", 404)
                 
-                conn.commit()
+                await adjust_conversation_count(cur, user_id, -deleted)
+                await conn.commit()
+        
+        replica_router.mark_write(user_id)
+        if soft:
+            chat_purger.notify()
         
-        print(f"ALL CHATS DELETED FOR USER: {user_id} ({len(conversations)} chats)")
-        return PlainTextResponse(f"success|all_chats_deleted|{len(conversations)} chats deleted successfully")
+        logger.info("all_chats_deleted", user_id=user_id, count=deleted, mode="soft" if soft else "hard")
+        return success_response("all_chats_deleted", f"{deleted} chats deleted successfully")
         
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
-        print(f"Delete all chats error: {str(e)}")
-        return PlainTextResponse(f"error|delete_all_failed|{str(e)}", status_code=500)
+        logger.error("all_chats_delete_failed", user_id=user_id, error=str(e))
+        return error_response("delete_all_failed", str(e), 500)
 
 # Statistics endpoints
 @app.get("/api/stats/user/{user_id}")
 async def get_user_stats_api(user_id: str):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
-        print(f"GET USER STATS: {user_id}")
-        
         if not user_id or len(user_id.strip()) == 0:
-            return PlainTextResponse("error|invalid_user_id|User ID cannot be empty", status_code=422)
+            return error_response("invalid_user_id", "User ID cannot be empty", 422)
         
         user_id = user_id.strip()
         
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # User mavjudligini tekshirish
-                cur.execute("SELECT id FROM users WHERE id = %s", (user_id,))
-                if not cur.fetchone():
-                    return PlainTextResponse("success|no_user_found|User not found, no statistics available")
-                
-                # Statistika
-                cur.execute("""
-                    SELECT * FROM user_stats 
-                    WHERE user_id = %s 
-                    ORDER BY usage_count DESC
-                """, (user_id,))
-                stats = cur.fetchall()
-                
-                # Suhbatlar soni
-                cur.execute("SELECT COUNT(*) FROM conversations WHERE user_id = %s", (user_id,))
-                total_conversations = cur.fetchone()[0]
-        
-        total_messages = sum(stat['usage_count'] for stat in stats) if stats else 0
-        most_used_ai = stats[0]['ai_type'] if stats else "None"
-        
-        if not stats:
-            stats_data = [
-                "TOTAL_MESSAGES:0",
-                "TOTAL_CONVERSATIONS:0",
-                "MOST_USED_AI:None"
+        # User mavjudligini tekshirish (keshdan)
+        if not await get_user_by_id(user_id):
+            return success_response(None, "User not found, no statistics available",
+                                    text="success|no_user_found|User not found, no statistics available")
+        
+        async with get_read_connection(user_id) as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                # Yig'ma qator (primary key) va yordamchilar kesimi - bitta so'rov
+                await cur.execute(USER_SUMMARY_READ_SQL, (user_id,))
+                rows = await cur.fetchall()
+        
+        summary = rows[0] if rows else None
+        stats = [row for row in rows if row['ai_type'] is not None]
+        total_messages = summary['total_messages'] if summary else 0
+        total_conversations = summary['total_conversations'] if summary else 0
+        most_used_ai = (summary['favorite_ai_type'] if summary else None) or "None"
+        data = {
+            "total_messages": total_messages,
+            "total_conversations": total_conversations,
+            "most_used_ai": most_used_ai,
+            "ai_stats": [
+                {"ai_type": stat['ai_type'], "usage_count": stat['usage_count'], "last_used": stat['last_used']}
+                for stat in stats
             ]
-            result = "\n".join(stats_data)
-            return PlainTextResponse(f"success|{result}|No statistics available yet")
+        }
+        
+        if not summary:
+            result = "TOTAL_MESSAGES:0\nTOTAL_CONVERSATIONS:0\nMOST_USED_AI:None"
+            return success_response(data, "No statistics available yet", text=f"success|{result}|No statistics available yet")
         
         stats_data = [
             f"TOTAL_MESSAGES:{total_messages}",
@@ -998,50 +1159,113 @@ async def get_user_stats_api(user_id: str):
             stats_data.append(f"AI_STAT:{stat['ai_type']}|{stat['usage_count']}|{stat['last_used']}")
         
         result = "\n".join(stats_data)
-        print(f"Stats retrieved for user {user_id}: {total_messages} messages, {total_conversations} chats")
-        
-        return PlainTextResponse(f"success|{result}|Stats retrieved")
+        return success_response(data, "Stats retrieved", text=f"success|{result}|Stats retrieved")
         
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
-        print(f"Get stats error: {str(e)}")
-        return PlainTextResponse(f"error|stats_failed|{str(e)}", status_code=500)
+        logger.error("stats_failed", user_id=user_id, error=str(e))
+        return error_response("stats_failed", str(e), 500)
 
 @app.get("/api/stats/chart/user/{user_id}")
 async def get_user_chart_stats_api(user_id: str):
     if not db_initialized:
-        return PlainTextResponse("error|database_unavailable|Database not available", status_code=503)
+        return error_response("database_unavailable", "Database not available", 503)
     
     try:
-        print(f"GET USER CHART STATS: {user_id}")
-        
         if not user_id or len(user_id.strip()) == 0:
-            return PlainTextResponse("error|invalid_user_id|User ID cannot be empty", status_code=422)
+            return error_response("invalid_user_id", "User ID cannot be empty", 422)
         
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+        async with get_read_connection(user_id) as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute("""
                     SELECT * FROM user_stats 
                     WHERE user_id = %s 
                     ORDER BY usage_count DESC 
                     LIMIT 10
                 """, (user_id.strip(),))
                 
-                stats = cur.fetchall()
-        
-        if not stats:
-            chart_data = "LABELS:\nDATA:"
-            return PlainTextResponse(f"success|{chart_data}|No chart data available")
+                stats = await cur.fetchall()
         
         labels = [stat['ai_type'] for stat in stats]
         data = [stat['usage_count'] for stat in stats]
         
         chart_data = f"LABELS:{','.join(labels)}\nDATA:{','.join(map(str, data))}"
+        message = "Chart data retrieved" if stats else "No chart data available"
         
-        return PlainTextResponse(f"success|{chart_data}|Chart data retrieved")
+        return success_response({"labels": labels, "data": data}, message, text=f"success|{chart_data}|{message}")
         
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
-        print(f"Get chart stats error: {str(e)}")
-        return PlainTextResponse(f"error|chart_failed|{str(e)}", status_code=500)
+        logger.error("chart_stats_failed", user_id=user_id, error=str(e))
+        return error_response("chart_failed", str(e), 500)
+
+# Search
+@app.get("/api/search")
+async def search_chats_api(user_id: str, q: str, ai_type: str | None = None, limit: int | None = None, cursor: str | None = None):
+    if not db_initialized:
+        return error_response("database_unavailable", "Database not available", 503)
+    
+    try:
+        user_id = user_id.strip()
+        query = clean_query(q)
+        if not user_id:
+            return error_response("invalid_user_id", "User ID cannot be empty", 422)
+        if not query:
+            return error_response("missing_query", "Search query is required", 400)
+        
+        try:
+            offset = decode_offset_cursor(cursor) if cursor else 0
+        except ValueError:
+            return error_response("invalid_cursor", "Invalid pagination cursor", 400)
+        if offset > SEARCH_MAX_OFFSET:
+            return error_response("invalid_cursor", "Search results limit reached", 400)
+        
+        size = page_size(limit)
+        async with get_read_connection(user_id) as conn:
+            results = await search_messages(conn, user_id, query, ai_type, size + 1, offset)
+        
+        if not results:
+            return success_response({"results": [], "next_cursor": None}, "No results found",
+                                    text="success|no_results|No results found")
+        
+        has_more = len(results) > size
+        results = results[:size]
+        
+        next_cursor = encode_offset_cursor(offset + size) if has_more else None
+        
+        lines = []
+        items = []
+        for row in results:
+            snippet = " ".join((row['snippet'] or "").split())
+            lines.append(
+                f"RESULT:{row['conversation_id']}|{row['message_id'] or ''}|{row['ai_type']}|{row['title']}|"
+                f"{row['rank']:.4f}|{row['timestamp']}|{snippet}"
+            )
+            items.append({
+                "conversation_id": row['conversation_id'],
+                "message_id": row['message_id'],
+                "ai_type": row['ai_type'],
+                "title": row['title'],
+                "rank": round(float(row['rank']), 4),
+                "timestamp": row['timestamp'],
+                "snippet": snippet
+            })
+        if next_cursor:
+            lines.append(f"NEXT_CURSOR:{next_cursor}")
+        
+        result = "\n".join(lines)
+        logger.debug("search", user_id=user_id, results=len(results), offset=offset)
+        
+        return success_response({"results": items, "next_cursor": next_cursor}, "Search results retrieved",
+                                text=f"success|{result}|Search results retrieved")
+        
+    except DatabaseBusyError:
+        return db_busy_response()
+    except Exception as e:
+        logger.error("search_failed", user_id=user_id, error=str(e))
+        return error_response("search_failed", str(e), 500)
 
 # Legacy endpoints
 @app.get("/conversations")
@@ -1052,140 +1276,143 @@ async def get_conversations_legacy(user_id: str):
 async def api_get_conversations_legacy(user_id: str):
     return await get_user_chats(user_id)
 
-# OPTIONS handlers for CORS
-@app.options("/api/chats")
-async def options_chats():
-    return PlainTextResponse("", status_code=200)
-
-@app.options("/api/chats/{chat_id}")
-async def options_chat():
-    return PlainTextResponse("", status_code=200)
-
-@app.options("/api/chats/user/{user_id}/all")
-async def options_all_chats():
-    return PlainTextResponse("", status_code=200)
-
-@app.options("/api/chats/{chat_id}/messages")
-async def options_chat_messages():
-    return PlainTextResponse("", status_code=200)
-
-@app.options("/api/stats/user/{user_id}")
-async def options_user_stats():
-    return PlainTextResponse("", status_code=200)
-
-@app.options("/api/stats/chart/user/{user_id}")
-async def options_chart_stats():
-    return PlainTextResponse("", status_code=200)
-
-@app.options("/auth/google")
-async def options_google_auth():
-    return PlainTextResponse("", status_code=200)
-
-@app.options("/api/auth/google")
-async def options_api_google_auth():
-    return PlainTextResponse("", status_code=200)
-
-# Dynamic OPTIONS handlers for chat endpoints
-for ai_type in chat_endpoints:
-    def create_options_handler():
-        async def handler():
-            return PlainTextResponse("", status_code=200)
-        return handler
-    
-    options_handler = create_options_handler()
-    app.add_api_route(f"/chat/{ai_type}", options_handler, methods=["OPTIONS"])
-    app.add_api_route(f"/api/chat/{ai_type}", options_handler, methods=["OPTIONS"])
-
-@app.options("/api/ai/{ai_id}")
-async def options_ai_by_id():
-    return PlainTextResponse("", status_code=200)
-
 # Error handlers
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
-    return PlainTextResponse("error|not_found|Endpoint not found", status_code=404)
+    return error_response("not_found", "Endpoint not found", 404)
 
 @app.exception_handler(500)
 async def internal_error_handler(request: Request, exc):
     logger.error("Internal server error", error=str(exc))
-    return PlainTextResponse("error|server_error|Internal server error", status_code=500)
+    return error_response("server_error", "Internal server error", 500)
 
 @app.exception_handler(422)
 async def validation_error_handler(request: Request, exc):
     logger.error("Validation error", error=str(exc))
-    return PlainTextResponse("error|validation_error|Request validation failed", status_code=422)
+    return error_response("validation_error", "Request validation failed", 422)
 
 # Health check with database
 @app.get("/api/health/db")
 async def health_check_db():
     if not db_initialized:
-        return PlainTextResponse("error|db_unavailable|Database not available", status_code=503)
+        return error_response("db_unavailable", "Database not available", 503)
     
     try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1")
-                cur.fetchone()
-        return PlainTextResponse("success|healthy|Database connection OK")
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT 1")
+                await cur.fetchone()
+        return success_response("healthy", "Database connection OK")
+    except DatabaseBusyError:
+        return db_busy_response()
     except Exception as e:
         logger.error("Database health check failed", error=str(e))
-        return PlainTextResponse(f"error|db_error|Database connection failed: {str(e)}", status_code=500)
+        return error_response("db_error", f"Database connection failed: {str(e)}", 500)
+
+# Readiness: worker startup tugamaguncha (yoki to'xtayotganda) 503
+@app.get("/api/health/ready")
+async def readiness_check():
+    checks = {
+        "startup": worker_lifecycle.ready,
+        "database": db_initialized,
+        "assistants": len(AI_ASSISTANTS) == len(ai_modules)
+    }
+    result = ",".join(f"{name}:{'ok' if ok else 'fail'}" for name, ok in checks.items())
+    if not all(checks.values()):
+        return error_response("not_ready", f"Worker not ready ({result})", 503, headers={"Retry-After": "1"})
+    return success_response(checks, "Worker ready", text=f"success|{result}|Worker ready")
 
 # AI modules status
 @app.get("/api/ai/status")
 async def ai_modules_status():
     try:
         status_data = []
+        statuses = {}
         for ai_type, ai_instance in AI_ASSISTANTS.items():
             is_dummy = isinstance(ai_instance, DummyAI)
             status = "dummy" if is_dummy else "active"
             status_data.append(f"{ai_type}:{status}")
+            statuses[ai_type] = status
         
         result = "\n".join(status_data)
         active_count = len([ai for ai in AI_ASSISTANTS.values() if not isinstance(ai, DummyAI)])
         dummy_count = len([ai for ai in AI_ASSISTANTS.values() if isinstance(ai, DummyAI)])
         
         summary = f"SUMMARY:active={active_count},dummy={dummy_count},total={len(AI_ASSISTANTS)}"
+        data = {
+            "assistants": statuses,
+            "summary": {"active": active_count, "dummy": dummy_count, "total": len(AI_ASSISTANTS)}
+        }
+        
+        return success_response(data, "AI modules status retrieved",
+                                text=f"success|{result}\n{summary}|AI modules status retrieved")
         
-        return PlainTextResponse(f"success|{result}\n{summary}|AI modules status retrieved")
+    except Exception as e:
+        logger.error("ai_status_failed", error=str(e))
+        return error_response("status_failed", str(e), 500)
+
+def format_metrics(prefix: str, values: dict) -> list:
+    """Metrikalarni KEY:value qatorlariga aylantirish"""
+    return [f"{prefix}_{key.upper()}:{value}" for key, value in values.items()]
+
+# Metrics
+@app.get("/api/metrics")
+async def metrics_api():
+    try:
+        metrics_data = format_metrics("STARTUP", worker_lifecycle.stats())
+        metrics_data += format_metrics("DB_POOL", pool_stats())
+        metrics_data += format_metrics("RESPONSE_CACHE", response_cache.stats())
+        metrics_data += format_metrics("SINGLE_FLIGHT", single_flight.stats())
+        metrics_data += format_metrics("USER_CACHE", user_cache.stats())
+        metrics_data += format_metrics("FUZZY_CACHE", fuzzy_cache.stats())
+        metrics_data += format_metrics("WS_CHAT", chat_sessions.stats())
+        metrics_data += format_metrics("WRITE_BEHIND", message_writer.stats())
+        metrics_data += format_metrics("USER_STATS_AGGREGATOR", stats_aggregator.stats())
+        metrics_data += format_metrics("CHAT_PURGER", chat_purger.stats())
+        metrics_data += format_metrics("REPLICA", replica_router.stats())
+        metrics_data += format_metrics("PARTITIONS", partition_maintainer.stats())
+        metrics_data += format_metrics("MESSAGE_ARCHIVE", archive_index.stats())
+        
+        result = "\n".join(metrics_data)
+        return success_response(result, "Metrics retrieved")
         
     except Exception as e:
-        print(f"AI status error: {str(e)}")
-        return PlainTextResponse(f"error|status_failed|{str(e)}", status_code=500)
+        logger.error("metrics_failed", error=str(e))
+        return error_response("metrics_failed", str(e), 500)
 
 # Development endpoints
 if os.getenv("DEBUG", "False").lower() == "true":
     @app.get("/api/debug/tables")
     async def debug_tables():
         if not db_initialized:
-            return PlainTextResponse("error|db_unavailable|Database not available", status_code=503)
+            return error_response("db_unavailable", "Database not available", 503)
         
         try:
             tables_info = []
             
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT COUNT(*) FROM users")
-                    users_count = cur.fetchone()[0]
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT COUNT(*) FROM users")
+                    users_count = (await cur.fetchone())[0]
                     tables_info.append(f"users:{users_count}")
                     
-                    cur.execute("SELECT COUNT(*) FROM conversations")
-                    conversations_count = cur.fetchone()[0]
+                    await cur.execute("SELECT COUNT(*) FROM conversations")
+                    conversations_count = (await cur.fetchone())[0]
                     tables_info.append(f"conversations:{conversations_count}")
                     
-                    cur.execute("SELECT COUNT(*) FROM messages")
-                    messages_count = cur.fetchone()[0]
+                    await cur.execute("SELECT COUNT(*) FROM messages")
+                    messages_count = (await cur.fetchone())[0]
                     tables_info.append(f"messages:{messages_count}")
                     
-                    cur.execute("SELECT COUNT(*) FROM user_stats")
-                    stats_count = cur.fetchone()[0]
+                    await cur.execute("SELECT COUNT(*) FROM user_stats")
+                    stats_count = (await cur.fetchone())[0]
                     tables_info.append(f"user_stats:{stats_count}")
             
             result = "\n".join(tables_info)
-            return PlainTextResponse(f"success|{result}|Tables info retrieved")
+            return success_response(result, "Tables info retrieved")
             
         except Exception as e:
-            return PlainTextResponse(f"error|debug_failed|{str(e)}", status_code=500)
+            return error_response("debug_failed", str(e), 500)
 
     @app.get("/api/debug/env")
     async def debug_env():
@@ -1209,56 +1436,71 @@ if os.getenv("DEBUG", "False").lower() == "true":
                     env_info.append(f"{var}:{value}")
             
             result = "\n".join(env_info)
-            return PlainTextResponse(f"success|{result}|Environment info retrieved")
+            return success_response(result, "Environment info retrieved")
             
         except Exception as e:
-            return PlainTextResponse(f"error|debug_failed|{str(e)}", status_code=500)
-
-# Logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = datetime.utcnow()
-    client_ip = request.client.host if request.client else "unknown"
-    
-    try:
-        response = await call_next(request)
-    except Exception as e:
-        print(f"❌ MIDDLEWARE ERROR: {request.method} {request.url.path} - {str(e)} - IP: {client_ip}")
-        return PlainTextResponse("error|server_error|Internal server error", status_code=500)
-    
-    process_time = (datetime.utcnow() - start_time).total_seconds()
-    
-    if response.status_code == 422:
-        print(f"⚠️ VALIDATION ERROR: {request.method} {request.url.path} - 422 - {process_time:.3f}s - IP: {client_ip}")
-        print(f"   Query params: {dict(request.query_params)}")
-        print(f"   Path params: {dict(request.path_params)}")
-    elif response.status_code >= 400:
-        print(f"❌ ERROR: {request.method} {request.url.path} - {response.status_code} - {process_time:.3f}s - IP: {client_ip}")
-    elif any(path in str(request.url.path) for path in ["/api/", "/chat/", "/auth/"]):
-        print(f"✅ {request.method} {request.url.path} - {response.status_code} - {process_time:.3f}s - IP: {client_ip}")
-    
-    return response
-
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    print("🚀 AI Universe Server starting...")
-    print(f"📊 Database initialized: {'Yes' if db_initialized else 'No'}")
-    print(f"📊 Total AI assistants loaded: {len(AI_ASSISTANTS)}")
+            return error_response("debug_failed", str(e), 500)
+
+# Worker startup (lifespan) - har bir worker da fork dan keyin
+async def startup_worker():
+    global db_initialized
+    print(f"🚀 AI Universe worker starting (pid={os.getpid()})...")
+
+    with worker_lifecycle.phase("assistants"):
+        load_ai_assistants()
+        client = get_openai_client()
+    print(f"🤖 OpenAI client: {'✅ Ready' if client else '❌ OPENAI_API_KEY not found'}")
+
+    async def open_database():
+        with worker_lifecycle.phase("database"):
+            return await init_database()
+
+    async def load_encodings():
+        with worker_lifecycle.phase("encodings"):
+            models = {assistant.model for assistant in AI_ASSISTANTS.values()}
+            return await asyncio.to_thread(warm_encodings, models)
+
+    # Pool warm-up (min_size ulanish) va tokenizer yuklash bir vaqtda
+    db_initialized, _ = await asyncio.gather(open_database(), load_encodings())
+
+    if db_initialized:
+        # DDL yo'q: PostgreSQL sxemasi 'alembic upgrade head' bilan deploy da yangilanadi
+        with worker_lifecycle.phase("schema"):
+            worker_lifecycle.schema_version = await ensure_schema()
+        with worker_lifecycle.phase("background"):
+            await partition_maintainer.start()
+            await stats_aggregator.start()
+            await message_writer.start()
+            await chat_purger.start()
+            await replica_router.start()
+
+    worker_lifecycle.mark_ready()
     active_ais = [name for name, ai in AI_ASSISTANTS.items() if not isinstance(ai, DummyAI)]
-    dummy_ais = [name for name, ai in AI_ASSISTANTS.items() if isinstance(ai, DummyAI)]
-    print(f"✅ Active AI modules: {len(active_ais)}")
-    print(f"⚠️ Dummy AI modules: {len(dummy_ais)}")
+    print(f"📊 Database initialized: {'Yes' if db_initialized else 'No'}")
+    print(f"✅ AI modules: {len(active_ais)} active, {len(AI_ASSISTANTS) - len(active_ais)} dummy")
+    logger.info("worker_ready", **worker_lifecycle.stats())
     print("🌐 Server ready to serve requests!")
 
-# Shutdown event  
-@app.on_event("shutdown")
-async def shutdown_event():
+# Worker shutdown
+async def shutdown_worker():
     print("🛑 AI Universe Server shutting down...")
-    if db_pool:
-        db_pool.closeall()
+    worker_lifecycle.mark_stopping()
+    if db_initialized:
+        # Navbatdagi xabarlar pool yopilishidan oldin yoziladi
+        await message_writer.stop()
+        await stats_aggregator.stop()
+        await chat_purger.stop()
+        await replica_router.stop()
+        await partition_maintainer.stop()
+        await close_database()
         print("📊 Database connections closed")
+    await close_openai_client()
+    print("🤖 OpenAI connections closed")
     print("👋 Goodbye!")
+    stop_logging()
+
+# --preload da master da bir marta, aks holda har bir worker da
+worker_lifecycle.mark_imported()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1278,5 +1520,6 @@ if __name__ == "__main__":
         port=port, 
         log_level=log_level, 
         reload=debug,
-        access_log=True
+        # So'rovlar RequestLogMiddleware da (JSON, sampling bilan) loglanadi
+        access_log=False
     )
\ No newline at end of file
@@ -1,2 +1,104 @@
-from main import engine
-connectable = engine
\ No newline at end of file
+"""
+AI Universe - Alembic muhiti
+
+Ulanish DATABASE_URL dan olinadi (psycopg 3 drayveri). Har bir migratsiya
+alohida tranzaksiyada ishlaydi, CONCURRENTLY index lar esa
+op.get_context().autocommit_block() ichida tranzaksiyasiz bajariladi.
+
+Timeoutlar (PostgreSQL formatida, masalan "5s", "10min", "0" - cheksiz):
+    MIGRATION_LOCK_TIMEOUT       - lock kutish (standart 5s)
+    MIGRATION_STATEMENT_TIMEOUT  - bitta statement (standart 0)
+"""
+
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+from sqlalchemy.exc import DBAPIError
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = None
+
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+MIGRATION_STATEMENT_TIMEOUT = os.getenv("MIGRATION_STATEMENT_TIMEOUT", "0")
+
+# lock_timeout / statement_timeout / query_canceled SQLSTATE lari
+TIMEOUT_SQLSTATES = {"55P03": "lock_timeout", "57014": "statement_timeout"}
+
+
+def get_url() -> str:
+    """DATABASE_URL ni SQLAlchemy + psycopg 3 formatiga keltirish"""
+    url = os.getenv("DATABASE_URL") or config.get_main_option("sqlalchemy.url")
+    if not url:
+        sys.exit("❌ DATABASE_URL topilmadi")
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+def run_migrations_offline() -> None:
+    """SQL skriptni chiqarish (alembic upgrade head --sql)"""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = create_engine(
+        get_url(),
+        poolclass=pool.NullPool,
+        connect_args={
+            "sslmode": os.getenv("DATABASE_SSLMODE", "require"),
+            "options": f"-c lock_timeout={MIGRATION_LOCK_TIMEOUT} -c statement_timeout={MIGRATION_STATEMENT_TIMEOUT}",
+        },
+    )
+
+    print(f"🔧 Migration timeouts: lock_timeout={MIGRATION_LOCK_TIMEOUT} statement_timeout={MIGRATION_STATEMENT_TIMEOUT}")
+
+    try:
+        with connectable.connect() as connection:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                transaction_per_migration=True,
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
+    except DBAPIError as e:
+        sqlstate = getattr(e.orig, "sqlstate", None)
+        if sqlstate in TIMEOUT_SQLSTATES:
+            print(
+                f"❌ Migration {TIMEOUT_SQLSTATES[sqlstate]} ({sqlstate}): {e.orig}\n"
+                f"   Jadval band bo'lishi mumkin - keyinroq qayta urinib ko'ring yoki "
+                f"MIGRATION_LOCK_TIMEOUT / MIGRATION_STATEMENT_TIMEOUT ni oshiring"
+            )
+        raise
+    finally:
+        connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
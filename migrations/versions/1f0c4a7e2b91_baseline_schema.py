@@ -0,0 +1,73 @@
+"""baseline: create_tables() dagi boshlang'ich sxema
+
+Revision ID: 1f0c4a7e2b91
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f0c4a7e2b91'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Mavjud bazalarda jadvallar create_tables() orqali yaratilgan - IF NOT EXISTS
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id VARCHAR(255) PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            name VARCHAR(255),
+            picture VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id VARCHAR(255) PRIMARY KEY,
+            user_id VARCHAR(255),
+            ai_type VARCHAR(100),
+            title VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id VARCHAR(255) PRIMARY KEY,
+            conversation_id VARCHAR(255),
+            user_id VARCHAR(255),
+            content TEXT,
+            ai_response TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            id VARCHAR(255) PRIMARY KEY,
+            user_id VARCHAR(255),
+            ai_type VARCHAR(100),
+            usage_count INTEGER DEFAULT 0,
+            last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    op.create_index('idx_users_email', 'users', ['email'], if_not_exists=True)
+    op.create_index('idx_conversations_user_id', 'conversations', ['user_id'], if_not_exists=True)
+    op.create_index('idx_messages_conversation_id', 'messages', ['conversation_id'], if_not_exists=True)
+    op.create_index('idx_user_stats_user_id', 'user_stats', ['user_id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_stats')
+    op.drop_table('messages')
+    op.drop_table('conversations')
+    op.drop_table('users')
@@ -0,0 +1,53 @@
+"""user_stats: dublikatlarni birlashtirish va (user_id, ai_type) unique index
+
+Revision ID: 5b2f9c1d7e40
+Revises: 836da7cdf53e
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2f9c1d7e40'
+down_revision: Union[str, Sequence[str], None] = '836da7cdf53e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Dedupe va index orasida yangi dublikat paydo bo'lmasligi uchun
+    op.execute("LOCK TABLE user_stats IN SHARE ROW EXCLUSIVE MODE")
+
+    # Har bir (user_id, ai_type) uchun bitta qator: usage_count yig'indisi, eng so'nggi last_used
+    op.execute("""
+        WITH ranked AS (
+            SELECT id,
+                   SUM(usage_count) OVER (PARTITION BY user_id, ai_type) AS total_count,
+                   MAX(last_used) OVER (PARTITION BY user_id, ai_type) AS max_last_used,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY user_id, ai_type
+                       ORDER BY last_used DESC NULLS LAST, id
+                   ) AS rn
+            FROM user_stats
+        ),
+        merged AS (
+            UPDATE user_stats s
+            SET usage_count = r.total_count, last_used = r.max_last_used
+            FROM ranked r
+            WHERE s.id = r.id AND r.rn = 1
+        )
+        DELETE FROM user_stats s
+        USING ranked r
+        WHERE s.id = r.id AND r.rn > 1
+    """)
+
+    op.create_index('uq_user_stats_user_ai', 'user_stats', ['user_id', 'ai_type'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_user_stats_user_ai', table_name='user_stats')
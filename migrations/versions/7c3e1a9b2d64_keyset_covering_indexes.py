@@ -0,0 +1,57 @@
+"""suhbatlar ro'yxati va xabarlar tarixi uchun covering index lar (CONCURRENTLY)
+
+Revision ID: 7c3e1a9b2d64
+Revises: 5b2f9c1d7e40
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e1a9b2d64'
+down_revision: Union[str, Sequence[str], None] = '5b2f9c1d7e40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    # /api/chats/user/{user_id}: WHERE user_id ORDER BY updated_at DESC, id DESC
+    ('idx_conversations_user_updated', 'conversations',
+     ['user_id', sa.text('updated_at DESC'), sa.text('id DESC')]),
+    # /api/chats/{chat_id}, tarix: WHERE conversation_id ORDER BY timestamp, id
+    ('idx_messages_conversation_timestamp', 'messages',
+     ['conversation_id', 'timestamp', 'id']),
+]
+
+
+def drop_invalid_index(name: str) -> None:
+    """Oldingi muvaffaqiyatsiz CONCURRENTLY urinishidan qolgan INVALID index ni o'chirish"""
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(sa.text("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND NOT i.indisvalid
+    """), {"name": name}).scalar()
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY tranzaksiya ichida ishlamaydi
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            drop_invalid_index(name)
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, postgresql_concurrently=True, if_exists=True)
@@ -1,8 +1,28 @@
+"""add last_login column to users
+
+Revision ID: 836da7cdf53e
+Revises: 1f0c4a7e2b91
+Create Date: 2026-10-18 12:05:00.000000
+
+"""
+from typing import Sequence, Union
+
 from alembic import op
-import sqlalchemy as sa
 
-def upgrade():
-    op.add_column('users', sa.Column('last_login', sa.DateTime, default=sa.func.now()))
 
-def downgrade():
-    op.drop_column('users', 'last_login')
\ No newline at end of file
+# revision identifiers, used by Alembic.
+revision: str = '836da7cdf53e'
+down_revision: Union[str, Sequence[str], None] = '1f0c4a7e2b91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Ustun qo'lda qo'shilgan bazalarda ham xatosiz o'tadi
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_login TIMESTAMP DEFAULT now()")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'last_login')
@@ -0,0 +1,132 @@
+"""messages -> conversations FK (ON DELETE CASCADE) va conversations.deleted_at
+
+Revision ID: 9d4b6f2a8c13
+Revises: 7c3e1a9b2d64
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b6f2a8c13'
+down_revision: Union[str, Sequence[str], None] = '7c3e1a9b2d64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+
+# Suhbat qatori yo'q xabarlar uchun o'rinbosar suhbat yaratiladi (xabarlar o'chirilmaydi).
+# Eski kod mijoz yuborgan istalgan conversation_id ga yozardi, shuning uchun bitta id da bir
+# nechta foydalanuvchi bo'lishi mumkin: id birinchi yozgan foydalanuvchiga qoladi, boshqalarning
+# xabarlari o'zlarining alohida "restored-..." suhbatiga ko'chiriladi. Hammasi bitta statement -
+# FK tekshiruvi statement oxirida, o'rinbosarlar allaqachon mavjud bo'ladi
+RESTORE_ORPHANS_SQL = """
+    WITH orphan_ids AS (
+        SELECT DISTINCT m.conversation_id FROM messages m
+        WHERE m.conversation_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM conversations c WHERE c.id = m.conversation_id)
+        LIMIT {limit}
+    ),
+    senders AS (
+        SELECT m.conversation_id, m.user_id, MIN(m.timestamp) AS first_at, MAX(m.timestamp) AS last_at,
+               LEFT((array_agg(m.content ORDER BY m.timestamp))[1], 50) AS title
+        FROM messages m JOIN orphan_ids o ON o.conversation_id = m.conversation_id
+        GROUP BY m.conversation_id, m.user_id
+    ),
+    ranked AS (
+        SELECT senders.*,
+               CASE WHEN row_number() OVER (PARTITION BY conversation_id ORDER BY first_at, user_id) = 1
+                    THEN conversation_id
+                    ELSE 'restored-' || md5(conversation_id || ':' || COALESCE(user_id, ''))
+               END AS target_id
+        FROM senders
+    ),
+    placeholders AS (
+        INSERT INTO conversations (id, user_id, ai_type, title, created_at, updated_at)
+        SELECT target_id, user_id, 'chat', COALESCE(title, 'Restored chat'), first_at, last_at
+        FROM ranked
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    ),
+    moved AS (
+        UPDATE messages m SET conversation_id = r.target_id
+        FROM ranked r
+        WHERE r.target_id <> r.conversation_id
+          AND m.conversation_id = r.conversation_id
+          AND m.user_id IS NOT DISTINCT FROM r.user_id
+        RETURNING m.id
+    )
+    SELECT (SELECT COUNT(*) FROM orphan_ids), (SELECT COUNT(*) FROM placeholders), (SELECT COUNT(*) FROM moved)
+"""
+
+
+def restore_orphan_conversations() -> None:
+    """Yetim xabarlar uchun o'rinbosar suhbatlar (MIGRATION_BATCH_SIZE lik paketlarda)"""
+    if context.is_offline_mode():
+        # --sql rejimida natija yo'q - bitta statement
+        op.execute(RESTORE_ORPHANS_SQL.format(limit="ALL"))
+        return
+
+    bind = op.get_bind()
+    restored = moved = 0
+    while True:
+        orphans, created, relocated = bind.execute(
+            sa.text(RESTORE_ORPHANS_SQL.format(limit=MIGRATION_BATCH_SIZE))
+        ).one()
+        restored += created
+        moved += relocated
+        if orphans < MIGRATION_BATCH_SIZE:
+            break
+    if restored:
+        print(f"🧩 {restored} ta o'rinbosar suhbat yaratildi ({moved} ta xabar egasining suhbatiga ko'chirildi)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Soft delete belgisi (NULL default - jadval qayta yozilmaydi)
+    op.execute("ALTER TABLE conversations ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP")
+
+    # NOT VALID: yangi qatorlar darhol tekshiriladi, eski qatorlar uchun to'liq scan yo'q.
+    # SHARE ROW EXCLUSIVE lock faqat shu qisqa tranzaksiya davomida (autocommit_block
+    # oldidan commit qilinadi); qayta ishga tushirilganda constraint mavjud bo'lishi mumkin
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_messages_conversation') THEN
+                ALTER TABLE messages
+                ADD CONSTRAINT fk_messages_conversation
+                FOREIGN KEY (conversation_id) REFERENCES conversations(id)
+                ON DELETE CASCADE NOT VALID;
+            END IF;
+        END $$
+    """)
+
+    # Suhbat qatori yo'q xabarlar (oldingi o'chirishlar va mijoz bergan id lar) -
+    # har bir paket alohida commit bo'ladi, qator lock lari qisqa vaqt ushlanadi
+    with op.get_context().autocommit_block():
+        restore_orphan_conversations()
+
+    # VALIDATE faqat SHARE UPDATE EXCLUSIVE lock oladi - yozish bloklanmaydi
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE messages VALIDATE CONSTRAINT fk_messages_conversation")
+
+    # Purger faqat belgilangan suhbatlarni ko'radi
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_conversations_deleted_at', 'conversations', ['deleted_at'],
+            postgresql_where=sa.text('deleted_at IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('idx_conversations_deleted_at', postgresql_concurrently=True, if_exists=True)
+    op.drop_constraint('fk_messages_conversation', 'messages', type_='foreignkey')
+    op.drop_column('conversations', 'deleted_at')
@@ -0,0 +1,174 @@
+"""messages: timestamp bo'yicha oylik range partitioning va archived_partitions
+
+Revision ID: b2e8d5a1c7f3
+Revises: 9d4b6f2a8c13
+Create Date: 2026-10-18 14:00:00.000000
+
+Mavjud jadval qayta yozilmaydi: u messages_legacy nomi bilan birinchi
+partition sifatida ulanadi. CHECK constraint va unique index oldindan
+(tranzaksiyasiz) tayyorlanadi, shuning uchun ATTACH scan qilmaydi.
+
+messages_legacy migratsiya paytidagi nuqtagacha (cutover) yopiladi: undan
+keyingi yozuvlar joriy oyning qisman partitioniga [cutover, keyingi oy)
+tushadi. Legacy yangi yozuv olmaydi va butunlay MESSAGE_ARCHIVE_AFTER_MONTHS
+dan eski bo'lganda `python -m db.partitions archive` uni o'zi arxivlaydi.
+CHECK qo'shilgandan ATTACH gacha kelgan yozuvlar legacy ga sig'ishi uchun
+cutover MIGRATION_LEGACY_MARGIN (standart "1 hour") oldinda olinadi.
+"""
+import os
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2e8d5a1c7f3'
+down_revision: Union[str, Sequence[str], None] = '9d4b6f2a8c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Migratsiya paytida oldindan yaratiladigan oylar soni
+PARTITIONS_AHEAD = 3
+
+# VALIDATE davomida kelgan yozuvlar ham legacy CHECK idan o'tishi uchun zaxira
+MIGRATION_LEGACY_MARGIN = os.getenv("MIGRATION_LEGACY_MARGIN", "1 hour")
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1, day=1,
+                         hour=0, minute=0, second=0, microsecond=0)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().as_sql:
+        raise RuntimeError("Bu migratsiya --sql (offline) rejimini qo'llab-quvvatlamaydi")
+
+    bind = op.get_bind()
+
+    with op.get_context().autocommit_block():
+        # Partition kaliti NOT NULL bo'lishi kerak
+        op.execute("""
+            UPDATE messages m SET timestamp = COALESCE(c.created_at, now() AT TIME ZONE 'UTC')
+            FROM conversations c
+            WHERE m.timestamp IS NULL AND c.id = m.conversation_id
+        """)
+        op.execute("UPDATE messages SET timestamp = now() AT TIME ZONE 'UTC' WHERE timestamp IS NULL")
+
+        # Partitioned jadvalning (id, timestamp) primary key i uchun mos index
+        op.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS messages_legacy_id_timestamp_key
+            ON messages (id, timestamp)
+        """)
+
+        # Legacy partition chegarasi: hozir + zaxira (ilova vaqtlari UTC da yoziladi)
+        legacy_end = bind.execute(sa.text(f"""
+            SELECT GREATEST(
+                date_trunc('minute', now() AT TIME ZONE 'UTC') + interval '{MIGRATION_LEGACY_MARGIN}',
+                COALESCE((SELECT MAX(timestamp) FROM messages), now() AT TIME ZONE 'UTC') + interval '1 second'
+            )
+        """)).scalar()
+
+        # NOT VALID + VALIDATE: yozishlar bloklanmaydi, keyin ATTACH va SET NOT NULL scan qilmaydi
+        op.execute(f"""
+            ALTER TABLE messages ADD CONSTRAINT messages_legacy_range
+            CHECK (timestamp IS NOT NULL AND timestamp < '{legacy_end.isoformat()}') NOT VALID
+        """)
+        op.execute("ALTER TABLE messages VALIDATE CONSTRAINT messages_legacy_range")
+
+        if bind.execute(sa.text("SELECT now() AT TIME ZONE 'UTC'")).scalar() >= legacy_end:
+            # Cutover o'tib ketdi - yangi yozuvlar CHECK dan o'tmaydi, darhol olib tashlaymiz
+            op.execute("ALTER TABLE messages DROP CONSTRAINT messages_legacy_range")
+            raise RuntimeError(
+                f"VALIDATE MIGRATION_LEGACY_MARGIN ({MIGRATION_LEGACY_MARGIN}) dan uzoq davom etdi - "
+                "kattaroq qiymat bilan qayta ishga tushiring"
+            )
+
+    op.execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE messages RENAME TO messages_legacy")
+    op.execute("ALTER TABLE messages_legacy ALTER COLUMN timestamp SET NOT NULL")
+    op.execute("""
+        ALTER TABLE messages_legacy ADD CONSTRAINT messages_legacy_id_timestamp_key
+        UNIQUE USING INDEX messages_legacy_id_timestamp_key
+    """)
+    op.execute("ALTER INDEX IF EXISTS idx_messages_conversation_timestamp RENAME TO messages_legacy_conversation_timestamp")
+    op.execute("ALTER INDEX IF EXISTS idx_messages_conversation_id RENAME TO messages_legacy_conversation_id")
+    op.execute("ALTER TABLE messages_legacy RENAME CONSTRAINT fk_messages_conversation TO messages_legacy_conversation_fk")
+
+    op.execute("""
+        CREATE TABLE messages (
+            id VARCHAR(255) NOT NULL,
+            conversation_id VARCHAR(255),
+            user_id VARCHAR(255),
+            content TEXT,
+            ai_response TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute(f"""
+        ALTER TABLE messages ATTACH PARTITION messages_legacy
+        FOR VALUES FROM (MINVALUE) TO ('{legacy_end.isoformat()}')
+    """)
+
+    # Mavjud legacy index/FK lar ota jadvaldagilariga ulanadi (qayta qurilmaydi)
+    op.execute("CREATE INDEX idx_messages_conversation_timestamp ON messages (conversation_id, timestamp, id)")
+    op.execute("""
+        ALTER TABLE messages ADD CONSTRAINT fk_messages_conversation
+        FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+    """)
+
+    # Hech bir oyga tushmagan qatorlar uchun zaxira
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    # Joriy oy partitioni legacy tugagan joydan boshlanadi (qisman oy)
+    start = legacy_end
+    for offset in range(PARTITIONS_AHEAD + 1):
+        end = add_months(legacy_end, offset + 1)
+        op.execute(f"""
+            CREATE TABLE messages_y{start.year}m{start.month:02d} PARTITION OF messages
+            FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        """)
+        start = end
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS archived_partitions (
+            partition_name VARCHAR(255) PRIMARY KEY,
+            range_start TIMESTAMP NOT NULL,
+            range_end TIMESTAMP NOT NULL,
+            path VARCHAR(1000) NOT NULL,
+            row_count BIGINT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_archived_partitions_range ON archived_partitions (range_start, range_end)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Arxivlangan (detach qilingan) partitionlar qaytarilmaydi - ular Parquet fayllarda
+    op.execute("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE")
+    op.execute("""
+        CREATE TABLE messages_unpartitioned (
+            id VARCHAR(255) PRIMARY KEY,
+            conversation_id VARCHAR(255),
+            user_id VARCHAR(255),
+            content TEXT,
+            ai_response TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    op.execute("INSERT INTO messages_unpartitioned SELECT id, conversation_id, user_id, content, ai_response, timestamp FROM messages")
+    op.execute("DROP TABLE messages CASCADE")
+    op.execute("ALTER TABLE messages_unpartitioned RENAME TO messages")
+    op.execute("CREATE INDEX idx_messages_conversation_id ON messages (conversation_id)")
+    op.execute("CREATE INDEX idx_messages_conversation_timestamp ON messages (conversation_id, timestamp, id)")
+    op.execute("""
+        ALTER TABLE messages ADD CONSTRAINT fk_messages_conversation
+        FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+    """)
+    op.drop_table('archived_partitions')
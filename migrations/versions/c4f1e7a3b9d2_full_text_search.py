@@ -0,0 +1,81 @@
+"""to'liq matnli qidiruv: uz_translit() va (user_id, tsvector) GIN index lar
+
+Revision ID: c4f1e7a3b9d2
+Revises: b2e8d5a1c7f3
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1e7a3b9d2'
+down_revision: Union[str, Sequence[str], None] = 'b2e8d5a1c7f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# ai/normalize.py dagi CYRILLIC_TO_LATIN bilan mos (apostroflar o'chiriladi)
+MULTI_CHAR = [("ё", "yo"), ("ц", "ts"), ("ч", "ch"), ("ш", "sh"), ("щ", "sh"), ("ю", "yu"), ("я", "ya")]
+SINGLE_FROM = "абвгдежзийклмнопрстуфхыэўқғҳ"
+SINGLE_TO = "abvgdejziyklmnoprstufxieoqgh"
+# Tarjimasiz o'chiriladigan belgilar: ъ ь va apostrof variantlari
+DELETED = "ъьЪЬʻʼ‘’`´ʹ''"
+
+# Qidiruv doim bitta foydalanuvchi ichida: user_id index ning birinchi ustuni
+# (btree_gin), aks holda ko'p uchraydigan so'z barcha foydalanuvchilar qatorlarini o'qiydi
+MESSAGES_INDEX = 'idx_messages_search'
+MESSAGES_EXPR = "to_tsvector('simple', uz_translit(coalesce(content, '') || ' ' || coalesce(ai_response, '')))"
+CONVERSATIONS_INDEX = 'idx_conversations_title_search'
+CONVERSATIONS_EXPR = "to_tsvector('simple', uz_translit(coalesce(title, '')))"
+
+
+def translit_sql() -> str:
+    # lower() C locale da kirill harflarini kichiklashtirmaydi - katta harflar ham alohida
+    expr = "lower(input)"
+    for cyrillic, latin in MULTI_CHAR:
+        expr = f"replace(replace({expr}, '{cyrillic}', '{latin}'), '{cyrillic.upper()}', '{latin}')"
+    return f"translate({expr}, '{SINGLE_FROM}{SINGLE_FROM.upper()}{DELETED}', '{SINGLE_TO}{SINGLE_TO}')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # IMMUTABLE - expression index da ishlatish uchun
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION uz_translit(input text) RETURNS text
+        LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+        AS $$ SELECT {translit_sql()} $$
+    """)
+
+    # varchar ustunni GIN index ga qo'shish uchun
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+
+    bind = op.get_bind()
+    partitions = [] if op.get_context().as_sql else bind.execute(sa.text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'messages'::regclass
+    """)).scalars().all()
+
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {CONVERSATIONS_INDEX} ON conversations USING gin (user_id, {CONVERSATIONS_EXPR})")
+
+        if not partitions:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {MESSAGES_INDEX} ON messages USING gin (user_id, {MESSAGES_EXPR})")
+        else:
+            # Partitioned jadvalda CONCURRENTLY yo'q: ota index ON ONLY, har bir partition alohida
+            op.execute(f"CREATE INDEX IF NOT EXISTS {MESSAGES_INDEX} ON ONLY messages USING gin (user_id, {MESSAGES_EXPR})")
+            for partition in partitions:
+                child = f"{partition}_search_idx"
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} USING gin (user_id, {MESSAGES_EXPR})")
+                op.execute(f"ALTER INDEX {MESSAGES_INDEX} ATTACH PARTITION {child}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(f"DROP INDEX IF EXISTS {MESSAGES_INDEX}")
+    op.execute(f"DROP INDEX IF EXISTS {CONVERSATIONS_INDEX}")
+    op.execute("DROP FUNCTION IF EXISTS uz_translit(text)")
@@ -0,0 +1,70 @@
+"""user_summary: foydalanuvchi bo'yicha yig'ma statistika
+
+Revision ID: d7a2c5e9f104
+Revises: c4f1e7a3b9d2
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a2c5e9f104'
+down_revision: Union[str, Sequence[str], None] = 'c4f1e7a3b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS user_summary (
+            user_id VARCHAR(255) PRIMARY KEY,
+            total_messages BIGINT NOT NULL DEFAULT 0,
+            total_conversations INTEGER NOT NULL DEFAULT 0,
+            favorite_ai_type VARCHAR(100),
+            favorite_count BIGINT NOT NULL DEFAULT 0,
+            last_activity TIMESTAMP
+        )
+    """)
+
+    # Backfill va yangi yozuvlar orasida hisoblagichlar adashmasligi uchun
+    # yozuvchilar migratsiya tugaguncha kutadi (o'qishlar to'xtamaydi)
+    op.execute("LOCK TABLE conversations, user_stats IN SHARE MODE")
+
+    op.execute("""
+        INSERT INTO user_summary (user_id, total_messages, total_conversations, favorite_ai_type, favorite_count, last_activity)
+        SELECT u.user_id,
+               COALESCE(s.total_messages, 0),
+               COALESCE(c.total_conversations, 0),
+               f.ai_type,
+               COALESCE(f.usage_count, 0),
+               s.last_activity
+        FROM (
+            SELECT user_id FROM user_stats
+            UNION
+            SELECT user_id FROM conversations WHERE deleted_at IS NULL
+        ) u
+        LEFT JOIN (
+            SELECT user_id, SUM(usage_count) AS total_messages, MAX(last_used) AS last_activity
+            FROM user_stats GROUP BY user_id
+        ) s ON s.user_id = u.user_id
+        LEFT JOIN (
+            SELECT user_id, COUNT(*) AS total_conversations
+            FROM conversations WHERE deleted_at IS NULL GROUP BY user_id
+        ) c ON c.user_id = u.user_id
+        LEFT JOIN (
+            SELECT user_id, ai_type, usage_count,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY usage_count DESC, last_used DESC) AS rn
+            FROM user_stats
+        ) f ON f.user_id = u.user_id AND f.rn = 1
+        WHERE u.user_id IS NOT NULL
+        ON CONFLICT (user_id) DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_summary')
@@ -0,0 +1,62 @@
+"""conversation_tombstones: o'chirilgan suhbatlarning arxivdagi xabarlarini yashirish
+
+Revision ID: e5b1a8d3f627
+Revises: d7a2c5e9f104
+Create Date: 2026-10-18 17:00:00.000000
+
+Parquet arxividagi xabarlar o'chirilmaydi. Suhbat qatori o'chirilgach
+(hard delete yoki purger) uning id si qayta ishlatilsa, eski xabarlar
+yangi suhbatga qo'shilib ketmasligi uchun har bir o'chirish tombstone
+qoldiradi: arxivdan shu vaqtgacha bo'lgan qatorlar o'qilmaydi.
+Migratsiyadan oldin o'chirilgan suhbatlar uchun tombstone yo'q.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1a8d3f627'
+down_revision: Union[str, Sequence[str], None] = 'd7a2c5e9f104'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_tombstones (
+            conversation_id VARCHAR(255) PRIMARY KEY,
+            deleted_at TIMESTAMP NOT NULL
+        )
+    """)
+
+    # Statement-level trigger: purger ning katta DELETE lari uchun ham bitta INSERT.
+    # Chegara - oxirgi xabar vaqti va hozirgi vaqtdan kattasi (ilova va DB soatlari farq qilsa ham
+    # eski suhbatning barcha xabarlari undan oldin qoladi)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_conversation_tombstones() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO conversation_tombstones (conversation_id, deleted_at)
+            SELECT id, GREATEST(updated_at, deleted_at, LOCALTIMESTAMP) FROM deleted_conversations
+            ON CONFLICT (conversation_id) DO UPDATE
+            SET deleted_at = GREATEST(conversation_tombstones.deleted_at, EXCLUDED.deleted_at);
+            RETURN NULL;
+        END;
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER conversations_tombstone
+        AFTER DELETE ON conversations
+        REFERENCING OLD TABLE AS deleted_conversations
+        FOR EACH STATEMENT EXECUTE FUNCTION record_conversation_tombstones()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS conversations_tombstone ON conversations")
+    op.execute("DROP FUNCTION IF EXISTS record_conversation_tombstones()")
+    op.drop_table('conversation_tombstones')
@@ -0,0 +1,51 @@
+"""
+Arxiv indeksi: o'chirilgan suhbatlarning arxivdagi xabarlari ko'rinmaydi
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+import db.partitions as partitions
+from db.partitions import ArchiveIndex
+
+
+ARCHIVED = [
+    {"id": "m1", "conversation_id": "c1", "timestamp": datetime(2024, 1, 5, 10, 0)},
+    {"id": "m2", "conversation_id": "c1", "timestamp": datetime(2024, 2, 1, 9, 0)},
+]
+
+
+def make_index(monkeypatch, tombstone):
+    index = ArchiveIndex()
+    index._entries = [(datetime(2024, 1, 1), datetime(2024, 2, 28), "/archive/messages_2024_01.parquet")]
+    index._loaded_at = time.monotonic()
+    monkeypatch.setattr(partitions, "read_archived_messages", lambda paths, conversation_id: list(ARCHIVED))
+
+    async def deleted_before(conversation_id):
+        return tombstone
+
+    monkeypatch.setattr(index, "deleted_before", deleted_before)
+    return index
+
+
+def load(index, start=datetime(2024, 1, 1), end=datetime(2024, 3, 1)):
+    return asyncio.run(index.load_messages("c1", start, end))
+
+
+def test_rows_are_returned_without_tombstone(monkeypatch):
+    index = make_index(monkeypatch, None)
+    assert [row["id"] for row in load(index)] == ["m1", "m2"]
+
+
+def test_rows_of_deleted_conversation_are_hidden(monkeypatch):
+    # Suhbat 2024-01-20 da o'chirilgan, keyin shu id bilan yangisi ochilgan
+    index = make_index(monkeypatch, datetime(2024, 1, 20))
+    assert [row["id"] for row in load(index)] == ["m2"]
+    assert index.stats()["hidden_rows"] == 1
+
+
+def test_archives_outside_range_are_not_read(monkeypatch):
+    index = make_index(monkeypatch, None)
+    assert load(index, start=datetime(2024, 3, 1), end=datetime(2024, 4, 1)) == []
+    assert index.stats()["reads"] == 0
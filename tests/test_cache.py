@@ -0,0 +1,112 @@
+"""
+Javoblar keshi: kalit qoidalari va LRU/TTL
+"""
+
+from ai.base import BaseAI
+from ai.cache import ResponseCache, make_cache_key
+
+
+PARAMS = {"model": "gpt-4", "temperature": 0.2}
+
+
+def make_key(**overrides):
+    args = {"ai_type": "tarjimon", "model": "gpt-4", "system_prompt": "Sen tarjimonsan",
+            "params": PARAMS, "message": "salom dunyo"}
+    args.update(overrides)
+    return make_cache_key(**args)
+
+
+def make_ai(temperature=0.2):
+    ai = BaseAI()
+    ai.ai_type = "tarjimon"
+    ai.system_prompt = "Sen tarjimonsan"
+    ai.temperature = temperature
+    return ai
+
+
+def test_key_ignores_whitespace_differences():
+    assert make_key(message="  salom \n dunyo ") == make_key()
+
+
+def test_key_normalizes_unicode_form():
+    # NFD va NFC ko'rinishlari bitta kalit beradi
+    assert make_key(message="cafe\u0301") == make_key(message="caf\u00e9")
+
+
+def test_key_keeps_case_and_punctuation():
+    assert make_key(message="Salom dunyo") != make_key()
+    assert make_key(message="salom dunyo?") != make_key()
+
+
+def test_key_depends_on_assistant_settings():
+    base = make_key()
+    assert make_key(ai_type="chat") != base
+    assert make_key(model="gpt-3.5-turbo") != base
+    assert make_key(system_prompt="Sen shoirsan") != base
+    assert make_key(params={**PARAMS, "temperature": 0.3}) != base
+
+
+def test_key_is_independent_of_params_order():
+    reordered = {"temperature": 0.2, "model": "gpt-4"}
+    assert make_key(params=reordered) == make_key()
+
+
+def test_no_key_with_history():
+    ai = make_ai()
+    assert ai.cache_key("salom") is not None
+    assert ai.cache_key("salom", [("oldingi", "javob")]) is None
+
+
+def test_no_key_for_creative_temperature():
+    assert make_ai(temperature=0.9).cache_key("salom") is None
+
+
+def test_cache_ttl_env_override(monkeypatch):
+    ai = make_ai(temperature=0.9)
+    monkeypatch.setenv("RESPONSE_CACHE_TTL_TARJIMON", "60")
+    assert ai.response_cache_ttl() == 60
+    assert ai.cache_key("salom") is not None
+    monkeypatch.setenv("RESPONSE_CACHE_TTL_TARJIMON", "0")
+    assert make_ai().cache_key("salom") is None
+
+
+def test_lru_eviction_by_entries():
+    cache = ResponseCache(max_entries=2, max_bytes=1024)
+    cache.set("a", "1", 60)
+    cache.set("b", "2", 60)
+    assert cache.get("a") == "1"  # "a" endi eng yangi
+    cache.set("c", "3", 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.evictions == 1
+
+
+def test_eviction_by_bytes():
+    cache = ResponseCache(max_entries=10, max_bytes=8)
+    cache.set("a", "xxxx", 60)
+    cache.set("b", "yyyy", 60)
+    cache.set("c", "zz", 60)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= 8
+    # Chegaradan katta qiymat umuman saqlanmaydi
+    cache.set("d", "x" * 9, 60)
+    assert cache.get("d") is None
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    import ai.cache as cache_module
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=10, max_bytes=1024)
+    cache.set("a", "1", 5)
+    assert cache.get("a") == "1"
+    now[0] += 5
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+
+def test_zero_ttl_is_not_stored():
+    cache = ResponseCache(max_entries=10, max_bytes=1024)
+    cache.set("a", "1", 0)
+    assert len(cache) == 0
@@ -0,0 +1,73 @@
+"""
+Taxminiy kesh uchun matn normallashtirish va MinHash qidiruvi
+"""
+
+import pytest
+
+from ai.fuzzy_cache import FuzzyCache
+from ai.normalize import fold_for_search, math_tokens, normalize_for_match
+
+
+@pytest.mark.parametrize("left, right", [
+    ("Салом, қандай ўрганаман?", "qanday o'rganaman"),
+    ("To‘g‘ri javob", "togri javob"),
+    ("Iltimos, TARJIMA qiling!!!", "tarjima qiling"),
+    ("o'zbek-ingliz lug'at", "ozbek ingliz lugat"),
+])
+def test_equivalent_spellings_match(left, right):
+    assert normalize_for_match(left) == normalize_for_match(right)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("5+3", "5 + 3"),
+    ("5-3", "5 - 3"),
+    ("2×4=8", "2 * 4 = 8"),
+    ("10 ÷ 2", "10 / 2"),
+    ("3x − 7 = 2", "3x - 7 = 2"),
+    ("x^2 > 4", "x ^ 2 > 4"),
+])
+def test_math_operators_are_kept(text, expected):
+    assert normalize_for_match(text) == expected
+
+
+def test_different_operators_do_not_normalize_equal():
+    assert normalize_for_match("5+3 nechchi?") != normalize_for_match("5-3 nechchi?")
+    assert normalize_for_match("5*3") != normalize_for_match("5/3")
+
+
+def test_math_tokens():
+    assert math_tokens(normalize_for_match("3x + 7 = 22 ni yeching")) == "3 + 7 = 22"
+    assert math_tokens(normalize_for_match("o'zbek-ingliz tarjima")) == ""
+
+
+def test_fold_for_search():
+    assert fold_for_search("Ўзбекистон Тошкент") == "ozbekiston toshkent"
+    assert fold_for_search("O‘zbek") == "ozbek"
+
+
+SCOPE = "scope"
+QUESTION = "Kvadrat tenglamani qanday yechish mumkin, 3x + 7 = 22 misolida tushuntiring"
+
+
+def make_cache():
+    cache = FuzzyCache(max_entries=100, threshold=0.8)
+    cache.add(SCOPE, QUESTION, "javob", 60)
+    return cache
+
+
+def test_fuzzy_hit_for_rephrasing():
+    cache = make_cache()
+    assert cache.lookup(SCOPE, "Iltimos, kvadrat tenglamani qanday yechish mumkin 3x+7=22 misolida tushuntiring!") == "javob"
+
+
+@pytest.mark.parametrize("message", [
+    QUESTION.replace("3x + 7", "3x - 7"),
+    QUESTION.replace("22", "23"),
+    QUESTION.replace("3x", "4x"),
+])
+def test_fuzzy_miss_when_numbers_or_operators_differ(message):
+    assert make_cache().lookup(SCOPE, message) is None
+
+
+def test_fuzzy_scopes_are_isolated():
+    assert make_cache().lookup("other", QUESTION) is None
@@ -0,0 +1,53 @@
+"""
+Keyset va offset cursorlari
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db.pagination import (
+    PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX,
+    decode_cursor, decode_offset_cursor, encode_cursor, encode_offset_cursor, page_size
+)
+
+
+@pytest.mark.parametrize("timestamp", [
+    datetime(2024, 3, 1, 12, 30, 15, 123456),
+    datetime(2024, 3, 1, 12, 30, 15, tzinfo=timezone.utc),
+    datetime(2024, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=5))),
+])
+def test_cursor_round_trip(timestamp):
+    token = encode_cursor(timestamp, "3f2b9c4e-1d7a-4e8b-9a6f-0c5d2e1b7a90")
+    assert decode_cursor(token) == (timestamp, "3f2b9c4e-1d7a-4e8b-9a6f-0c5d2e1b7a90")
+
+
+def test_cursor_is_url_safe():
+    token = encode_cursor(datetime(2024, 3, 1), "id/with+chars?")
+    assert "=" not in token and "+" not in token and "/" not in token
+    assert decode_cursor(token)[1] == "id/with+chars?"
+
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", encode_offset_cursor(5), "W10"])
+def test_invalid_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_offset_cursor_round_trip():
+    assert decode_offset_cursor(encode_offset_cursor(40)) == 40
+
+
+@pytest.mark.parametrize("token", ["", "garbage", encode_offset_cursor(-1),
+                                   encode_cursor(datetime(2024, 3, 1), "x")])
+def test_invalid_offset_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        decode_offset_cursor(token)
+
+
+def test_page_size_bounds():
+    assert page_size(None) == PAGE_SIZE_DEFAULT
+    assert page_size(0) == PAGE_SIZE_DEFAULT
+    assert page_size(-3) == PAGE_SIZE_DEFAULT
+    assert page_size(5) == 5
+    assert page_size(PAGE_SIZE_MAX + 1) == PAGE_SIZE_MAX
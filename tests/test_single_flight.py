@@ -0,0 +1,143 @@
+"""
+SingleFlight: bir xil so'rovlar bitta upstream chaqiruvga birlashadi
+"""
+
+import asyncio
+
+import pytest
+
+import ai.base
+from ai.base import AIServiceError, BaseAI
+from ai.cache import SingleFlight, response_cache
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_do_coalesces_concurrent_calls():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "javob"
+
+        results = await asyncio.gather(*[flight.do("k", fetch) for _ in range(3)])
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert results == ["javob"] * 3
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_stream_fans_out_to_waiters():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            for chunk in ["Sa", "lom", "!"]:
+                await asyncio.sleep(0.005)
+                yield chunk
+
+        first = flight.stream("k", upstream)
+        await asyncio.sleep(0.007)  # kech qo'shilgan mijoz ham boshidan oladi
+        second = flight.stream("k", upstream)
+        whole = asyncio.ensure_future(flight.wait("k"))
+        streams = await asyncio.gather(collect(first), collect(second))
+        return flight, calls, streams, await whole
+
+    flight, calls, streams, whole = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert streams == [["Sa", "lom", "!"]] * 2
+    assert whole == "Salom!"
+    assert flight.stats()["streams_in_flight"] == 0
+
+
+def test_stream_error_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def upstream():
+            yield "qism"
+            raise RuntimeError("upstream down")
+
+        streams = [flight.stream("k", upstream) for _ in range(2)]
+        return flight, await asyncio.gather(*[collect(s) for s in streams], return_exceptions=True)
+
+    flight, results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_stream_joins_non_stream_call_in_flight():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return "to'liq javob"
+
+        async def upstream():
+            pytest.fail("upstream ikkinchi marta chaqirilmasligi kerak")
+            yield ""
+
+        whole = asyncio.ensure_future(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        chunks = await collect(flight.stream("k", upstream))
+        return chunks, await whole
+
+    chunks, whole = asyncio.run(scenario())
+    assert chunks == ["to'liq javob"]
+    assert whole == "to'liq javob"
+
+
+class FailingStream:
+    """Bitta bo'lakdan keyin uziladigan OpenAI stream"""
+
+    def __init__(self):
+        self.chunks = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.chunks:
+            raise RuntimeError("connection reset")
+        self.chunks += 1
+        delta = type("Delta", (), {"content": "qism"})()
+        return type("Chunk", (), {"choices": [type("Choice", (), {"delta": delta})()]})()
+
+
+class FailingClient:
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+
+    async def create(self, stream=False, **kwargs):
+        return FailingStream()
+
+
+def test_stream_failure_is_raised_not_cached(monkeypatch):
+    monkeypatch.setattr(ai.base, "_client", FailingClient())
+    assistant = BaseAI()
+    assistant.temperature = 0.0
+
+    async def scenario():
+        chunks = []
+        with pytest.raises(AIServiceError) as error:
+            async for chunk in assistant.stream_response("salom"):
+                chunks.append(chunk)
+        return chunks, error.value
+
+    chunks, error = asyncio.run(scenario())
+    # Qisman bo'lak yuborilgan, lekin xato token sifatida emas, alohida keladi
+    assert chunks == ["qism"]
+    assert error.code == "ai_error"
+    assert response_cache.get(assistant.cache_key("salom")) is None
@@ -0,0 +1,76 @@
+"""
+Embedded SQLite backend: psycopg SQL ni sqlite3 ga moslash
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from db.sqlite_backend import SQLiteDatabase, parse_sqlite_url, translate_sql
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM users WHERE id = %s", "SELECT * FROM users WHERE id = ?"),
+    ("UPDATE users SET name = %s WHERE id = %s", "UPDATE users SET name = ? WHERE id = ?"),
+    ("INSERT INTO t (a, b) VALUES (%(a)s, %(b)s)", "INSERT INTO t (a, b) VALUES (:a, :b)"),
+    ("SELECT %(user_id)s, %(user_id)s", "SELECT :user_id, :user_id"),
+    ("SELECT * FROM t WHERE title LIKE '%%' || %s || '%%'", "SELECT * FROM t WHERE title LIKE '%' || ? || '%'"),
+    ("SELECT 1", "SELECT 1"),
+])
+def test_translate_sql(sql, expected):
+    assert translate_sql(sql) == expected
+
+
+def test_translate_sql_does_not_rescan_escaped_percent():
+    # "%%s" - literal "%" va "s", parametr emas
+    assert translate_sql("SELECT '100%%s'") == "SELECT '100%s'"
+
+
+@pytest.mark.parametrize("url, path", [
+    ("sqlite:///data/app.sqlite3", "data/app.sqlite3"),
+    ("sqlite:////tmp/app.sqlite3", "/tmp/app.sqlite3"),
+])
+def test_parse_sqlite_url(url, path):
+    assert parse_sqlite_url(url) == path
+
+
+def test_psycopg_style_queries_run(tmp_path):
+    async def scenario():
+        db = SQLiteDatabase(str(tmp_path / "test.sqlite3"), workers=1)
+        await db.open()
+        try:
+            async with db.connection() as conn:
+                await conn.execute("CREATE TABLE t (id TEXT PRIMARY KEY, name TEXT, created_at TIMESTAMP)")
+                await conn.execute("INSERT INTO t VALUES (%s, %s, %s)", ("1", "50% off", datetime(2024, 3, 1, 9, 30)))
+                await conn.execute("INSERT INTO t VALUES (%(id)s, %(name)s, %(at)s)",
+                                   {"id": "2", "name": "other", "at": datetime(2024, 3, 2)})
+            async with db.connection() as conn:
+                async with conn.cursor(row_factory=dict) as cur:
+                    await cur.execute("SELECT * FROM t WHERE name LIKE '%%' || %s || '%%' ORDER BY id", ("off",))
+                    return await cur.fetchall()
+        finally:
+            await db.close()
+
+    rows = asyncio.run(scenario())
+    assert rows == [{"id": "1", "name": "50% off", "created_at": datetime(2024, 3, 1, 9, 30)}]
+
+
+def test_failed_block_rolls_back(tmp_path):
+    async def scenario():
+        db = SQLiteDatabase(str(tmp_path / "test.sqlite3"), workers=1)
+        await db.open()
+        try:
+            async with db.connection() as conn:
+                await conn.execute("CREATE TABLE t (id TEXT PRIMARY KEY)")
+            with pytest.raises(RuntimeError):
+                async with db.connection() as conn:
+                    await conn.execute("INSERT INTO t VALUES (%s)", ("1",))
+                    raise RuntimeError("boom")
+            async with db.connection() as conn:
+                cur = await conn.execute("SELECT COUNT(*) FROM t")
+                return (await cur.fetchone())[0]
+        finally:
+            await db.close()
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,143 @@
+"""
+WebSocket chat sessiyasi: pipelining tartibi, bind va xatolar
+"""
+
+import asyncio
+import json
+
+from ai.base import AIServiceError
+from api.ws_chat import ChatSession
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+
+class FakeAssistant:
+    """Javobni bo'laklab qaytaradi; delay - har bir bo'lak oldidan kutish"""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.histories = []
+
+    async def stream_response(self, message, history=None):
+        self.histories.append(list(history or []))
+        for part in (self.name, ":", message):
+            await asyncio.sleep(self.delay)
+            yield part
+        if self.fail:
+            raise AIServiceError("upstream down")
+
+
+def make_session(assistants, owned=("c1",)):
+    persisted = []
+
+    async def authenticate(user_id):
+        return {"id": user_id}
+
+    async def load_history(conversation_id, user_id):
+        return [("eski", "javob")] if conversation_id in owned else None
+
+    async def persist(message, user_id, conversation_id, ai_type, ai_response):
+        persisted.append((message, ai_type, ai_response))
+        return conversation_id or "new-conv"
+
+    session = ChatSession(FakeWebSocket(), assistants, authenticate, load_history, persist)
+    session.user = {"id": "u1"}
+    return session, persisted
+
+
+def run_jobs(session, frames, ai_type="slow", conversation_id=None):
+    """Kadrlarni birdaniga navbatga qo'yib, hammasiga javob kelguncha ishlatish"""
+    async def scenario():
+        assert await session.bind(ai_type, conversation_id) is None
+        for frame in frames:
+            session._jobs.put_nowait(frame)
+        worker = asyncio.create_task(session._process_jobs())
+        sent = session.websocket.sent
+        while sum(1 for f in sent if f["type"] in ("done", "bound", "error")) < len(frames):
+            await asyncio.sleep(0.001)
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+        return sent
+
+    return asyncio.run(scenario())
+
+
+def by_id(sent):
+    return [(frame["type"], frame.get("id")) for frame in sent if frame["type"] != "token"]
+
+
+def tokens(sent, message_id):
+    return "".join(frame["data"] for frame in sent if frame["type"] == "token" and frame["id"] == message_id)
+
+
+def test_pipelined_replies_keep_message_order():
+    # Birinchi javob sekin bo'lsa ham ikkinchisi undan oldin boshlanmaydi
+    assistants = {"slow": FakeAssistant("slow", delay=0.01), "fast": FakeAssistant("fast")}
+    session, persisted = make_session(assistants)
+    sent = run_jobs(session, [
+        {"type": "message", "id": "m1", "message": "bir"},
+        {"type": "message", "id": "m2", "message": "ikki"},
+        {"type": "message", "id": "m3", "message": "uch"},
+    ])
+
+    assert by_id(sent) == [("done", "m1"), ("done", "m2"), ("done", "m3")]
+    ids = [frame["id"] for frame in sent]
+    assert ids == sorted(ids)  # m1 ning barcha tokenlari m2 dan oldin
+    assert [p[0] for p in persisted] == ["bir", "ikki", "uch"]
+    assert sent[-1]["conversation_id"] == "new-conv"
+
+
+def test_bind_applies_only_to_later_messages():
+    assistants = {"slow": FakeAssistant("slow", delay=0.01), "fast": FakeAssistant("fast")}
+    session, persisted = make_session(assistants)
+    sent = run_jobs(session, [
+        {"type": "message", "id": "m1", "message": "bir"},
+        {"type": "bind", "id": "b1", "ai_type": "fast", "conversation_id": "c1"},
+        {"type": "message", "id": "m2", "message": "ikki"},
+    ])
+
+    assert by_id(sent) == [("done", "m1"), ("bound", "b1"), ("done", "m2")]
+    assert tokens(sent, "m1") == "slow:bir"
+    assert tokens(sent, "m2") == "fast:ikki"
+    # Yangi suhbat tarixi bind da bir marta o'qiladi
+    assert assistants["fast"].histories == [[("eski", "javob")]]
+    assert persisted[1] == ("ikki", "fast", "fast:ikki")
+
+
+def test_foreign_conversation_bind_is_refused():
+    assistants = {"slow": FakeAssistant("slow")}
+    session, _ = make_session(assistants)
+    sent = run_jobs(session, [
+        {"type": "bind", "id": "b1", "conversation_id": "someone-else"},
+        {"type": "message", "id": "m1", "message": "bir"},
+    ])
+
+    assert by_id(sent) == [("error", "b1"), ("done", "m1")]
+    assert sent[0]["code"] == "conversation_not_found"
+    assert session.conversation_id == "new-conv"
+
+
+def test_failed_reply_is_an_error_and_not_persisted():
+    assistants = {"slow": FakeAssistant("slow", fail=True), "fast": FakeAssistant("fast")}
+    session, persisted = make_session(assistants)
+    sent = run_jobs(session, [
+        {"type": "message", "id": "m1", "message": "bir"},
+        {"type": "bind", "id": "b1", "ai_type": "fast"},
+        {"type": "message", "id": "m2", "message": "ikki"},
+    ])
+
+    assert by_id(sent) == [("error", "m1"), ("bound", "b1"), ("done", "m2")]
+    assert sent[[f["type"] for f in sent].index("error")]["code"] == "ai_error"
+    assert [p[0] for p in persisted] == ["ikki"]
+    assert session.history == [("ikki", "fast:ikki")]